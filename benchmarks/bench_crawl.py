@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 爬蟲基準測試
+國立陽明交通大學課程爬蟲效能基準（對本機重播伺服器）
+
+功能：
+1. 以 nycu_replay.py 產生（或載入）重播檔，在本機啟動重播伺服器
+2. 依序執行單線程爬蟲、多線程爬蟲（數種 --threads）與 async 引擎的完整綱要爬取
+3. 記錄課程/秒、請求/秒、每門課程延遲 p50/p95/p99、峰值 RSS 與檢查點 I/O 時間
+4. 與 benchmarks/baseline.json 比較，超過容許誤差時以結束碼 1 表示效能退化
+
+每個設定在獨立的子程序與暫存目錄中執行（不使用回應快取），
+峰值 RSS 為該次爬蟲程序本身的用量。
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nycu_checkpoint import atomic_write_json
+from nycu_replay import ReplayArchive, ReplayServer, synthetic_archive
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE = 0.2
+
+# 名稱 -> (爬蟲程式, 額外參數)
+CONFIGS = {
+    'single': ('nycu_crawler.py', []),
+    'thread-1': ('nycu_crawler_multithreaded.py', ['--threads', '1']),
+    'thread-4': ('nycu_crawler_multithreaded.py', ['--threads', '4']),
+    'thread-8': ('nycu_crawler_multithreaded.py', ['--threads', '8']),
+    'async': ('nycu_crawler_multithreaded.py', ['--engine', 'async', '--concurrency', '50']),
+}
+
+# 比較的指標：(名稱, 取值函數, 越高越好)
+METRICS = [
+    ('courses_per_sec', lambda s: s['courses_per_sec'], True),
+    ('p95_latency', lambda s: s['course_latency']['p95'], False),
+    ('peak_rss_mb', lambda s: s['peak_rss_mb'], False),
+]
+
+
+def run_config(name, base_url, year, semester, timeout):
+    """在暫存目錄中執行一個設定，返回 --stats-json 的內容"""
+    script, extra = CONFIGS[name]
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as workdir:
+        stats_file = os.path.join(workdir, "stats.json")
+        command = [sys.executable, os.path.join(ROOT, script),
+                   '--year', str(year), '--semester', str(semester), '--outline',
+                   '--base-url', base_url, '--stats-json', stats_file] + extra
+        result = subprocess.run(command, cwd=workdir, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True, timeout=timeout)
+        if result.returncode != 0 or not os.path.exists(stats_file):
+            raise RuntimeError(f"{name} 執行失敗（結束碼 {result.returncode}）: {result.stderr[-500:]}")
+        with open(stats_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def summarize(stats):
+    """基準結果只保留比較與顯示需要的欄位"""
+    return {
+        'courses': stats['courses'],
+        'requests': stats['requests'],
+        'elapsed': round(stats['elapsed'], 3),
+        'courses_per_sec': round(stats['courses_per_sec'], 2),
+        'requests_per_sec': round(stats['requests_per_sec'], 2),
+        'course_latency': {key: round(value, 4) if value is not None else None
+                           for key, value in stats['course_latency'].items()},
+        'peak_rss_mb': round(stats['peak_rss_mb'], 1) if stats['peak_rss_mb'] is not None else None,
+        'checkpoint_io': round(stats['checkpoint_io'], 4),
+        'outline_success': stats['outline_success'],
+        'outline_fail': stats['outline_fail'],
+    }
+
+
+def print_table(results):
+    print(f"\n{'設定':<10} {'課程':>6} {'課程/秒':>9} {'請求/秒':>9} "
+          f"{'p50':>8} {'p95':>8} {'p99':>8} {'RSS MB':>8} {'檢查點 I/O':>10}")
+    for name, s in results.items():
+        latency = s['course_latency']
+        cells = [f"{latency[p] * 1000:7.1f}ms" if latency[p] is not None else f"{'-':>9}"
+                 for p in ('p50', 'p95', 'p99')]
+        rss = f"{s['peak_rss_mb']:8.1f}" if s['peak_rss_mb'] is not None else f"{'-':>8}"
+        print(f"{name:<10} {s['courses']:>6} {s['courses_per_sec']:>9.1f} {s['requests_per_sec']:>9.1f} "
+              f"{' '.join(cells)} {rss} {s['checkpoint_io'] * 1000:8.1f}ms")
+
+
+def compare(results, baseline, tolerance):
+    """與基準比較，返回退化項目 [(設定, 指標, 基準值, 目前值), ...]"""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            print(f"  {name}: 基準中沒有此設定，略過")
+            continue
+        for metric, value_of, higher_is_better in METRICS:
+            old, new = value_of(reference), value_of(current)
+            if not old or new is None:
+                continue
+            if higher_is_better:
+                worse = new < old * (1 - tolerance)
+            else:
+                worse = new > old * (1 + tolerance)
+            change = (new - old) / old * 100
+            print(f"  {name:<10} {metric:<16} {old:>10.3f} → {new:>10.3f} ({change:+.1f}%)"
+                  f"{'  ← 退化' if worse else ''}")
+            if worse:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='NYCU Course Crawler - 爬蟲基準測試（對本機重播伺服器）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+範例用法：
+  # 執行所有設定並與 benchmarks/baseline.json 比較
+  python benchmarks/bench_crawl.py
+
+  # 只比較多線程設定，容許 30% 誤差
+  python benchmarks/bench_crawl.py --configs thread-4 thread-8 --tolerance 0.3
+
+  # 使用錄製的重播檔，並在參考機器上更新基準
+  python benchmarks/bench_crawl.py --archive replay/114-1.jsonl.gz --update-baseline
+        """)
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), default=list(CONFIGS),
+                        help='要執行的設定 (預設: 全部)')
+    parser.add_argument('--archive', help='重播檔路徑 (預設: 產生合成重播檔)')
+    parser.add_argument('--year', type=int, default=114, help='學年度 (預設: 114)')
+    parser.add_argument('--semester', type=int, default=1, help='學期 (預設: 1)')
+    parser.add_argument('--departments', type=int, default=20, help='合成重播檔的系所數 (預設: 20)')
+    parser.add_argument('--courses', type=int, default=20, help='合成重播檔每個系所的課程數 (預設: 20)')
+    parser.add_argument('--latency', type=float, default=0.01, help='重播伺服器回應延遲秒數 (預設: 0.01)')
+    parser.add_argument('--jitter', type=float, default=0.005, help='延遲的隨機變動秒數 (預設: 0.005)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='綱要端點回應 503 的比例 (預設: 0)')
+    parser.add_argument('--repeat', type=int, default=1, help='每個設定執行次數，取課程/秒的中位數 (預設: 1)')
+    parser.add_argument('--timeout', type=int, default=600, help='每次執行的時間上限（秒） (預設: 600)')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='基準檔路徑 (預設: benchmarks/baseline.json)')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f'容許的退化比例 (預設: {DEFAULT_TOLERANCE})')
+    parser.add_argument('--update-baseline', action='store_true', help='以本次結果覆寫基準檔')
+    args = parser.parse_args()
+
+    if args.archive:
+        archive = ReplayArchive.load(args.archive)
+        dataset = {'archive': os.path.basename(args.archive), 'responses': len(archive)}
+    else:
+        archive = synthetic_archive(args.year, args.semester, args.departments, args.courses)
+        dataset = {'synthetic': f"{args.departments}x{args.courses}", 'responses': len(archive)}
+    dataset.update(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+
+    server = ReplayServer(archive, port=0, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, seed=0).start()
+    print(f"重播伺服器：{server.url}（{len(archive)} 個回應）")
+
+    results = {}
+    try:
+        for name in args.configs:
+            runs = []
+            for i in range(args.repeat):
+                print(f"執行 {name}（{i + 1}/{args.repeat}）...", flush=True)
+                runs.append(summarize(run_config(name, server.url, args.year, args.semester, args.timeout)))
+            runs.sort(key=lambda s: s['courses_per_sec'])
+            results[name] = runs[len(runs) // 2]
+    finally:
+        server.stop()
+
+    print_table(results)
+
+    if args.update_baseline:
+        atomic_write_json(args.baseline, {
+            'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                        'cpus': os.cpu_count()},
+            'dataset': dataset,
+            'results': results,
+        })
+        print(f"\n已更新基準: {args.baseline}")
+        return
+
+    try:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"\n找不到基準檔 {args.baseline}，請以 --update-baseline 建立")
+        return
+
+    if baseline.get('dataset') != dataset:
+        print(f"\n警告: 資料集設定與基準不同（基準: {baseline.get('dataset')}），比較結果僅供參考")
+
+    print(f"\n與基準比較（容許誤差 {args.tolerance:.0%}，基準機器: "
+          f"{baseline.get('machine', {}).get('platform', '未知')}）")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n效能退化: {len(regressions)} 項")
+        sys.exit(1)
+    print("\n沒有效能退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 解析基準測試
+國立陽明交通大學課程爬蟲 CPU 熱點的微基準（不經過網路）
+
+功能：
+1. 從合成或錄製的重播檔取出 get_cos_list 與綱要子端點回應
+2. 以 1k / 10k / 100k 門課程的規模執行：
+   - parse_schedule_structured（時間-教室字串）
+   - parse_cos_list（get_cos 的逐課程 dict 建立）
+   - parse_outline_weekly_schedule / parse_outline_unit_hours
+   - 最終 JSON 輸出（atomic_write_json，indent=2）
+3. 回報每次操作的時間，以及 tracemalloc 量測的記憶體配置（每次操作留存的 bytes / blocks、峰值）
+
+錄製的重播檔課程數不足時，依序重複使用其中的回應（每輪使用新的課程索引）。
+每次計時與記憶體量測前清空 nycu_schedule 的 lru_cache，量測的是冷快取（一次完整爬取）的成本。
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nycu_checkpoint import atomic_write_json
+from nycu_concurrency import CourseIndex
+from nycu_crawler_multithreaded import NYCUCrawler
+from nycu_replay import ReplayArchive, synthetic_archive
+from nycu_schedule import parse_schedule, schedule_mask
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+SYNTH_COURSES_PER_DEP = 40
+SYNTH_OUTLINE_DEPS = 5  # 合成綱要回應數：5 個系所 × 40 門課程
+
+
+def archive_payloads(archive, route):
+    """重播檔中某路由的 JSON 回應 [(params, payload), ...]（依查詢鍵排序）"""
+    payloads = []
+    for key in sorted(archive.entries):
+        entry = archive.entries[key]
+        if entry['route'] == route and entry['status'] == 200:
+            try:
+                payloads.append((entry['params'], json.loads(entry['body'])))
+            except ValueError:
+                continue
+    return payloads
+
+
+def load_pools(archive_file, max_size):
+    """取得各操作的輸入來源：系所課程列表、每週進度與單元時數回應"""
+    if archive_file:
+        lists = outlines = ReplayArchive.load(archive_file)
+    else:
+        departments = math.ceil(max_size / SYNTH_COURSES_PER_DEP) + 1
+        lists = synthetic_archive(114, 1, departments, SYNTH_COURSES_PER_DEP, outlines=False)
+        outlines = synthetic_archive(114, 1, SYNTH_OUTLINE_DEPS, SYNTH_COURSES_PER_DEP)
+
+    pools = {
+        'cos_lists': [(params['m_dep_uid'], payload)
+                      for params, payload in archive_payloads(lists, 'main/get_cos_list')
+                      if isinstance(payload, dict)],
+        'weekly': [payload for _, payload in archive_payloads(outlines, 'main/getCrsOutlineSyllabuses')
+                   if isinstance(payload, list) and payload],
+        'units': [payload for _, payload in archive_payloads(outlines, 'main/getCrsOutlineOptional')
+                  if isinstance(payload, list) and payload],
+        'base': [payload for _, payload in archive_payloads(outlines, 'main/getCrsOutlineBase')],
+        'description': [payload for _, payload in archive_payloads(outlines, 'main/getCrsOutlineDescription')],
+    }
+    for name, pool in pools.items():
+        if not pool:
+            raise SystemExit(f"錯誤: 重播檔中沒有 {name} 的回應")
+    return pools
+
+
+def cycle(pool, n):
+    """依序重複 pool 直到 n 個"""
+    return [pool[i % len(pool)] for i in range(n)]
+
+
+def cos_list_rounds(pools, n):
+    """
+    湊滿 n 門不重複課程所需的系所回應 [(輪次, dep, payload), ...]
+
+    跨系所開課的課程在同一輪只計一次（parse_cos_list 會去重），每輪重新計算
+    """
+    rounds, seen, total, index = [], set(), 0, 0
+    cos_lists = pools['cos_lists']
+    while total < n:
+        if index % len(cos_lists) == 0:
+            seen = set()
+        dep, payload = cos_lists[index % len(cos_lists)]
+        rounds.append((index // len(cos_lists), dep, payload))
+        for value in payload.values():
+            for key, courses in value.items():
+                if key.isdigit():
+                    total += len(courses.keys() - seen)
+                    seen.update(courses)
+        index += 1
+    return rounds
+
+
+def build_operations(crawler, pools, n, workdir):
+    """返回 [(名稱, 操作, 操作次數)]；操作返回其結果（量測留存的記憶體）"""
+    rounds = cos_list_rounds(pools, n)
+    times = []
+    for _, _, payload in rounds:
+        for value in payload.values():
+            for key, courses in value.items():
+                if key.isdigit():
+                    times.extend(course['cos_time'] for course in courses.values())
+    times = times[:n]
+    weekly = cycle(pools['weekly'], n)
+    units = cycle(pools['units'], n)
+
+    def parse_schedules():
+        return [crawler.parse_schedule_structured(value) for value in times]
+
+    def parse_cos_lists():
+        courses, current = [], None
+        for round_index, dep, payload in rounds:
+            if round_index != current:
+                crawler.course_index = CourseIndex()  # 重複使用回應時，每輪重新去重
+                current = round_index
+            courses.extend(crawler.parse_cos_list(dep, payload))
+        return courses[:n]
+
+    def parse_weekly():
+        return [crawler.parse_outline_weekly_schedule(payload) for payload in weekly]
+
+    def parse_units():
+        return [crawler.parse_outline_unit_hours(payload) for payload in units]
+
+    # 最終輸出：n 門課程，各附一份完整綱要
+    courses = parse_cos_lists()
+    outline_parts = [
+        {'base': crawler.build_outline_part('base', base),
+         'description': crawler.build_outline_part('description', description),
+         'weekly_schedule': crawler.parse_outline_weekly_schedule(week),
+         'unit_hours': crawler.parse_outline_unit_hours(unit)}
+        for base, description, week, unit in zip(pools['base'], pools['description'],
+                                                 pools['weekly'], cycle(pools['units'], len(pools['weekly'])))
+    ]
+    final_data = {
+        "metadata": crawler.create_metadata(),
+        "courses": [dict(course, outline=outline_parts[i % len(outline_parts)])
+                    for i, course in enumerate(courses)],
+    }
+    output_file = os.path.join(workdir, "final.json")
+
+    def dump_json():
+        atomic_write_json(output_file, final_data)
+
+    return [
+        ('parse_schedule_structured', parse_schedules, len(times)),
+        ('parse_cos_list', parse_cos_lists, len(courses)),
+        ('parse_outline_weekly_schedule', parse_weekly, n),
+        ('parse_outline_unit_hours', parse_units, n),
+        ('json.dump(indent=2)', dump_json, len(courses)),
+    ]
+
+
+def clear_caches():
+    """清空時間表解析的 lru_cache（否則第二次起的計時只量到快取命中）"""
+    parse_schedule.cache_clear()
+    schedule_mask.cache_clear()
+
+
+def measure(operation, count, repeat):
+    """返回時間（冷快取，取最快一次）與 tracemalloc 量測的記憶體配置"""
+    best = None
+    for _ in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        result = operation()
+        elapsed = time.perf_counter() - start
+        del result
+        best = elapsed if best is None else min(best, elapsed)
+
+    clear_caches()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base_memory = tracemalloc.get_traced_memory()[0]
+    result = operation()
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    del result
+
+    return {
+        'ops': count,
+        'seconds': best,
+        'us_per_op': best / count * 1e6,
+        'bytes_per_op': (current - base_memory) / count,
+        'blocks_per_op': blocks / count,
+        'peak_mb': (peak - base_memory) / 1024 / 1024,
+    }
+
+
+def print_results(size, results):
+    print(f"\n{size:,} 門課程")
+    print(f"  {'操作':<32} {'次數':>8} {'總時間':>9} {'µs/次':>9} {'B/次':>9} {'blocks/次':>10} {'峰值 MB':>9}")
+    for name, r in results.items():
+        print(f"  {name:<32} {r['ops']:>8} {r['seconds']:>8.3f}s {r['us_per_op']:>9.2f} "
+              f"{r['bytes_per_op']:>9.0f} {r['blocks_per_op']:>10.1f} {r['peak_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='NYCU Course Crawler - 解析基準測試（時間與記憶體配置）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+範例用法：
+  # 合成資料，1k / 10k / 100k 門課程
+  python benchmarks/bench_parsing.py
+
+  # 錄製的重播檔，只跑 1k 與 10k，結果寫入 JSON
+  python benchmarks/bench_parsing.py --archive fixtures/114-1.jsonl.gz --sizes 1000 10000 --json parsing.json
+        """)
+    parser.add_argument('--archive', help='重播檔路徑 (預設: 產生合成資料)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='課程數 (預設: 1000 10000 100000)')
+    parser.add_argument('--only', nargs='+', help='只執行名稱包含這些字串的操作')
+    parser.add_argument('--repeat', type=int, default=3, help='計時次數，取最快一次 (預設: 3)')
+    parser.add_argument('--json', metavar='PATH', help='將結果寫入 JSON')
+    args = parser.parse_args()
+
+    pools = load_pools(args.archive, max(args.sizes))
+    print(f"資料來源：{args.archive or '合成'}（{len(pools['cos_lists'])} 個系所回應、"
+          f"{len(pools['weekly'])} 個每週進度、{len(pools['units'])} 個單元時數）")
+
+    crawler = NYCUCrawler(114, 1)
+    report = {'source': args.archive or 'synthetic', 'sizes': {}}
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-parsing-") as workdir:
+            for size in args.sizes:
+                results = {}
+                for name, operation, count in build_operations(crawler, pools, size, workdir):
+                    if args.only and not any(key in name for key in args.only):
+                        continue
+                    results[name] = measure(operation, count, args.repeat)
+                print_results(size, results)
+                report['sizes'][str(size)] = results
+    finally:
+        crawler.close()
+
+    if args.json:
+        atomic_write_json(args.json, report)
+        print(f"\n結果已寫入: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,13 @@
 Example: Check for schedule conflicts between courses
 """
 import json
+import os
 import sys
 
+# 衝堂引擎在專案根目錄（nycu_conflicts.py）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nycu_conflicts import ConflictIndex, check_conflict
+
 def load_data(semester="114-1"):
     """載入課程資料"""
     filename = f"../course_data/basic/{semester}_data.json"
@@ -17,35 +22,16 @@ def load_data(semester="114-1"):
         print(f"請先執行爬蟲取得 {semester} 學期的資料")
         sys.exit(1)
 
-def check_conflict(course1, course2):
-    """檢查兩門課程是否有時間衝突"""
-    for s1 in course1['schedule']:
-        for s2 in course2['schedule']:
-            # 同一天
-            if s1['day'] == s2['day']:
-                # 檢查時段是否重疊
-                periods1 = set(s1['periods'])
-                periods2 = set(s2['periods'])
-                if periods1 & periods2:  # 有交集即衝突
-                    return True, {
-                        'day': s1['day_name'],
-                        'periods': sorted(periods1 & periods2),
-                        'time': f"{s1['time_start']}-{s2['time_end']}"
-                    }
-    return False, None
-
 def find_conflicts_in_list(courses):
-    """在課程清單中找出所有衝突"""
+    """在課程清單中找出所有衝突（位元遮罩矩陣，見 nycu_conflicts.ConflictIndex）"""
     conflicts = []
-    for i, c1 in enumerate(courses):
-        for c2 in courses[i+1:]:
-            has_conflict, conflict_info = check_conflict(c1, c2)
-            if has_conflict:
-                conflicts.append({
-                    'course1': c1,
-                    'course2': c2,
-                    'conflict': conflict_info
-                })
+    for i, j in ConflictIndex(courses).conflict_pairs():
+        _, conflict_info = check_conflict(courses[i], courses[j])
+        conflicts.append({
+            'course1': courses[i],
+            'course2': courses[j],
+            'conflict': conflict_info
+        })
     return conflicts
 
 def get_course_by_id(data, course_id):
@@ -123,12 +109,10 @@ def main():
 
         # 搜尋其他課程
         other_courses = search_by_name(data, "設計")[:10]
-        no_conflict_courses = []
-
-        for course in other_courses:
-            has_conflict, _ = check_conflict(target_course, course)
-            if not has_conflict and course['id'] != target_course['id']:
-                no_conflict_courses.append(course)
+        index = ConflictIndex(other_courses)
+        conflicting = set(index.conflicts_with(target_course))
+        no_conflict_courses = [course for i, course in enumerate(other_courses)
+                               if i not in conflicting and course['id'] != target_course['id']]
 
         print(f"\n找到 {len(no_conflict_courses)} 門不衝突的「設計」相關課程：")
         for course in no_conflict_courses[:5]:  # 只顯示前 5 筆
@@ -4,8 +4,13 @@
 Example: Search courses by various criteria
 """
 import json
+import os
 import sys
 
+# 搜尋索引在專案根目錄（nycu_search.py）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nycu_search import CourseSearchIndex
+
 def load_data(semester="114-1"):
     """載入課程資料"""
     filename = f"../course_data/basic/{semester}_data.json"
@@ -17,28 +22,32 @@ def load_data(semester="114-1"):
         print(f"請先執行爬蟲取得 {semester} 學期的資料")
         sys.exit(1)
 
+_index_cache = (None, None)  # (資料, 倒排索引)；保留資料的參照，避免 id 被重複使用時誤用舊索引
+
+def get_index(data):
+    """取得資料的倒排索引（同一份資料只建立一次）"""
+    global _index_cache
+    cached_data, index = _index_cache
+    if cached_data is not data:
+        index = CourseSearchIndex(data['courses'])
+        _index_cache = (data, index)
+    return index
+
 def search_by_name(data, keyword):
-    """依課程名稱搜尋"""
-    results = [c for c in data['courses'] if keyword in c['name']]
-    return results
+    """依課程名稱搜尋（區分大小寫；索引不分大小寫，取得候選後再比對）"""
+    return [c for c in get_index(data).search(name=keyword) if keyword in c['name']]
 
 def search_by_teacher(data, teacher_name):
-    """依教師姓名搜尋"""
-    results = [c for c in data['courses'] if teacher_name in c['teacher']]
-    return results
+    """依教師姓名搜尋（區分大小寫）"""
+    return [c for c in get_index(data).search(teacher=teacher_name) if teacher_name in c['teacher']]
 
 def search_by_credit(data, credits):
     """依學分數搜尋"""
-    results = [c for c in data['courses'] if c['credit'] == credits]
-    return results
+    return get_index(data).search(credit=credits)
 
 def search_by_day(data, day):
     """依星期搜尋（1=Monday, 2=Tuesday, ...）"""
-    results = []
-    for c in data['courses']:
-        if any(s['day'] == day for s in c['schedule']):
-            results.append(c)
-    return results
+    return get_index(data).search(day=day)
 
 def print_course_info(course):
     """印出課程資訊"""
@@ -88,5 +97,12 @@ def main():
     for course in results[:2]:
         print_course_info(course)
 
+    # 範例 5: 多個條件 AND 組合（posting list 取交集，不需再掃描全部課程）
+    print("\n\n【範例 5】搜尋星期一有課、3 學分、名稱包含「程式」的課程")
+    results = get_index(data).search(name="程式", day=1, credit=3.0)
+    print(f"找到 {len(results)} 門課程")
+    for course in results[:2]:
+        print_course_info(course)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - asyncio 綱要爬取引擎
+國立陽明交通大學課程爬蟲（非同步綱要引擎）
+
+功能：
+1. 單一 event loop 上同時進行數百個綱要請求
+2. 與 get_course_outline 相同的重試、超時與 HTML 備選語意（子端點並行、各自重試）
+3. 與線程引擎相同的課程佇列來源、檢查點與最終 JSON 輸出
+4. 退避等待期間不佔用並行名額
+5. 與線程共用 RateLimiter 限速、斷路器、失敗分類與回應快取
+
+需要額外安裝 aiohttp（pip install aiohttp）
+供 nycu_crawler_multithreaded.py 的 --engine async 使用
+"""
+
+import asyncio
+import time
+
+try:
+    import aiohttp
+except ImportError:  # 選用套件
+    aiohttp = None
+
+from nycu_http import TERMINAL_FAILURES, FetchError, classify_failure
+
+DEFAULT_CONCURRENCY = 200   # 同時進行的課程數量
+
+
+def async_engine_available():
+    """是否已安裝 async 引擎所需套件"""
+    return aiohttp is not None
+
+
+class AsyncOutlineEngine:
+    """以 asyncio + aiohttp 批次取得課程綱要"""
+
+    def __init__(self, crawler, concurrency=DEFAULT_CONCURRENCY):
+        if aiohttp is None:
+            raise RuntimeError("async 引擎需要 aiohttp，請執行: pip install aiohttp")
+
+        self.crawler = crawler
+        self.concurrency = max(1, int(concurrency))
+
+    def run(self, source, on_result):
+        """
+        取得 source 佇列中所有課程的綱要（阻塞直到遇到 None 且全部完成）
+
+        source 可由其他線程持續填入（管線模式）；
+        每門課程完成後在呼叫端線程上呼叫 on_result(course, outline)
+        """
+        asyncio.run(self._run(source, on_result))
+
+    def _trace_config(self):
+        """將 aiohttp 的新建連線計入爬蟲的連線統計"""
+        stats = self.crawler.http.stats
+
+        async def on_connection_create_end(session, context, params):
+            stats.record_new_connection()
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        return trace_config
+
+    async def _run(self, source, on_result):
+        loop = asyncio.get_running_loop()
+        # 每門課同時發送四個綱要子端點請求
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency * len(self.crawler.OUTLINE_ENDPOINTS), ssl=False)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = asyncio.Queue()
+        tasks = set()
+        in_flight = 0  # 已建立但結果尚未處理的課程數
+
+        async with aiohttp.ClientSession(connector=connector,
+                                         trace_configs=[self._trace_config()]) as session:
+
+            async def fetch(course):
+                try:
+                    outline = await self.get_course_outline(session, semaphore, course['id'])
+                except Exception as e:
+                    outline = None
+                    with self.crawler.print_lock:
+                        print(f"\n協程錯誤: {e}")
+                await results.put((course, outline))
+
+            async def feed():
+                nonlocal in_flight
+                # 從來源佇列取得課程（source.get 會阻塞，交給預設 executor）
+                while True:
+                    course = await loop.run_in_executor(None, source.get)
+                    if course is None:
+                        break
+                    in_flight += 1
+                    task = asyncio.create_task(fetch(course))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                await results.put(None)
+
+            feeder = asyncio.create_task(feed())
+            feeding = True
+            while feeding or in_flight:
+                item = await results.get()
+                if item is None:
+                    feeding = False
+                    continue
+                in_flight -= 1
+                on_result(*item)
+
+            await feeder
+
+    async def _throttle(self, url):
+        """等待斷路器與限速（與線程共用同一組 CircuitBreakers 與 RateLimiter）"""
+        http = self.crawler.http
+        while True:
+            delay = http.circuit_breakers.wait_time(url)
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+
+        delay = http.rate_limiter.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _record_result(self, success, empty=False):
+        with self.crawler.stats_lock:
+            if success:
+                self.crawler.stats['outline_success'] += 1
+            elif empty:
+                self.crawler.stats['outline_empty'] += 1
+            else:
+                self.crawler.stats['outline_fail'] += 1
+
+    async def extract_outline_from_html(self, session, cos_id, timeout=4, fresh=False):
+        """HTML 備選方案（與 NYCUCrawler.extract_outline_from_html 相同）"""
+        cache = self.crawler.http.cache
+        for url in self.crawler.outline_html_urls(cos_id):
+            cached = cache.get('GET', url) if cache and not fresh else None
+            if cached is not None:
+                outline_data = self.crawler.parse_outline_html(cached.text)
+                if outline_data:
+                    return outline_data
+                continue
+
+            try:
+                await self._throttle(url)
+                self.crawler.http.stats.record_request()
+                start = time.monotonic()
+                async with session.get(url, headers=self.crawler.headers,
+                                       timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    self.crawler.http.report(url, time.monotonic() - start, response.status, None)
+                    if response.status == 200:
+                        if cache:
+                            cache.put('GET', url, None, response.status, response.headers,
+                                      response.charset or 'utf-8', await response.read())
+                        outline_data = self.crawler.parse_outline_html(await response.text())
+                        if outline_data:
+                            return outline_data
+            except Exception:
+                continue
+
+        return None
+
+    async def _fetch_part(self, session, route, request_data, timeout, fresh=False):
+        """取得單一綱要子端點（與 NYCUCrawler.fetch_outline_part 相同），失敗時拋出例外"""
+        url = f"{self.crawler.base_url}/?r={route}"
+        cache = self.crawler.http.cache
+        if cache and not fresh:
+            cached = cache.get('POST', url, request_data)
+            if cached is not None:
+                return cached.json()
+
+        await self._throttle(url)
+        self.crawler.http.stats.record_request()
+        start = time.monotonic()
+        try:
+            async with session.post(url, data=request_data, headers=self.crawler.ajax_headers,
+                                    timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                self.crawler.http.report(url, time.monotonic() - start, response.status, None)
+                if response.status != 200:
+                    raise FetchError.from_status(response.status)
+                if cache:
+                    cache.put('POST', url, request_data, response.status, response.headers,
+                              response.charset or 'utf-8', await response.read())
+                # 伺服器的 Content-Type 不一定是 application/json
+                return await response.json(content_type=None)
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            self.crawler.http.report(url, time.monotonic() - start, None, e)
+            raise
+
+    async def get_course_outline(self, session, semaphore, cos_id, max_retries=10):
+        """
+        取得課程綱要（重試語意與 NYCUCrawler.get_course_outline 相同）
+
+        四個子端點並行請求，只重試可重試的失敗子端點（無資料與 4xx 不重試）；
+        只在實際發送請求時佔用並行名額，退避等待期間釋放
+        """
+        crawler = self.crawler
+        request_data = crawler.outline_request_data(cos_id)
+        outline_data = {}
+        pending = list(crawler.OUTLINE_ENDPOINTS)  # 尚未成功回應的子端點
+
+        for attempt in range(max_retries):
+            timeout_val = crawler.OUTLINE_TIMEOUTS[min(attempt, len(crawler.OUTLINE_TIMEOUTS) - 1)]
+
+            async with semaphore:
+                if attempt == 0:
+                    crawler.mark_outline_started(cos_id)
+                results = await asyncio.gather(
+                    *(self._fetch_part(session, route, request_data, timeout_val, attempt > 0)
+                      for part, route in pending),
+                    return_exceptions=True)
+
+                failed = []
+                for (part, route), payload in zip(pending, results):
+                    if isinstance(payload, Exception):
+                        kind = classify_failure(payload)
+                        crawler.record_failure(kind)
+                        if kind not in TERMINAL_FAILURES:
+                            failed.append((part, route))
+                        continue
+                    value = crawler.build_outline_part(part, payload)
+                    if value:
+                        outline_data[part] = value
+                    else:
+                        crawler.record_failure('empty')
+                pending = failed
+
+                # 適應性成功判斷：只要有任何一個 API 成功就算成功
+                if outline_data and (not pending or attempt + 1 >= crawler.PART_MAX_ATTEMPTS):
+                    self._record_result(True)
+                    return outline_data
+
+                if not outline_data:
+                    if not pending:
+                        # 所有子端點都是終止性結果（無資料或 4xx）：課程沒有綱要，不再重試
+                        self._record_result(False, empty=True)
+                        return None
+
+                    # 在第5次失敗後，或最後一次嘗試，改用 HTML 備選方案
+                    if attempt == crawler.HTML_FALLBACK_ATTEMPT or attempt == max_retries - 1:
+                        html_timeout = 4 if attempt < max_retries - 1 else 3
+                        html_result = await self.extract_outline_from_html(session, cos_id, timeout=html_timeout,
+                                                                           fresh=attempt == max_retries - 1)
+                        if html_result:
+                            self._record_result(True)
+                            return html_result
+
+            if attempt < max_retries - 1:
+                with crawler.stats_lock:
+                    crawler.stats['outline_retries'] += 1
+                # 指數退避重試（不佔用並行名額）
+                await asyncio.sleep(0.3 * (2 ** attempt))
+
+        self._record_result(False)
+        return None
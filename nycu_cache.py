@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - HTTP 回應快取
+國立陽明交通大學課程爬蟲磁碟回應快取
+
+功能：
+1. 以 sha256(方法, URL, POST 內容) 為鍵的內容定址快取
+2. 依端點類別設定 TTL（探索資料保留較久，課程列表較短）
+3. 總大小上限，超過時依最近使用時間（LRU）淘汰
+4. 命中時返回 requests.Response，呼叫端不需區分是否來自快取
+
+只快取內容有效的 HTTP 200 回應（JSON 端點須能解析且不是 False 或空值，HTML 頁面不可為空），
+失敗或無資料的回應不會在重跑時被重複使用。供 nycu_http.SessionPool 與 asyncio 綱要引擎使用
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from nycu_http import endpoint_class
+
+DEFAULT_CACHE_DIR = '.http_cache'
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB
+
+# 各端點類別的快取秒數
+DEFAULT_CACHE_TTLS = {
+    'discovery': 7 * 24 * 3600,   # 類型/類別/學院/系所：一學期內幾乎不變
+    'course_list': 10 * 60,       # 課程列表含選課人數，變動頻繁
+    'outline': 24 * 3600,         # 課程綱要
+    'html': 24 * 3600,            # HTML 備選頁面
+}
+
+
+def cache_key(method, url, data=None):
+    """請求的快取鍵（POST 內容依欄位名稱排序，與欄位順序無關）"""
+    body = urlencode(sorted((data or {}).items())) if isinstance(data, dict) else (data or '')
+    return hashlib.sha256(f"{method.upper()}\n{url}\n{body}".encode('utf-8')).hexdigest()
+
+
+def cacheable_content(url, content):
+    """回應內容是否值得快取：HTML 頁面不可為空；其他端點須為可解析且不是 False 或空值的 JSON"""
+    if not content or not content.strip():
+        return False
+    if endpoint_class(url) == 'html':
+        return True
+    try:
+        payload = json.loads(content)  # bytes：自動偵測 UTF-8/16/32
+    except ValueError:
+        return False
+    return bool(payload)
+
+
+class ResponseCache:
+    """
+    磁碟回應快取（thread-safe）
+
+    每個項目一個檔案（cache_dir/鍵前兩碼/鍵），第一行為 JSON 中繼資料，其後為原始回應內容。
+    啟動時掃描目錄建立 LRU 索引；命中時更新檔案修改時間作為最近使用時間
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES, ttls=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_CACHE_TTLS, **(ttls or {}))
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # 鍵 -> 檔案大小（由最久未使用到最近使用）
+        self._total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _load_index(self):
+        """掃描快取目錄，依修改時間建立 LRU 索引"""
+        entries = []
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _discard(self, key):
+        """刪除項目（需持有 lock）"""
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _miss(self, key=None):
+        """記錄未命中，並刪除損壞或過期的項目"""
+        with self.lock:
+            self.misses += 1
+            if key is not None:
+                self._discard(key)
+        return None
+
+    def get(self, method, url, data=None):
+        """查詢快取，命中且未過期時返回 requests.Response，否則返回 None"""
+        key = cache_key(method, url, data)
+        path = self._path(key)
+
+        with self.lock:
+            present = key in self._entries
+        if not present:
+            return self._miss()
+
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                content = f.read()
+        except (OSError, ValueError):
+            return self._miss(key)
+
+        if time.time() - meta['created'] > self.ttls.get(endpoint_class(url), 0):
+            return self._miss(key)
+
+        with self.lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(path)  # 最近使用時間（下次啟動時的 LRU 順序）
+        except OSError:
+            pass
+
+        response = requests.Response()
+        response.status_code = meta['status']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = meta['encoding']
+        response.url = url
+        response._content = content
+        return response
+
+    def put(self, method, url, data, status, headers, encoding, content):
+        """寫入快取（只快取內容有效的 200 回應，見 cacheable_content；TTL 為 0 的端點類別不快取）"""
+        if status != 200 or not self.ttls.get(endpoint_class(url)):
+            return
+        if not cacheable_content(url, content):
+            return
+
+        key = cache_key(method, url, data)
+        path = self._path(key)
+        meta = {
+            'url': url,
+            'status': status,
+            'headers': {'Content-Type': headers.get('Content-Type', '')},
+            'encoding': encoding,
+            'created': time.time(),
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8') + b'\n')
+                f.write(content)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        size = os.path.getsize(path)
+        with self.lock:
+            old_size = self._entries.pop(key, None)
+            if old_size is not None:
+                self._total_bytes -= old_size
+            self._entries[key] = size
+            self._total_bytes += size
+
+            # 超過大小上限：淘汰最久未使用的項目
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def put_response(self, method, url, data, response):
+        """寫入 requests.Response"""
+        self.put(method, url, data, response.status_code, response.headers,
+                 response.encoding, response.content)
+
+    def stats(self):
+        """命中、未命中、淘汰次數與目前大小"""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+            }
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 檢查點記錄
+國立陽明交通大學課程爬蟲 append-only 檢查點（JSONL write-ahead log）
+
+功能：
+1. 每門取得綱要的課程追加一行記錄，不再每 50 門重寫整份檢查點
+2. 專用寫入線程負責序列化與寫檔，收集結果的線程不需等待磁碟
+3. 每筆記錄立即寫入 OS，fsync 批次進行（每 sync_every 筆或每 sync_interval 秒）
+4. 續爬時重播記錄（容忍最後一行因中斷而不完整），壓縮後以原子替換寫回
+5. 自動轉換舊版 JSON 檢查點
+6. atomic_write_json / atomic_write_bytes：寫入暫存檔後 os.replace，中斷時不會留下不完整的檔案
+
+記錄格式（每行一個 JSON 物件）：
+  {"type": "courses", "courses": [...]}                 探索取得的課程基本資料
+  {"type": "order", "ids": [...]}                       探索完成，課程輸出順序
+  {"type": "outline", "id": "...", "outline": {...}}    取得綱要的課程
+
+供 nycu_crawler.py 與 nycu_crawler_multithreaded.py 共用
+"""
+
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+
+def _atomic_write(filename, write, binary=False):
+    """在同一目錄寫入暫存檔，fsync 後以 os.replace 原子替換 filename"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix='.tmp',
+                                     dir=directory)
+    try:
+        with (os.fdopen(fd, 'wb') if binary else os.fdopen(fd, 'w', encoding='utf-8')) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, filename)
+    except BaseException:
+        # 包含 SIGALRM 觸發的 SystemExit：保留原檔，只刪除暫存檔
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def atomic_write_json(filename, data, indent=2):
+    """原子寫入 JSON 檔（ensure_ascii=False）"""
+    _atomic_write(filename, lambda f: json.dump(data, f, ensure_ascii=False, indent=indent))
+
+
+def atomic_write_bytes(filename, data):
+    """原子寫入二進位檔"""
+    _atomic_write(filename, lambda f: f.write(data), binary=True)
+
+
+def _record_line(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class CheckpointState:
+    """重播檢查點記錄的結果"""
+
+    def __init__(self):
+        self.courses_by_id = {}   # cos_id -> 課程基本資料
+        self.order = None         # 探索完成時的課程順序；探索未完成時為 None
+        self.outlines = {}        # cos_id -> outline
+        self.records = 0
+
+    @property
+    def discovery_complete(self):
+        return self.order is not None
+
+    def courses(self):
+        """依輸出順序返回課程（已填入綱要），探索未完成時返回 None"""
+        if self.order is None:
+            return None
+        courses = [self.courses_by_id[cos_id] for cos_id in self.order]
+        self.apply_outlines(courses)
+        return courses
+
+    def records_snapshot(self):
+        """重建等價的最小記錄序列（壓縮用）"""
+        if self.order is not None:
+            courses = [self.courses_by_id[cos_id] for cos_id in self.order]
+        else:
+            courses = list(self.courses_by_id.values())
+        if courses:
+            yield {"type": "courses", "courses": courses}
+        if self.order is not None:
+            yield {"type": "order", "ids": self.order}
+        for cos_id, outline in self.outlines.items():
+            yield {"type": "outline", "id": cos_id, "outline": outline}
+
+    def apply_outlines(self, courses):
+        """將已取得的綱要填回課程，返回填入的數量"""
+        count = 0
+        for course in courses:
+            outline = self.outlines.get(course['id'])
+            if outline:
+                course['outline'] = outline
+                count += 1
+        return count
+
+
+def replay_checkpoint(filename):
+    """
+    重播 JSONL 檢查點記錄
+
+    最後一行若因中斷而不完整（沒有換行或不是有效 JSON）則忽略
+    """
+    state = CheckpointState()
+
+    with open(filename, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+
+            kind = record.get('type')
+            if kind == 'courses':
+                for course in record['courses']:
+                    state.courses_by_id[course['id']] = course
+            elif kind == 'order':
+                state.order = record['ids']
+            elif kind == 'outline':
+                state.outlines[record['id']] = record['outline']
+
+            state.records += 1
+
+    return state
+
+
+def load_legacy_checkpoint(filename):
+    """讀取舊版 JSON 檢查點（{"metadata", "courses"}）"""
+    with open(filename, 'r', encoding='utf-8') as f:
+        courses = json.load(f).get('courses', [])
+
+    state = CheckpointState()
+    for course in courses:
+        outline = course.get('outline')
+        if outline:
+            state.outlines[course['id']] = outline
+        state.courses_by_id[course['id']] = {k: v for k, v in course.items() if k != 'outline'}
+    state.order = [course['id'] for course in courses]
+    return state
+
+
+def write_snapshot(filename, state):
+    """將重播結果壓縮為最小記錄序列，原子替換檢查點記錄"""
+    def write(f):
+        for record in state.records_snapshot():
+            f.write(_record_line(record))
+
+    _atomic_write(filename, write)
+
+
+class CheckpointLog:
+    """
+    Append-only 檢查點記錄
+
+    append() 只將記錄放入佇列，由專用寫入線程序列化並寫入檔案；
+    每 sync_every 筆或距上次同步超過 sync_interval 秒時 fsync。
+    呼叫端需保證放入的資料之後不再被修改（write_courses 會先複製課程資料）
+    """
+
+    def __init__(self, filename, sync_every=50, sync_interval=5.0):
+        self.filename = filename
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.error = None
+        self.io_time = 0.0  # 寫入線程花在 write / flush / fsync 的秒數
+
+        self.file = open(filename, 'a', encoding='utf-8')
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._writer, name='checkpoint-writer', daemon=True)
+        self.thread.start()
+
+    def _writer(self):
+        """寫入線程：依序寫入佇列中的記錄，直到收到 None"""
+        unsynced = 0
+        last_sync = time.monotonic()
+
+        while True:
+            try:
+                record = self.queue.get(timeout=self.sync_interval)
+            except queue.Empty:
+                record = False  # 逾時：同步尚未 fsync 的記錄
+
+            started = time.monotonic()
+            try:
+                if record:
+                    self.file.write(_record_line(record))
+                    self.file.flush()  # 程序中斷時不遺失；fsync 才批次進行
+                    unsynced += 1
+                if unsynced and (record is None or unsynced >= self.sync_every or
+                                 time.monotonic() - last_sync >= self.sync_interval):
+                    os.fsync(self.file.fileno())
+                    unsynced = 0
+                    last_sync = time.monotonic()
+            except OSError as e:
+                if self.error is None:
+                    self.error = e
+                    print(f"\n檢查點寫入失敗: {e}")
+            self.io_time += time.monotonic() - started
+
+            if record is None:
+                break
+
+        self.file.close()
+
+    def append(self, record):
+        """追加一筆記錄（不等待磁碟）"""
+        self.queue.put(record)
+
+    def write_courses(self, courses):
+        """記錄探索取得的課程基本資料（先複製，之後修改課程不影響記錄）"""
+        if courses:
+            self.append({"type": "courses", "courses": [dict(course) for course in courses]})
+
+    def write_order(self, courses):
+        """記錄探索完成與課程輸出順序"""
+        self.append({"type": "order", "ids": [course['id'] for course in courses]})
+
+    def write_outline(self, cos_id, outline):
+        """記錄一門課程的綱要"""
+        self.append({"type": "outline", "id": cos_id, "outline": outline})
+
+    def close(self):
+        """寫完佇列中的記錄、同步並關閉"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def remove(self):
+        """關閉並刪除記錄（最終 JSON 已輸出）"""
+        self.close()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+def open_checkpoint(filename, legacy_filename=None):
+    """
+    開啟檢查點記錄，返回 (CheckpointLog, CheckpointState)
+
+    沒有既有記錄時 state 為 None。既有記錄（或舊版 JSON 檢查點）重播後壓縮，
+    以原子替換寫回，同時去除中斷留下的不完整最後一行
+    """
+    state = None
+    if os.path.exists(filename):
+        state = replay_checkpoint(filename)
+    elif legacy_filename and os.path.exists(legacy_filename):
+        state = load_legacy_checkpoint(legacy_filename)
+
+    if state:
+        write_snapshot(filename, state)
+    if legacy_filename and os.path.exists(legacy_filename):
+        os.remove(legacy_filename)
+
+    return CheckpointLog(filename), state
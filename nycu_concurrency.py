@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 並行控制工具
+國立陽明交通大學課程爬蟲共用並行元件
+
+功能：
+1. Thread-safe 的系所／課程去重索引（CourseIndex）
+2. AIMD 自適應並行度控制器（AIMDController，--threads auto）
+3. 依重試時間排序的延遲重試佇列（RetryQueue）
+
+供 nycu_crawler.py 與 nycu_crawler_multithreaded.py 共用
+"""
+
+import heapq
+import itertools
+import time
+from statistics import median
+from threading import Condition, Lock
+
+
+class CourseIndex:
+    """
+    Thread-safe 的系所與課程去重索引
+
+    並行探索時，系所與課程的發現順序不固定。索引記錄每個系所在探索樹中的位置
+    （例如 (類型, 類別, 學院, 系所) 的索引 tuple），以及每門課程在各系所回應中的位置，
+    courses() 依此排序，輸出順序與依序走訪探索樹時相同。
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self._dep_order = {}      # dep_id -> 探索樹中最前面的位置
+        self._candidates = {}     # cos_id -> [(dep_id, 回應中的位置), ...]
+        self._courses = {}        # cos_id -> course dict
+
+    def add_dep(self, dep_id, order=None):
+        """
+        登記系所；第一次出現時返回 True（呼叫端負責取得其課程列表）
+
+        order 為系所在探索樹中的位置，未指定時依登記順序排列
+        """
+        with self.lock:
+            if order is None:
+                order = (len(self._dep_order),)
+
+            if dep_id in self._dep_order:
+                if order < self._dep_order[dep_id]:
+                    self._dep_order[dep_id] = order
+                return False
+
+            self._dep_order[dep_id] = order
+            return True
+
+    def dep_ids(self):
+        """已登記的系所（依探索樹順序）"""
+        with self.lock:
+            return sorted(self._dep_order, key=self._dep_order.get)
+
+    def dep_entries(self):
+        """已登記的系所與其位置 [(dep_id, order), ...]（依探索樹順序）"""
+        with self.lock:
+            return sorted(self._dep_order.items(), key=lambda item: item[1])
+
+    def claim_course(self, cos_id, dep_id, position):
+        """
+        登記課程出現的位置；第一次出現時返回 True
+
+        返回 True 時呼叫端負責建立課程資料並呼叫 store_course
+        """
+        with self.lock:
+            candidates = self._candidates.setdefault(cos_id, [])
+            candidates.append((dep_id, position))
+            return len(candidates) == 1
+
+    def store_course(self, cos_id, course):
+        """儲存已建立的課程資料"""
+        with self.lock:
+            self._courses[cos_id] = course
+
+    def __contains__(self, cos_id):
+        with self.lock:
+            return cos_id in self._candidates
+
+    def __len__(self):
+        with self.lock:
+            return len(self._courses)
+
+    def courses(self):
+        """依探索樹順序返回所有課程"""
+        with self.lock:
+            def order_key(cos_id):
+                return min((self._dep_order.get(dep_id, ()), position)
+                           for dep_id, position in self._candidates[cos_id])
+
+            return [self._courses[cos_id]
+                    for cos_id in sorted(self._courses, key=order_key)]
+
+
+class AIMDController:
+    """
+    AIMD（加法增加、乘法減少）自適應並行度控制器
+
+    worker 在處理每門課程前 acquire()，結束後 release()，同時進行的數量不超過 limit。
+    每收集 window 個健康的回應樣本評估一次：錯誤率與延遲都正常、且並行名額已用滿時 limit + 1；
+    遇到逾時、連線錯誤或 5xx 回應時 limit 乘以 decrease（冷卻時間內只減少一次）。
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=32, decrease=0.5, window=20,
+                 latency_factor=2.0, error_threshold=0.05, cooldown=2.0, on_change=None):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.decrease = decrease
+        self.window = window
+        self.latency_factor = latency_factor      # 延遲超過基準的幾倍視為不健康
+        self.error_threshold = error_threshold    # 視窗內可容許的錯誤率
+        self.cooldown = cooldown                  # 兩次減少之間的最短秒數
+        self.on_change = on_change                # on_change(elapsed, old, new, reason)
+
+        self.condition = Condition()
+        self.in_use = 0
+        self.latencies = []
+        self.errors = 0
+        self.baseline_latency = None              # 觀察到的最低視窗延遲中位數
+        self.last_decrease = 0.0
+        self.start_time = time.monotonic()
+        self.history = [(0.0, self.limit)]        # [(經過秒數, 並行度)]
+
+    def acquire(self):
+        """取得一個並行名額（名額用完時等待）"""
+        with self.condition:
+            while self.in_use >= self.limit:
+                self.condition.wait()
+            self.in_use += 1
+
+    def release(self):
+        """釋放並行名額"""
+        with self.condition:
+            self.in_use -= 1
+            self.condition.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def _set_limit(self, new_limit, reason):
+        """調整並行度（需持有 condition）"""
+        old_limit = self.limit
+        if new_limit == old_limit:
+            return
+        self.limit = new_limit
+        elapsed = time.monotonic() - self.start_time
+        self.history.append((elapsed, new_limit))
+        self.condition.notify_all()
+        if self.on_change:
+            self.on_change(elapsed, old_limit, new_limit, reason)
+
+    def observe(self, url, latency, status_code, error):
+        """SessionPool 回應監聽器：依延遲與錯誤類型調整並行度"""
+        overloaded = error is not None or (status_code is not None and status_code >= 500)
+
+        with self.condition:
+            if overloaded:
+                now = time.monotonic()
+                if now - self.last_decrease >= self.cooldown:
+                    self.last_decrease = now
+                    reason = "逾時/連線錯誤" if error is not None else f"HTTP {status_code}"
+                    self._set_limit(max(self.minimum, int(self.limit * self.decrease)), reason)
+                self.latencies = []
+                self.errors = 0
+                return
+
+            self.latencies.append(latency)
+            if status_code >= 400:
+                self.errors += 1
+
+            if len(self.latencies) < self.window:
+                return
+
+            window_latency = median(self.latencies)
+            error_rate = self.errors / len(self.latencies)
+            self.latencies = []
+            self.errors = 0
+
+            if self.baseline_latency is None or window_latency < self.baseline_latency:
+                self.baseline_latency = window_latency
+
+            healthy = (error_rate <= self.error_threshold and
+                       window_latency <= self.baseline_latency * self.latency_factor)
+
+            # 只有名額已用滿時才需要更多並行度
+            if healthy and self.in_use >= self.limit and self.limit < self.maximum:
+                self._set_limit(self.limit + 1, f"延遲 {window_latency * 1000:.0f}ms")
+
+
+class RetryQueue:
+    """
+    依重試時間排序的延遲重試佇列（thread-safe）
+
+    失敗的工作以 push(item, delay) 放回佇列，worker 不需在退避期間閒置等待，
+    可以先處理新工作，pop_ready() 取出已到重試時間的工作。
+    新工作用盡後呼叫 sweep() 進行最後清掃：依重試時間取出剩餘工作，
+    佇列清空且沒有進行中的工作時返回 None。
+    從佇列取出（或以 start() 開始）的工作完成後必須呼叫 done()。
+    """
+
+    def __init__(self):
+        self.condition = Condition()
+        self._heap = []                    # [(重試時間, 序號, item)]
+        self._counter = itertools.count()  # 重試時間相同時維持放入順序
+        self.active = 0                    # 進行中、可能再放回佇列的工作數
+
+    def push(self, item, delay):
+        """delay 秒後重試 item"""
+        with self.condition:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), item))
+            self.condition.notify_all()
+
+    def _pop(self):
+        """取出最早的工作並標記為進行中（需持有 condition）"""
+        self.active += 1
+        return heapq.heappop(self._heap)[2]
+
+    def pop_ready(self):
+        """取出已到重試時間的工作，沒有時返回 None（不等待）"""
+        with self.condition:
+            if self._heap and self._heap[0][0] <= time.monotonic():
+                return self._pop()
+            return None
+
+    def time_to_next(self):
+        """距離下一個工作可重試的秒數，佇列為空時返回 None"""
+        with self.condition:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def start(self):
+        """標記一個新工作開始（完成後呼叫 done()）"""
+        with self.condition:
+            self.active += 1
+
+    def done(self):
+        """標記一個工作結束（已完成或已放回佇列）"""
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def sweep(self):
+        """最後清掃：等待並取出下一個到期的工作，全部完成時返回 None"""
+        with self.condition:
+            while True:
+                if self._heap:
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        return self._pop()
+                    self.condition.wait(wait)
+                elif self.active == 0:
+                    return None
+                else:
+                    self.condition.wait()
+
+    def __len__(self):
+        with self.condition:
+            return len(self._heap)
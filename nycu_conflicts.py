@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 衝堂檢查
+國立陽明交通大學課程衝堂檢查引擎（以 schedule_mask 位元遮罩運算）
+
+功能：
+1. 單一課程對：兩個 112 位元遮罩的 AND，不需走訪 schedule
+2. ConflictIndex：整學期課程的遮罩矩陣（NumPy），「與 X 衝堂的課程」一次向量化運算
+3. 全部課程對的衝堂矩陣：分塊計算，記憶體用量由 chunk_size 決定
+
+遮罩的定義見 nycu_schedule.schedule_mask
+"""
+
+from nycu_schedule import DAY_MAP, PERIOD_NUMBERS, PERIOD_TIME_MAP, course_mask, encode_masks, mask_slots
+
+try:
+    import numpy as np
+except ImportError:  # ConflictIndex 需要 numpy（選用）
+    np = None
+
+DEFAULT_CHUNK_SIZE = 512  # 每塊 512 門課程 × 全部課程；1 萬門課程時每塊約 40 MB
+_LOW_WORD = (1 << 64) - 1
+
+
+def masks_conflict(mask1, mask2):
+    """兩個位元遮罩是否有重疊的時段"""
+    return mask1 & mask2 != 0
+
+
+def check_conflict(course1, course2):
+    """
+    檢查兩門課程是否有時間衝突
+
+    返回 (是否衝突, 衝突資訊)；衝突資訊為第一個重疊的星期與該天重疊的節次（節次編號同 schedule 的 periods，已排序）：
+    {'day': 'Monday', 'periods': [3, 4], 'time': '10:10-12:00', 'slots': [('M', '3'), ...]}
+    """
+    overlap = course_mask(course1) & course_mask(course2)
+    if not overlap:
+        return False, None
+
+    slots = mask_slots(overlap)
+    day_code = slots[0][0]
+    periods = [period for day, period in slots if day == day_code]  # 依 PERIOD_ORDER（時間先後）
+    return True, {
+        'day': DAY_MAP[day_code][1],
+        'periods': sorted({PERIOD_NUMBERS[period] for period in periods}),
+        'time': f"{PERIOD_TIME_MAP[periods[0]][0]}-{PERIOD_TIME_MAP[periods[-1]][1]}",
+        'slots': slots,
+    }
+
+
+def _words(matrix):
+    """(n, 7) uint16 遮罩矩陣 -> (n, 2) uint64（低 64 位元、高 48 位元）"""
+    padded = np.zeros((matrix.shape[0], 8), dtype='<u2')
+    padded[:, :7] = matrix
+    return padded.view('<u8')
+
+
+class ConflictIndex:
+    """
+    整學期課程的衝堂索引（需要 numpy）
+
+    courses 為資料檔的課程陣列；結果中的課程以其在 courses 中的位置表示
+    """
+
+    def __init__(self, courses):
+        if np is None:
+            raise RuntimeError("衝堂索引需要 numpy，請執行: pip install numpy")
+        self.courses = list(courses)
+        self.matrix = encode_masks(self.courses)  # (n, 7) uint16，每天 16 位元
+        self.words = _words(self.matrix)          # (n, 2) uint64，向量化 AND 使用
+        self.positions = {course['id']: i for i, course in enumerate(self.courses)}
+
+    def __len__(self):
+        return len(self.courses)
+
+    def _query_words(self, target):
+        """課程 id、課程 dict 或位元遮罩 -> (低 64 位元, 高 48 位元)"""
+        if isinstance(target, int):
+            mask = target
+        elif isinstance(target, dict):
+            mask = course_mask(target)
+        else:
+            mask = course_mask(self.courses[self.positions[target]])
+        return np.uint64(mask & _LOW_WORD), np.uint64(mask >> 64)
+
+    def conflict_flags(self, target):
+        """每門課程是否與 target 衝堂（長度 n 的 bool 陣列，含 target 本身）"""
+        low, high = self._query_words(target)
+        return ((self.words[:, 0] & low) | (self.words[:, 1] & high)) != 0
+
+    def conflicts_with(self, target):
+        """與 target（課程 id、課程 dict 或位元遮罩）衝堂的課程位置，不含 target 本身"""
+        positions = np.flatnonzero(self.conflict_flags(target))
+        own = self.positions.get(target['id'] if isinstance(target, dict) else target)
+        return [int(i) for i in positions if i != own]
+
+    def free_courses(self, mask):
+        """不與 mask（例如已選課程的遮罩 OR）衝堂、且有上課時段的課程位置"""
+        flags = self.conflict_flags(mask)
+        has_time = (self.words[:, 0] | self.words[:, 1]) != 0
+        return [int(i) for i in np.flatnonzero(~flags & has_time)]
+
+    def iter_conflict_blocks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        分塊產生衝堂矩陣：(起始列, bool 區塊 (rows, n))
+
+        區塊第 r 列第 j 欄為課程 start + r 與課程 j 是否衝堂（對角線為「有上課時段」）
+        """
+        low, high = self.words[:, 0], self.words[:, 1]
+        for start in range(0, len(self.courses), chunk_size):
+            stop = min(start + chunk_size, len(self.courses))
+            block = (low[start:stop, None] & low[None, :]) != 0
+            block |= (high[start:stop, None] & high[None, :]) != 0
+            yield start, block
+
+    def conflict_matrix(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """完整的 n × n bool 衝堂矩陣（1 萬門課程約 100 MB）"""
+        n = len(self.courses)
+        result = np.zeros((n, n), dtype=bool)
+        for start, block in self.iter_conflict_blocks(chunk_size):
+            result[start:start + block.shape[0]] = block
+        np.fill_diagonal(result, False)
+        return result
+
+    def conflict_pairs(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """逐一產生衝堂的課程位置對 (i, j)，i < j（不保留整個矩陣）"""
+        for start, block in self.iter_conflict_blocks(chunk_size):
+            rows, cols = np.nonzero(block)
+            for row, col in zip(rows.tolist(), cols.tolist()):
+                i = start + row
+                if i < col:
+                    yield i, col
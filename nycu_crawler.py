@@ -28,6 +28,17 @@ import argparse
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
 
+from nycu_cache import DEFAULT_CACHE_DIR, ResponseCache
+from nycu_checkpoint import atomic_write_json, open_checkpoint
+from nycu_concurrency import CourseIndex
+from nycu_discovery import DEFAULT_DISCOVERY_TTL, DiscoveryManifest, manifest_path
+from nycu_export import FORMATS, export_available, write_tables
+from nycu_fulltext import build_index_file, default_index_file
+from nycu_http import (BASE_URL, ENDPOINT_CLASSES, FAILURE_KINDS, TERMINAL_FAILURES, FetchError, RateLimiter,
+                       SessionPool, classify_failure, parse_rate_option)
+from nycu_schedule import parse_schedule, schedule_mask
+from nycu_stats import latency_percentiles, peak_rss_mb, write_run_stats
+
 # 忽略 SSL 警告
 warnings.filterwarnings('ignore', message='Unverified HTTPS request')
 
@@ -40,32 +51,32 @@ DEFAULT_FETCH_OUTLINE = False  # 是否抓取課程綱要
 class NYCUCrawler:
     """陽明交大課程爬蟲類別"""
 
-    # 時段對應表
-    PERIOD_TIME_MAP = {
-        'y': ('06:00', '06:50'), 'z': ('07:00', '07:50'),
-        '1': ('08:00', '08:50'), '2': ('09:00', '09:50'),
-        '3': ('10:10', '11:00'), '4': ('11:10', '12:00'),
-        'n': ('12:10', '13:00'),
-        '5': ('13:20', '14:10'), '6': ('14:20', '15:10'),
-        '7': ('15:30', '16:20'), '8': ('16:30', '17:20'),
-        '9': ('17:30', '18:20'),
-        'a': ('18:25', '19:15'), 'b': ('19:20', '20:10'),
-        'c': ('20:15', '21:05'), 'd': ('21:10', '22:00')
-    }
-
-    # 星期對應表
-    DAY_MAP = {
-        'M': (1, 'Monday'), 'T': (2, 'Tuesday'), 'W': (3, 'Wednesday'),
-        'R': (4, 'Thursday'), 'F': (5, 'Friday'), 'S': (6, 'Saturday'),
-        'U': (7, 'Sunday')
-    }
-
-    def __init__(self, year, semester, fetch_outline=False):
+    # 課程綱要子端點：(輸出欄位, 路由)
+    OUTLINE_ENDPOINTS = (
+        ('base', 'main/getCrsOutlineBase'),
+        ('description', 'main/getCrsOutlineDescription'),
+        ('weekly_schedule', 'main/getCrsOutlineSyllabuses'),
+        ('unit_hours', 'main/getCrsOutlineOptional'),
+    )
+
+    # 每次嘗試的超時秒數：8, 7.5, 7, 6.5, 6, 5.5, 5 秒（之後固定 5 秒）
+    OUTLINE_TIMEOUTS = (8, 7.5, 7, 6.5, 6, 5.5, 5)
+
+    # 第幾次嘗試失敗後改用 HTML 備選方案（從 0 起算）
+    HTML_FALLBACK_ATTEMPT = 4
+
+    # 已取得部分綱要時，失敗子端點的最多嘗試次數
+    PART_MAX_ATTEMPTS = 3
+
+    def __init__(self, year, semester, fetch_outline=False, rates=None, cache_dir=None,
+                 refresh_discovery=False, base_url=BASE_URL, stats_json=None, fulltext=False,
+                 output_format='json'):
         """初始化爬蟲"""
         self.year = year
         self.semester = semester
         self.fetch_outline = fetch_outline
         self.acysem = str(year) + str(semester)
+        self.base_url = base_url.rstrip('/')  # 課程時間表網站（或本機重播伺服器）
         self.flang = "zh-tw"
         self.headers = {
             "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
@@ -76,108 +87,36 @@ class NYCUCrawler:
             "X-Requested-With": "XMLHttpRequest"
         }
 
-        self.dep_list = []
+        # 共用 keep-alive 連線池與限速器
+        self.rate_limiter = RateLimiter(rates)
+        self.cache = ResponseCache(cache_dir) if cache_dir else None  # 磁碟回應快取（None 為停用）
+        self.http = SessionPool(pool_size=1, rate_limiter=self.rate_limiter, cache=self.cache)
+
+        self.refresh_discovery = refresh_discovery  # 忽略系所清單，重新探索
+        self.course_index = CourseIndex()  # 系所／課程去重索引
         self.courses_list = []  # 改用陣列儲存
+        self.checkpoint = None  # 檢查點記錄（CheckpointLog）
+        self.stats_json = stats_json  # 執行統計輸出路徑（--stats-json）
+        self.fulltext = fulltext      # 完成後建立綱要全文索引（--fulltext）
+        self.output_format = output_format  # json / parquet / arrow（--format）
+        self.course_latencies = []    # 每門課程綱要的完成時間（含重試，秒）
         self.stats = {
             'total_courses': 0,
             'outline_success': 0,
             'outline_fail': 0,
+            'outline_empty': 0,     # 沒有綱要的課程（所有子端點無資料或 4xx）
             'start_time': None
         }
+        self.failure_counts = {kind: 0 for kind in FAILURE_KINDS}  # 綱要子端點失敗類型
 
     def parse_schedule_structured(self, time_classroom_str):
         """
-        將時間-教室字串解析為結構化的 schedule 陣列
+        將時間-教室字串解析為結構化的 schedule（見 nycu_schedule.parse_schedule）
 
         輸入範例: "M34W2-EE102[GF],R5-EE201[2F]"
-        輸出: [
-            {
-                "day": 1,
-                "day_name": "Monday",
-                "periods": [3, 4],
-                "time_start": "10:10",
-                "time_end": "12:00",
-                "classroom": "EE102",
-                "floor": "GF"
-            },
-            ...
-        ]
+        相同字串的結果由快取共用且不可修改
         """
-        schedule = []
-        if not time_classroom_str or time_classroom_str.strip() == '':
-            return schedule
-
-        # 分割多個時段
-        segments = time_classroom_str.split(',')
-
-        for segment in segments:
-            segment = segment.strip()
-            if not segment:
-                continue
-
-            # 分離時間和教室 (格式: "M34-EE102[GF]" 或 "M34")
-            parts = segment.split('-')
-            time_part = parts[0] if parts else ''
-            classroom_part = parts[1] if len(parts) > 1 else ''
-
-            # 解析時間部分
-            pattern = r'([MTWRFSU])([1-9yznabcd]+)'
-            matches = re.findall(pattern, time_part)
-
-            for day_code, periods_str in matches:
-                if day_code not in self.DAY_MAP:
-                    continue
-
-                day_num, day_name = self.DAY_MAP[day_code]
-
-                # 解析時段
-                periods = [p for p in periods_str]
-                period_numbers = []
-
-                for p in periods:
-                    if p in self.PERIOD_TIME_MAP:
-                        # 將時段字元轉換為數字（用於排序和顯示）
-                        if p == 'y': period_numbers.append(0)
-                        elif p == 'z': period_numbers.append(1)
-                        elif p == 'n': period_numbers.append(7)
-                        elif p == 'a': period_numbers.append(10)
-                        elif p == 'b': period_numbers.append(11)
-                        elif p == 'c': period_numbers.append(12)
-                        elif p == 'd': period_numbers.append(13)
-                        else: period_numbers.append(int(p))
-
-                if not period_numbers:
-                    continue
-
-                # 計算開始和結束時間
-                first_period = periods[0]
-                last_period = periods[-1]
-                time_start = self.PERIOD_TIME_MAP.get(first_period, ('', ''))[0]
-                time_end = self.PERIOD_TIME_MAP.get(last_period, ('', ''))[1]
-
-                # 解析教室和樓層
-                classroom = ''
-                floor = ''
-                if classroom_part:
-                    # 提取樓層資訊 (例如: "EE102[GF]" 或 "EE201[2F]")
-                    floor_match = re.search(r'\[([^\]]+)\]', classroom_part)
-                    if floor_match:
-                        floor = floor_match.group(1)
-                        classroom = classroom_part[:floor_match.start()]
-                    else:
-                        classroom = classroom_part
-
-                schedule.append({
-                    "day": day_num,
-                    "day_name": day_name,
-                    "periods": period_numbers,
-                    "time_start": time_start,
-                    "time_end": time_end,
-                    "classroom": classroom,
-                    "floor": floor
-                })
-
-        return schedule
+        return parse_schedule(time_classroom_str)
 
     def parse_outline_weekly_schedule(self, weekly_data):
         """
@@ -254,19 +193,19 @@ class NYCUCrawler:
 
         return structured_units
 
-    def extract_outline_from_html(self, cos_id, timeout=4):
+    def extract_outline_from_html(self, cos_id, timeout=4, fresh=False):
         """
         激進備選方案：從多個 HTML 頁面來源解析課程綱要
-        當 JSON API 失敗時使用 - 只要有任何內容就返回
+        當 JSON API 失敗時使用 - 只要有任何內容就返回；fresh=True 時略過回應快取
         """
         html_urls = [
-            f"https://timetable.nycu.edu.tw/?r=course/syllabus&acy={self.year}&sem={self.semester}&cos_id={cos_id}",
-            f"https://timetable.nycu.edu.tw/?r=main/course_detail&acy={self.year}&sem={self.semester}&cos_id={cos_id}",
+            f"{self.base_url}/?r=course/syllabus&acy={self.year}&sem={self.semester}&cos_id={cos_id}",
+            f"{self.base_url}/?r=main/course_detail&acy={self.year}&sem={self.semester}&cos_id={cos_id}",
         ]
 
         for url in html_urls:
             try:
-                response = requests.get(url, headers=self.headers, verify=False, timeout=timeout)
+                response = self.http.get(url, headers=self.headers, verify=False, timeout=timeout, fresh=fresh)
 
                 if response.status_code == 200:
                     soup = BeautifulSoup(response.text, 'html.parser')
@@ -287,9 +226,72 @@ class NYCUCrawler:
 
         return None
 
+    def outline_request_data(self, cos_id):
+        """課程綱要 API 的 POST 參數"""
+        return {
+            "acy": str(self.year),
+            "sem": str(self.semester),
+            "cos_id": str(cos_id),
+            "user": "",
+            "_token": ""
+        }
+
+    def build_outline_part(self, part, payload):
+        """
+        將單一綱要子端點的 JSON 回應轉換為輸出格式
+
+        API 可能返回 False、空值或格式不一致的資料，無有效資料時返回 None
+        """
+        if part == 'base':
+            # 適應性檢查：確保是字典且有資料
+            if isinstance(payload, dict) and payload:
+                return {
+                    'course_name': payload.get('cos_name', ''),
+                    'course_name_eng': payload.get('cos_eng_name', ''),
+                    'selection_type': payload.get('sel_type_name', ''),
+                    'selection_type_eng': payload.get('sel_type_eng_name', ''),
+                    'department': payload.get('dep_name', ''),
+                    'department_eng': payload.get('depEName', ''),
+                    'course_code': payload.get('cos_code', ''),
+                    'teacher_hours': payload.get('teacher_hours', ''),
+                    'total_hours': payload.get('total_teacher_hours', '')
+                }
+        elif part == 'description':
+            # 適應性檢查：確保是字典類型且有內容
+            if isinstance(payload, dict) and payload:
+                return {
+                    'prerequisite': payload.get('crs_prerequisite', ''),
+                    'outline': payload.get('crs_outline', ''),
+                    'textbook': payload.get('crs_textbook', ''),
+                    'grading': payload.get('crs_exam_score', ''),
+                    'teaching_method': payload.get('crs_teach_method', ''),
+                    'meeting_time': payload.get('crs_meeting_time', ''),
+                    'meeting_place': payload.get('crs_meeting_place', ''),
+                    'contact': payload.get('crs_contact', '')
+                }
+        elif part == 'weekly_schedule':
+            return self.parse_outline_weekly_schedule(payload) or None
+        elif part == 'unit_hours':
+            return self.parse_outline_unit_hours(payload) or None
+        return None
+
+    def fetch_outline_part(self, route, request_data, timeout, fresh=False):
+        """
+        取得單一綱要子端點的 JSON 回應
+
+        連線失敗、逾時、非 200 或無效 JSON 回應時拋出例外（可重試的失敗稍後只重試這個子端點）；
+        重試時 fresh=True，略過回應快取
+        """
+        response = self.http.post(f"{self.base_url}/?r={route}",
+                                  data=request_data, headers=self.ajax_headers,
+                                  verify=False, timeout=timeout, fresh=fresh)
+        if response.status_code != 200:
+            raise FetchError.from_status(response.status_code)
+        return response.json()
+
     def get_course_outline(self, cos_id, max_retries=10):
         """
-        取得課程綱要（帶激進重試機制和適應性錯誤處理）
+        取得課程綱要（四個子端點各自獨立重試）
 
         這個函數具有適應性，能處理：
         - API 返回 False 或 None
@@ -298,178 +300,106 @@ class NYCUCrawler:
         - 連線逾時和瞬時失敗
         - 只要有任何成功的資料就算成功
 
-        改進：
-        - 重試次數：3 → 7
-        - 超時時間：10 → 20 秒
-        - 指數退避策略
+        失敗依類型處理（nycu_http.classify_failure）：逾時、連線錯誤、5xx 與無效 JSON 會重試；
+        無資料（False、空值）與 4xx 重試也不會改變結果，該子端點直接結束。
+        單線程版本依序請求子端點；已成功的子端點保留，重試時只重新請求失敗的子端點
         """
-        outline_data = {}
-        success_count = 0  # 記錄成功獲取的 API 數量
-        request_data = {
-            "acy": str(self.year),
-            "sem": str(self.semester),
-            "cos_id": str(cos_id),
-            "user": "",
-            "_token": ""
-        }
+        request_data = self.outline_request_data(cos_id)
+        outline_data = {}                        # 已取得的子端點資料
+        pending = list(self.OUTLINE_ENDPOINTS)   # 尚未取得資料的子端點
 
         for attempt in range(max_retries):
-            try:
-                # 短超時 + 激進重試（更好的連線策略）
-                timeout_val = 8 - (attempt * 0.5) if attempt < 6 else 5  # 8, 7.5, 7, 6.5, 6, 5.5, 5 秒
-                retry_delay = 0.1 * (1.5 ** attempt)  # 0.1, 0.15, 0.22, 0.34, 0.51, 0.76, 1.14 秒
-
-                # 1. 基本資料
-                url_base = "https://timetable.nycu.edu.tw/?r=main/getCrsOutlineBase"
-                response = requests.post(url_base, data=request_data,
-                                       headers=self.ajax_headers, verify=False, timeout=timeout_val)
-                if response.status_code == 200:
-                    base_data = response.json()
-                    # 適應性檢查：確保是字典且有資料
-                    if isinstance(base_data, dict) and base_data:
-                        outline_data['base'] = {
-                            'course_name': base_data.get('cos_name', ''),
-                            'course_name_eng': base_data.get('cos_eng_name', ''),
-                            'selection_type': base_data.get('sel_type_name', ''),
-                            'selection_type_eng': base_data.get('sel_type_eng_name', ''),
-                            'department': base_data.get('dep_name', ''),
-                            'department_eng': base_data.get('depEName', ''),
-                            'course_code': base_data.get('cos_code', ''),
-                            'teacher_hours': base_data.get('teacher_hours', ''),
-                            'total_hours': base_data.get('total_teacher_hours', '')
-                        }
-                        success_count += 1
-
-                time.sleep(0.02)  # 進一步減少延遲
-
-                # 2. 課程描述（可選，失敗不影響整體）
-                try:
-                    url_desc = "https://timetable.nycu.edu.tw/?r=main/getCrsOutlineDescription"
-                    response = requests.post(url_desc, data=request_data,
-                                           headers=self.ajax_headers, verify=False, timeout=timeout_val)
-                    if response.status_code == 200:
-                        desc_data = response.json()
-                        # 適應性檢查：確保是字典類型且有內容
-                        if isinstance(desc_data, dict) and desc_data:
-                            outline_data['description'] = {
-                                'prerequisite': desc_data.get('crs_prerequisite', ''),
-                                'outline': desc_data.get('crs_outline', ''),
-                                'textbook': desc_data.get('crs_textbook', ''),
-                                'grading': desc_data.get('crs_exam_score', ''),
-                                'teaching_method': desc_data.get('crs_teach_method', ''),
-                                'meeting_time': desc_data.get('crs_meeting_time', ''),
-                                'meeting_place': desc_data.get('crs_meeting_place', ''),
-                                'contact': desc_data.get('crs_contact', '')
-                            }
-                            success_count += 1
-                except Exception:
-                    pass  # 靜默失敗，不影響其他資料獲取
-
-                time.sleep(0.02)
-
-                # 3. 每週進度（可選，失敗不影響整體）
-                try:
-                    url_syllabus = "https://timetable.nycu.edu.tw/?r=main/getCrsOutlineSyllabuses"
-                    response = requests.post(url_syllabus, data=request_data,
-                                           headers=self.ajax_headers, verify=False, timeout=timeout_val)
-                    if response.status_code == 200:
-                        syllabus_data = response.json()
-                        weekly = self.parse_outline_weekly_schedule(syllabus_data)
-                        if weekly:  # 只在有資料時才加入
-                            outline_data['weekly_schedule'] = weekly
-                            success_count += 1
-                except Exception:
-                    pass  # 靜默失敗
-
-                time.sleep(0.02)
-
-                # 4. 單元時數（可選，失敗不影響整體）
+            # 短超時 + 激進重試（更好的連線策略）
+            timeout_val = self.OUTLINE_TIMEOUTS[min(attempt, len(self.OUTLINE_TIMEOUTS) - 1)]
+
+            failed = []
+            for part, route in pending:
                 try:
-                    url_optional = "https://timetable.nycu.edu.tw/?r=main/getCrsOutlineOptional"
-                    response = requests.post(url_optional, data=request_data,
-                                           headers=self.ajax_headers, verify=False, timeout=timeout_val)
-                    if response.status_code == 200:
-                        optional_data = response.json()
-                        units = self.parse_outline_unit_hours(optional_data)
-                        if units:  # 只在有資料時才加入
-                            outline_data['unit_hours'] = units
-                            success_count += 1
-                except Exception:
-                    pass  # 靜默失敗
-
-                # 適應性成功判斷：只要有任何一個 API 成功就算成功
-                if success_count > 0:
-                    self.stats['outline_success'] += 1
-                    return outline_data
-                else:
-                    raise Exception("所有 API 都沒有返回有效資料")
-
-            except Exception as e:
-                # 在第5次失敗後，嘗試 HTML 備選方案
-                if attempt == 4:
-                    try:
-                        html_result = self.extract_outline_from_html(cos_id, timeout=4)
-                        if html_result:
-                            self.stats['outline_success'] += 1
-                            return html_result
-                    except:
-                        pass
-
-                if attempt < max_retries - 1:
-                    # 指數退避重試
-                    retry_delay = 0.3 * (2 ** attempt)
-                    time.sleep(retry_delay)
+                    value = self.build_outline_part(
+                        part, self.fetch_outline_part(route, request_data, timeout_val, fresh=attempt > 0))
+                except Exception as e:
+                    kind = classify_failure(e)
+                    self.failure_counts[kind] += 1
+                    if kind not in TERMINAL_FAILURES:
+                        failed.append((part, route))
                     continue
+                if value:  # 只在有資料時才加入
+                    outline_data[part] = value
                 else:
-                    # JSON API 全部失敗，再試一次 HTML 備選方案
-                    try:
-                        html_result = self.extract_outline_from_html(cos_id, timeout=3)
-                        if html_result:
-                            self.stats['outline_success'] += 1
-                            return html_result
-                    except:
-                        pass
-
-                    self.stats['outline_fail'] += 1
-                    return None
+                    self.failure_counts['empty'] += 1
+            pending = failed
+
+            # 適應性成功判斷：只要有任何一個 API 成功就算成功，
+            # 失敗的子端點最多重試 PART_MAX_ATTEMPTS 次
+            if outline_data and (not pending or attempt + 1 >= self.PART_MAX_ATTEMPTS):
+                self.stats['outline_success'] += 1
+                return outline_data
+
+            if not outline_data and not pending:
+                # 所有子端點都是終止性結果（無資料或 4xx）：課程沒有綱要，不再重試
+                self.stats['outline_empty'] += 1
+                return None
+
+            # 在第5次失敗後，嘗試 HTML 備選方案
+            if not outline_data and attempt == self.HTML_FALLBACK_ATTEMPT:
+                html_result = self.extract_outline_from_html(cos_id, timeout=4)
+                if html_result:
+                    self.stats['outline_success'] += 1
+                    return html_result
+
+            if attempt < max_retries - 1:
+                # 指數退避重試
+                time.sleep(0.3 * (2 ** attempt))
+
+        if outline_data:
+            # 重試次數用盡：以已取得的子端點為結果
+            self.stats['outline_success'] += 1
+            return outline_data
 
+        # JSON API 沒有取得資料，再試一次 HTML 備選方案
+        html_result = self.extract_outline_from_html(cos_id, timeout=3, fresh=True)
+        if html_result:
+            self.stats['outline_success'] += 1
+            return html_result
+
+        self.stats['outline_fail'] += 1
         return None
 
     def get_type(self):
         """取得課程類型列表"""
-        res = requests.get('https://timetable.nycu.edu.tw/?r=main/get_type',
-                          headers=self.headers, verify=False)
+        res = self.http.get(f'{self.base_url}/?r=main/get_type',
+                           headers=self.headers, verify=False)
         return res.json()
 
     def get_category(self, ftype):
         """取得課程類別"""
-        res = requests.post('https://timetable.nycu.edu.tw/?r=main/get_category',
-                          data={'ftype': ftype, 'flang': self.flang,
-                                'acysem': self.acysem, 'acysemend': self.acysem},
-                          headers=self.headers, verify=False)
+        res = self.http.post(f'{self.base_url}/?r=main/get_category',
+                           data={'ftype': ftype, 'flang': self.flang,
+                                 'acysem': self.acysem, 'acysemend': self.acysem},
+                           headers=self.headers, verify=False)
         return res.json()
 
     def get_college(self, fcategory, ftype):
         """取得學院列表"""
-        res = requests.post('https://timetable.nycu.edu.tw/?r=main/get_college',
-                          data={'fcategory': fcategory, 'ftype': ftype,
-                                'flang': self.flang, 'acysem': self.acysem,
-                                'acysemend': self.acysem},
-                          headers=self.headers, verify=False)
+        res = self.http.post(f'{self.base_url}/?r=main/get_college',
+                           data={'fcategory': fcategory, 'ftype': ftype,
+                                 'flang': self.flang, 'acysem': self.acysem,
+                                 'acysemend': self.acysem},
+                           headers=self.headers, verify=False)
         return res.json()
 
     def get_dep(self, fcollege, fcategory, ftype):
         """取得系所列表"""
-        res = requests.post('https://timetable.nycu.edu.tw/?r=main/get_dep',
-                          data={'fcollege': fcollege, 'fcategory': fcategory,
-                                'ftype': ftype, 'flang': self.flang,
-                                'acysem': self.acysem, 'acysemend': self.acysem},
-                          headers=self.headers, verify=False)
+        res = self.http.post(f'{self.base_url}/?r=main/get_dep',
+                           data={'fcollege': fcollege, 'fcategory': fcategory,
+                                 'ftype': ftype, 'flang': self.flang,
+                                 'acysem': self.acysem, 'acysemend': self.acysem},
+                           headers=self.headers, verify=False)
         return res.json()
 
     def get_cos(self, dep):
         """取得課程列表"""
-        url = "https://timetable.nycu.edu.tw/?r=main/get_cos_list"
+        url = f"{self.base_url}/?r=main/get_cos_list"
         data = {
             "m_acy": self.year, "m_sem": self.semester,
             "m_acyend": self.year, "m_semend": self.semester,
@@ -480,14 +410,13 @@ class NYCUCrawler:
             "m_selcampus": "**"
         }
 
-        r = requests.post(url, headers=self.headers, verify=False, data=data)
+        r = self.http.post(url, headers=self.headers, verify=False, data=data)
         if r.status_code != requests.codes.ok:
             return
 
         raw_data = json.loads(r.text)
 
-        # 使用 set 來追蹤已處理的課程 ID
-        existing_ids = {course['id'] for course in self.courses_list}
+        position = 0  # 課程在此系所回應中的位置
 
         for dep_value in raw_data:
             language = raw_data[dep_value]["language"]
@@ -495,8 +424,10 @@ class NYCUCrawler:
                 if re.match("^[1-2]+$", dep_content) is None:
                     continue
                 for cos_id in raw_data[dep_value][dep_content]:
+                    position += 1
+
                     # 檢查是否已存在
-                    if cos_id in existing_ids:
+                    if not self.course_index.claim_course(cos_id, dep, position):
                         continue
 
                     raw_cos_data = raw_data[dep_value][dep_content][cos_id]
@@ -539,21 +470,78 @@ class NYCUCrawler:
                             "current": safe_int(raw_cos_data["reg_num"])
                         },
                         "schedule": schedule,
+                        "schedule_mask": schedule_mask(raw_cos_data["cos_time"]),  # 7 天 × 16 節位元遮罩
                         "english_taught": language[cos_id]["授課語言代碼"] == "en-us",
                         "tags": tags,
                         "raw_time_classroom": raw_cos_data["cos_time"]  # 保留原始格式以供參考
                     }
 
+                    self.course_index.store_course(cos_id, course)
                     self.courses_list.append(course)
-                    existing_ids.add(cos_id)
                     self.stats['total_courses'] += 1
 
+    def load_discovery_manifest(self):
+        """有效期限內的系所清單；沒有、已過期或指定 --refresh-discovery 時返回 None"""
+        if self.refresh_discovery:
+            return None
+        manifest = DiscoveryManifest.load(manifest_path(self.year, self.semester), self.acysem)
+        if manifest is None or not manifest.is_fresh(DEFAULT_DISCOVERY_TTL):
+            return None
+        return manifest
+
+    def discover_courses(self):
+        """
+        依序探索 類型 → 類別 → 學院 → 系所 → 課程
+
+        有效期限內的系所清單存在時略過探索樹，直接依清單順序呼叫 get_cos；
+        完整探索後更新系所清單
+        """
+        manifest = self.load_discovery_manifest()
+        if manifest:
+            print(f"  使用系所清單（{manifest.describe()}）")
+            for fdep, order in manifest.departments:
+                if self.course_index.add_dep(fdep, order):
+                    self.get_cos(fdep)
+            return
+
+        types = self.get_type()
+
+        for i in range(len(types)):
+            ftype = types[i]["uid"]
+            print(f"  處理: {types[i]['cname']}")
+            categories = self.get_category(ftype)
+
+            if types[i]["cname"] == "其他課程":
+                for fcategory in categories.keys():
+                    if self.course_index.add_dep(fcategory):
+                        self.get_cos(fcategory)
+            else:
+                for fcategory in categories.keys():
+                    colleges = self.get_college(fcategory, ftype)
+                    if len(colleges):
+                        for fcollege in colleges.keys():
+                            deps = self.get_dep(fcollege, fcategory, ftype)
+                            if len(deps):
+                                for fdep in deps.keys():
+                                    if self.course_index.add_dep(fdep):
+                                        self.get_cos(fdep)
+                    else:
+                        deps = self.get_dep("", fcategory, ftype)
+                        if len(deps):
+                            for fdep in deps.keys():
+                                if self.course_index.add_dep(fdep):
+                                    self.get_cos(fdep)
+
+        departments = self.course_index.dep_entries()
+        if departments:
+            DiscoveryManifest(self.acysem, departments).save(manifest_path(self.year, self.semester))
+
     def print_progress(self):
         """顯示進度"""
         total = self.stats['total_courses']
         success = self.stats['outline_success']
         fail = self.stats['outline_fail']
-        processed = success + fail
+        processed = success + fail + self.stats['outline_empty']
 
         if total > 0:
             progress_pct = (processed / total) * 100
@@ -568,39 +556,47 @@ class NYCUCrawler:
                       f"成功: {success} | 失敗: {fail} | "
                       f"預估剩餘: {eta}", end='', flush=True)
 
-    def save_checkpoint(self, filename, metadata):
-        """保存檢查點"""
-        checkpoint_data = {
-            "metadata": metadata,
-            "courses": self.courses_list
-        }
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(checkpoint_data, f, ensure_ascii=False, indent=2)
-
-    def fetch_all_outlines(self, checkpoint_file, metadata):
-        """批次取得所有課程綱要"""
+    def print_connection_stats(self):
+        """顯示 HTTP 連線重用統計"""
+        conn = self.http.connection_stats()
+        print(f"HTTP 請求: {conn['requests']} 次 | "
+              f"新建連線: {conn['new_connections']} | "
+              f"重用連線: {conn['reused_connections']}")
+        if self.cache:
+            cache = self.cache.stats()
+            print(f"快取: 命中 {cache['hits']} | 未命中 {cache['misses']} | 淘汰 {cache['evictions']} | "
+                  f"{cache['entries']} 項（{cache['bytes'] / 1024 / 1024:.1f} MB）")
+        if self.rate_limiter.buckets:
+            waited = self.rate_limiter.wait_stats()
+            print("限速等待: " + " | ".join(f"{endpoint} 延後 {w['delayed']} 次（平均 {w['avg_wait']:.2f}s）"
+                                         for endpoint, w in waited.items()))
+
+    def fetch_all_outlines(self):
+        """批次取得所有課程綱要（每門取得綱要的課程追加一筆檢查點記錄）"""
         print("\n開始取得課程綱要...")
         self.stats['start_time'] = datetime.now()
-        count = 0
 
         for course in self.courses_list:
             if 'outline' not in course:
+                started = time.monotonic()
                 outline = self.get_course_outline(course['id'])
+                self.course_latencies.append(time.monotonic() - started)
                 if outline:
                     course['outline'] = outline
+                    self.checkpoint.write_outline(course['id'], outline)
 
-                count += 1
                 self.print_progress()
 
-                # 每 50 門課程保存一次
-                if count % 50 == 0:
-                    # 更新 metadata
-                    metadata['last_updated'] = datetime.now().isoformat() + 'Z'
-                    metadata['total_courses'] = len(self.courses_list)
-                    self.save_checkpoint(checkpoint_file, metadata)
-
         print()  # 換行
 
+    def write_output(self, output_file, final_data):
+        """依 --format 寫入最終資料（皆為原子寫入），返回輸出的檔案"""
+        if self.output_format == 'json':
+            atomic_write_json(output_file, final_data)
+            return [output_file]
+        files = write_tables(final_data, os.path.splitext(output_file)[0], self.output_format)
+        return list(files.values())
+
     def create_metadata(self):
         """建立 metadata"""
         semester_name_map = {1: "上學期", 2: "下學期", 'X': "暑期"}
@@ -613,7 +609,7 @@ class NYCUCrawler:
             "term": self.semester,
             "total_courses": len(self.courses_list),
             "last_updated": datetime.now().isoformat() + 'Z',
-            "source_url": "https://timetable.nycu.edu.tw",
+            "source_url": BASE_URL,
             "crawler_version": "4.0",
             "data_format_version": "2.0",
             "with_outline": self.fetch_outline
@@ -625,7 +621,8 @@ class NYCUCrawler:
         if self.fetch_outline:
             output_dir = "course_data/with_outline"
             output_file = f"{output_dir}/{self.year}-{self.semester}_data_with_outline.json"
-            checkpoint_file = f"{output_dir}/{self.year}-{self.semester}_checkpoint.json"
+            checkpoint_file = f"{output_dir}/{self.year}-{self.semester}_checkpoint.jsonl"
+            legacy_checkpoint_file = f"{output_dir}/{self.year}-{self.semester}_checkpoint.json"
         else:
             output_dir = "course_data/basic"
             output_file = f"{output_dir}/{self.year}-{self.semester}_data.json"
@@ -640,15 +637,23 @@ class NYCUCrawler:
             print("模式：完整綱要（新格式）")
         else:
             print("模式：基本資訊（新格式）")
+        if self.rate_limiter.buckets:
+            print(f"限速：{self.rate_limiter.describe()}")
+        if self.cache:
+            print(f"回應快取：{self.cache.cache_dir}")
+        if self.base_url != BASE_URL:
+            print(f"伺服器：{self.base_url}")
         print("=" * 70)
 
-        # 檢查是否有檢查點
-        if self.fetch_outline and checkpoint_file and os.path.exists(checkpoint_file):
-            print(f"\n發現檢查點檔案: {checkpoint_file}")
-            with open(checkpoint_file, 'r', encoding='utf-8') as f:
-                checkpoint_data = json.load(f)
-                self.courses_list = checkpoint_data.get('courses', [])
+        start_time = datetime.now()
+        state = None
+        if self.fetch_outline:
+            self.checkpoint, state = open_checkpoint(checkpoint_file, legacy_checkpoint_file)
 
+        if state and state.discovery_complete:
+            # 檢查點中已有完整課程列表：只取得尚無綱要的課程
+            print(f"\n發現檢查點檔案: {checkpoint_file}")
+            self.courses_list = state.courses()
             print(f"已載入 {len(self.courses_list)} 門課程")
             completed = sum(1 for c in self.courses_list if 'outline' in c)
             print(f"其中 {completed} 門已有綱要")
@@ -657,69 +662,30 @@ class NYCUCrawler:
             self.stats['outline_success'] = completed
 
             metadata = self.create_metadata()
-            self.fetch_all_outlines(checkpoint_file, metadata)
-
-            # 保存最終結果
-            final_data = {
-                "metadata": metadata,
-                "courses": self.courses_list
-            }
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(final_data, f, ensure_ascii=False, indent=2)
-
-            if os.path.exists(checkpoint_file):
-                os.remove(checkpoint_file)
-
-            print(f"\n完成！資料已儲存至: {output_file}")
-            return
-
-        start_time = datetime.now()
-
-        # 階段 1: 取得課程基本資料
-        print("\n階段 1: 取得課程基本資料...")
-        types = self.get_type()
-
-        for i in range(len(types)):
-            ftype = types[i]["uid"]
-            print(f"  處理: {types[i]['cname']}")
-            categories = self.get_category(ftype)
-
-            if types[i]["cname"] == "其他課程":
-                for fcategory in categories.keys():
-                    if fcategory not in self.dep_list:
-                        self.dep_list.append(fcategory)
-                        self.get_cos(fcategory)
-            else:
-                for fcategory in categories.keys():
-                    colleges = self.get_college(fcategory, ftype)
-                    if len(colleges):
-                        for fcollege in colleges.keys():
-                            deps = self.get_dep(fcollege, fcategory, ftype)
-                            if len(deps):
-                                for fdep in deps.keys():
-                                    if fdep not in self.dep_list:
-                                        self.dep_list.append(fdep)
-                                        self.get_cos(fdep)
-                    else:
-                        deps = self.get_dep("", fcategory, ftype)
-                        if len(deps):
-                            for fdep in deps.keys():
-                                if fdep not in self.dep_list:
-                                    self.dep_list.append(fdep)
-                                    self.get_cos(fdep)
+            self.fetch_all_outlines()
+        else:
+            # 階段 1: 取得課程基本資料
+            print("\n階段 1: 取得課程基本資料...")
+            self.discover_courses()
 
-        print(f"\n已取得 {len(self.courses_list)} 門課程的基本資料")
+            print(f"\n已取得 {len(self.courses_list)} 門課程的基本資料")
 
-        # 建立 metadata
-        metadata = self.create_metadata()
+            # 建立 metadata
+            metadata = self.create_metadata()
 
-        # 階段 2: 取得課程綱要（如果需要）
-        if self.fetch_outline:
-            print("\n階段 2: 取得課程綱要...")
-            self.fetch_all_outlines(checkpoint_file, metadata)
+            # 階段 2: 取得課程綱要（如果需要）
+            if self.fetch_outline:
+                # 探索完成：記錄課程列表，續爬時不需重新探索
+                self.checkpoint.write_courses(self.courses_list)
+                self.checkpoint.write_order(self.courses_list)
+                resumed = state.apply_outlines(self.courses_list) if state else 0
+                if resumed:
+                    # 探索未完成的檢查點：沿用已取得的綱要
+                    self.stats['outline_success'] = resumed
+                    print(f"發現檢查點檔案: {checkpoint_file}（沿用 {resumed} 門課程的綱要）")
 
-            if checkpoint_file and os.path.exists(checkpoint_file):
-                os.remove(checkpoint_file)
+                print("\n階段 2: 取得課程綱要...")
+                self.fetch_all_outlines()
 
         # 更新最終統計
         metadata['total_courses'] = len(self.courses_list)
@@ -731,8 +697,18 @@ class NYCUCrawler:
             "courses": self.courses_list
         }
 
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(final_data, f, ensure_ascii=False, indent=2)
+        # 寫入暫存檔後原子替換，中斷時不會留下不完整的輸出
+        written = self.write_output(output_file, final_data)
+
+        # 最終資料已輸出，不再需要檢查點記錄
+        if self.checkpoint:
+            self.checkpoint.remove()
+
+        # 全文索引：與完整綱要輸出存放在同一目錄
+        index_file = None
+        if self.fulltext and self.fetch_outline:
+            index_file = default_index_file(output_file)
+            index = build_index_file(self.courses_list, index_file, metadata)
 
         end_time = datetime.now()
         elapsed = end_time - start_time
@@ -744,16 +720,47 @@ class NYCUCrawler:
         if self.fetch_outline:
             print(f"綱要成功: {self.stats['outline_success']}")
             print(f"綱要失敗: {self.stats['outline_fail']}")
+            print(f"無綱要: {self.stats['outline_empty']}")
+            print("失敗類型: " + " | ".join(f"{kind} {count}" for kind, count in self.failure_counts.items()))
             if self.stats['total_courses'] > 0:
                 success_rate = (self.stats['outline_success'] / self.stats['total_courses']) * 100
                 print(f"成功率: {success_rate:.1f}%")
         print(f"總花費時間: {elapsed}")
         if self.stats['total_courses'] > 0:
             print(f"平均每門課: {elapsed.total_seconds()/self.stats['total_courses']:.2f} 秒")
-        print(f"資料已儲存至: {output_file}")
+        print(f"資料已儲存至: {', '.join(written)}")
+        if index_file:
+            print(f"全文索引已儲存至: {index_file}（{len(index)} 門課程、{len(index.terms)} 個詞）")
         print(f"資料格式版本: 2.0 (陣列格式)")
+        self.print_connection_stats()
         print("=" * 70)
 
+        if self.stats_json:
+            write_run_stats(self.stats_json, self.run_stats(elapsed.total_seconds()))
+
+    def run_stats(self, elapsed):
+        """本次執行的統計（--stats-json，供 benchmarks/bench_crawl.py 比較）"""
+        courses = len(self.courses_list)
+        requests_sent = self.http.connection_stats()['requests']
+        return {
+            "crawler": "single",
+            "engine": None,
+            "threads": 1,
+            "concurrency": None,
+            "outline": self.fetch_outline,
+            "elapsed": elapsed,
+            "courses": courses,
+            "requests": requests_sent,
+            "courses_per_sec": courses / elapsed if elapsed > 0 else 0.0,
+            "requests_per_sec": requests_sent / elapsed if elapsed > 0 else 0.0,
+            "course_latency": latency_percentiles(self.course_latencies),
+            "outline_success": self.stats['outline_success'],
+            "outline_fail": self.stats['outline_fail'],
+            "outline_retries": None,
+            "peak_rss_mb": peak_rss_mb(),
+            "checkpoint_io": self.checkpoint.io_time if self.checkpoint else 0.0,
+        }
+
 
 def main():
     """主函數 - 支援命令行參數"""
@@ -768,6 +775,18 @@ def main():
   # 爬取 113 年第 2 學期並包含課程綱要
   python nycu_crawler.py --year 113 --semester 2 --outline
 
+  # 綱要 JSON 每秒最多 10 個請求
+  python nycu_crawler.py --outline --rate outline=10
+
+  # 忽略系所清單，重新探索 類型→類別→學院→系所（預設沿用 7 天內的清單）
+  python nycu_crawler.py --refresh-discovery
+
+  # 對本機重播伺服器爬取（見 nycu_replay.py）
+  python nycu_crawler.py --base-url http://127.0.0.1:8900
+
+  # 啟用 HTTP 回應快取（預設不快取；重跑同一學期時未過期的請求直接由快取取得）
+  python nycu_crawler.py --cache-dir .http_cache
+
   # 使用預設值 (114 年第 1 學期，不包含綱要)
   python nycu_crawler.py
         """)
@@ -789,6 +808,44 @@ def main():
         action='store_true',
         help='是否爬取課程綱要 (預設: 不爬取)'
     )
+    parser.add_argument(
+        '--rate',
+        type=parse_rate_option,
+        action='append',
+        metavar='CLASS=RPS',
+        help=f'端點類別限速（每秒請求數，可重複指定），CLASS: {", ".join(ENDPOINT_CLASSES)} (預設: 不限速)'
+    )
+    parser.add_argument(
+        '--refresh-discovery',
+        action='store_true',
+        help='忽略系所清單，重新探索並更新 (預設: 沿用 7 天內的清單)'
+    )
+    parser.add_argument(
+        '--base-url',
+        default=BASE_URL,
+        help=f'課程時間表網站，可指向 nycu_replay.py 重播伺服器 (預設: {BASE_URL})'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        metavar='DIR',
+        help=f'啟用 HTTP 回應快取並存於此目錄，例如 {DEFAULT_CACHE_DIR} (預設: 不快取)'
+    )
+    parser.add_argument(
+        '--format',
+        choices=FORMATS,
+        default='json',
+        help='輸出格式，parquet / arrow 輸出 courses、schedule、weekly_topics 三個表（需要 pyarrow） (預設: json)'
+    )
+    parser.add_argument(
+        '--fulltext',
+        action='store_true',
+        help='完成後建立綱要全文索引（<輸出檔名>_fulltext.idx，以 nycu_fulltext.py search 查詢；需搭配 --outline）'
+    )
+    parser.add_argument(
+        '--stats-json',
+        metavar='PATH',
+        help='完成後將執行統計（課程/請求速率、每門課程延遲、峰值記憶體、檢查點 I/O）寫入 JSON'
+    )
     parser.add_argument(
         '--version',
         action='version',
@@ -806,8 +863,22 @@ def main():
         print("錯誤: 學期必須為 1 或 2")
         sys.exit(1)
 
+    if args.fulltext and not args.outline:
+        print("錯誤: --fulltext 需搭配 --outline")
+        sys.exit(1)
+
+    if args.format != 'json' and not export_available():
+        print("錯誤: parquet / arrow 輸出需要 pyarrow，請執行: pip install pyarrow")
+        sys.exit(1)
+
     # 建立爬蟲實例並執行
-    crawler = NYCUCrawler(args.year, args.semester, args.outline)
+    crawler = NYCUCrawler(args.year, args.semester, args.outline, rates=dict(args.rate or []),
+                          cache_dir=args.cache_dir,
+                          refresh_discovery=args.refresh_discovery,
+                          base_url=args.base_url,
+                          stats_json=args.stats_json,
+                          fulltext=args.fulltext,
+                          output_format=args.format)
     try:
         crawler.crawl()
     except KeyboardInterrupt:
@@ -816,6 +887,10 @@ def main():
     except Exception as e:
         print(f"\n\n致命錯誤: {e}")
         sys.exit(1)
+    finally:
+        if crawler.checkpoint:
+            crawler.checkpoint.close()
+        crawler.http.close()
 
 
 if __name__ == "__main__":
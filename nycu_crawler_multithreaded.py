@@ -25,11 +25,27 @@ import time
 import os
 import sys
 import warnings
+import queue
 import threading
 import argparse
+from contextlib import nullcontext
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from nycu_async_engine import AsyncOutlineEngine, DEFAULT_CONCURRENCY, async_engine_available
+from nycu_cache import DEFAULT_CACHE_DIR, ResponseCache
+from nycu_checkpoint import atomic_write_json, open_checkpoint
+from nycu_concurrency import AIMDController, CourseIndex, RetryQueue
+from nycu_discovery import DEFAULT_DISCOVERY_TTL, DiscoveryManifest, manifest_path
+from nycu_export import FORMATS, export_available, write_tables
+from nycu_fulltext import build_index_file, default_index_file
+from nycu_http import (BASE_URL, ENDPOINT_CLASSES, FAILURE_KINDS, TERMINAL_FAILURES, CircuitBreakers,
+                       FetchError, RateLimiter, SessionPool, classify_failure, parse_rate_option)
+from nycu_incremental import PreviousOutlines
+from nycu_schedule import parse_schedule, schedule_mask
+from nycu_stats import latency_percentiles, peak_rss_mb, write_run_stats
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FuturesTimeout
 from threading import Lock
 
 # 忽略 SSL 警告
@@ -40,39 +56,81 @@ DEFAULT_YEAR = 114          # 學年度
 DEFAULT_SEMESTER = 1        # 學期 (1=上學期, 2=下學期, X=暑期)
 DEFAULT_FETCH_OUTLINE = False  # 是否抓取課程綱要
 DEFAULT_NUM_THREADS = 4     # 線程數量
+AUTO_MAX_THREADS = 16       # --threads auto 時的並行度上限
 DEFAULT_TIMEOUT_SECONDS = 600  # 10 分鐘 timeout
+DEFAULT_ENGINE = 'thread'   # 綱要引擎 (thread / async)
+DEFAULT_ENROLLMENT_BUDGET = 30  # --enrollment-only 的時間預算（秒）
 # ======================================
 
+
+def safe_int(val, default=0):
+    """安全轉換整數（空值或格式錯誤時返回 default）"""
+    try:
+        return int(val) if val and str(val).strip() else default
+    except:
+        return default
+
+
+def safe_float(val, default=0.0):
+    """安全轉換浮點數（空值或格式錯誤時返回 default）"""
+    try:
+        return float(val) if val and str(val).strip() else default
+    except:
+        return default
+
+
+class OutlineTask:
+    """單門課程的綱要爬取狀態（延後重試時保留已取得的子端點）"""
+
+    def __init__(self, cos_id, request_data, endpoints, course=None):
+        self.cos_id = cos_id
+        self.course = course
+        self.request_data = request_data
+        self.attempt = 0                  # 已執行的嘗試次數
+        self.outline_data = {}            # 已取得的子端點資料
+        self.pending = list(endpoints)    # 尚未成功回應的子端點
+        self.outline = None               # 最終結果
+
+
 class NYCUCrawler:
     """陽明交大課程爬蟲類別（4線程版本）"""
 
-    # 時段對應表
-    PERIOD_TIME_MAP = {
-        'y': ('06:00', '06:50'), 'z': ('07:00', '07:50'),
-        '1': ('08:00', '08:50'), '2': ('09:00', '09:50'),
-        '3': ('10:10', '11:00'), '4': ('11:10', '12:00'),
-        'n': ('12:10', '13:00'),
-        '5': ('13:20', '14:10'), '6': ('14:20', '15:10'),
-        '7': ('15:30', '16:20'), '8': ('16:30', '17:20'),
-        '9': ('17:30', '18:20'),
-        'a': ('18:25', '19:15'), 'b': ('19:20', '20:10'),
-        'c': ('20:15', '21:05'), 'd': ('21:10', '22:00')
-    }
-
-    # 星期對應表
-    DAY_MAP = {
-        'M': (1, 'Monday'), 'T': (2, 'Tuesday'), 'W': (3, 'Wednesday'),
-        'R': (4, 'Thursday'), 'F': (5, 'Friday'), 'S': (6, 'Saturday'),
-        'U': (7, 'Sunday')
-    }
-
-    def __init__(self, year, semester, fetch_outline=False, num_threads=4):
+    # 課程綱要子端點：(輸出欄位, 路由)
+    OUTLINE_ENDPOINTS = (
+        ('base', 'main/getCrsOutlineBase'),
+        ('description', 'main/getCrsOutlineDescription'),
+        ('weekly_schedule', 'main/getCrsOutlineSyllabuses'),
+        ('unit_hours', 'main/getCrsOutlineOptional'),
+    )
+
+    # 每次嘗試的超時秒數：8, 7.5, 7, 6.5, 6, 5.5, 5 秒（之後固定 5 秒）
+    OUTLINE_TIMEOUTS = (8, 7.5, 7, 6.5, 6, 5.5, 5)
+
+    # 第幾次嘗試失敗後改用 HTML 備選方案（從 0 起算）
+    HTML_FALLBACK_ATTEMPT = 4
+
+    # 已取得部分綱要時，失敗子端點的最多嘗試次數
+    PART_MAX_ATTEMPTS = 3
+
+    # 探索與綱要爬取之間的佇列長度上限
+    OUTLINE_QUEUE_SIZE = 500
+
+    # worker 等待新課程時，檢查延遲重試佇列的最長間隔（秒）
+    RETRY_POLL_INTERVAL = 0.5
+
+    def __init__(self, year, semester, fetch_outline=False, num_threads=4,
+                 engine=DEFAULT_ENGINE, concurrency=DEFAULT_CONCURRENCY, rates=None,
+                 cache_dir=None, incremental=None, refresh_discovery=False, base_url=BASE_URL,
+                 stats_json=None, fulltext=False, output_format='json'):
         """初始化爬蟲"""
         self.year = year
         self.semester = semester
         self.fetch_outline = fetch_outline
         self.num_threads = num_threads
+        self.engine = engine            # 綱要引擎：thread 或 async
+        self.concurrency = concurrency  # async 引擎同時進行的課程數
         self.acysem = str(year) + str(semester)
+        self.base_url = base_url.rstrip('/')  # 課程時間表網站（或本機重播伺服器）
         self.flang = "zh-tw"
         self.headers = {
             "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
@@ -83,113 +141,72 @@ class NYCUCrawler:
             "X-Requested-With": "XMLHttpRequest"
         }
 
-        self.dep_list = []
+        # --threads auto：以 AIMD 控制器動態調整同時處理的課程數，
+        # 預先建立 AUTO_MAX_THREADS 個 worker，由控制器決定同時有幾個在工作
+        if num_threads == 'auto':
+            self.worker_count = AUTO_MAX_THREADS
+            self.adaptive = AIMDController(initial=DEFAULT_NUM_THREADS, maximum=AUTO_MAX_THREADS,
+                                           on_change=self.log_concurrency)
+            discovery_threads = DEFAULT_NUM_THREADS
+        else:
+            self.worker_count = num_threads
+            self.adaptive = None
+            discovery_threads = num_threads
+
+        # 最大同時連線數：每個線程同時最多發送四個綱要子端點請求
+        self.max_connections = self.worker_count * len(self.OUTLINE_ENDPOINTS)
+        self.discovery_workers = discovery_threads * len(self.OUTLINE_ENDPOINTS)
+
+        # 共用 keep-alive 連線池與限速器（所有線程、階段與 async 引擎共用）
+        self.rate_limiter = RateLimiter(rates)
+        self.circuit_breakers = CircuitBreakers(on_change=self.log_circuit)
+        self.cache = ResponseCache(cache_dir) if cache_dir else None  # 磁碟回應快取（None 為停用）
+        self.http = SessionPool(pool_size=self.max_connections, rate_limiter=self.rate_limiter,
+                                circuit_breakers=self.circuit_breakers, cache=self.cache)
+        if self.adaptive:
+            # 每個回應的延遲與錯誤都回報給控制器
+            self.http.add_listener(self.adaptive.observe)
+
+        # 綱要子端點的並行請求線程池
+        self.part_executor = ThreadPoolExecutor(max_workers=self.max_connections,
+                                                thread_name_prefix='outline-part')
+
+        self.course_index = CourseIndex()  # thread-safe 的系所／課程去重索引
         self.courses_list = []  # 改用陣列儲存
+        self.on_new_courses = None  # 探索取得新課程時的回呼
+        self.checkpoint = None      # 檢查點記錄（CheckpointLog）
+        self.resumed_outlines = {}  # 續爬時檢查點中已取得的綱要（探索未完成時使用）
+        # --incremental：上一次的完整綱要輸出，基本資料未變更的課程沿用其綱要
+        self.previous = PreviousOutlines(incremental) if incremental else None
+        self.refresh_discovery = refresh_discovery  # 忽略系所清單，重新探索
+        self.stats_json = stats_json  # 執行統計輸出路徑（--stats-json）
+        self.fulltext = fulltext      # 完成後建立綱要全文索引（--fulltext）
+        self.output_format = output_format  # json / parquet / arrow（--format）
+        self.outline_started = {}     # cos_id -> 第一次綱要嘗試的開始時間
+        self.course_latencies = []    # 每門課程綱要的完成時間（含退避重試，秒）
+        self.outlines_processed = 0
         self.stats = {
             'total_courses': 0,
             'outline_success': 0,
             'outline_fail': 0,
+            'outline_empty': 0,
+            'outline_retries': 0,
             'start_time': None
         }
+        self.failure_counts = {kind: 0 for kind in FAILURE_KINDS}  # 綱要子端點失敗類型
 
         # Thread-safe 鎖
         self.stats_lock = Lock()
-        self.courses_lock = Lock()
         self.print_lock = Lock()
 
     def parse_schedule_structured(self, time_classroom_str):
         """
-        將時間-教室字串解析為結構化的 schedule 陣列
+        將時間-教室字串解析為結構化的 schedule（見 nycu_schedule.parse_schedule）
 
         輸入範例: "M34W2-EE102[GF],R5-EE201[2F]"
-        輸出: [
-            {
-                "day": 1,
-                "day_name": "Monday",
-                "periods": [3, 4],
-                "time_start": "10:10",
-                "time_end": "12:00",
-                "classroom": "EE102",
-                "floor": "GF"
-            },
-            ...
-        ]
+        相同字串的結果由快取共用且不可修改
         """
-        schedule = []
-        if not time_classroom_str or time_classroom_str.strip() == '':
-            return schedule
-
-        # 分割多個時段
-        segments = time_classroom_str.split(',')
-
-        for segment in segments:
-            segment = segment.strip()
-            if not segment:
-                continue
-
-            # 分離時間和教室 (格式: "M34-EE102[GF]" 或 "M34")
-            parts = segment.split('-')
-            time_part = parts[0] if parts else ''
-            classroom_part = parts[1] if len(parts) > 1 else ''
-
-            # 解析時間部分
-            pattern = r'([MTWRFSU])([1-9yznabcd]+)'
-            matches = re.findall(pattern, time_part)
-
-            for day_code, periods_str in matches:
-                if day_code not in self.DAY_MAP:
-                    continue
-
-                day_num, day_name = self.DAY_MAP[day_code]
-
-                # 解析時段
-                periods = [p for p in periods_str]
-                period_numbers = []
-
-                for p in periods:
-                    if p in self.PERIOD_TIME_MAP:
-                        # 將時段字元轉換為數字（用於排序和顯示）
-                        if p == 'y': period_numbers.append(0)
-                        elif p == 'z': period_numbers.append(1)
-                        elif p == 'n': period_numbers.append(7)
-                        elif p == 'a': period_numbers.append(10)
-                        elif p == 'b': period_numbers.append(11)
-                        elif p == 'c': period_numbers.append(12)
-                        elif p == 'd': period_numbers.append(13)
-                        else: period_numbers.append(int(p))
-
-                if not period_numbers:
-                    continue
-
-                # 計算開始和結束時間
-                first_period = periods[0]
-                last_period = periods[-1]
-                time_start = self.PERIOD_TIME_MAP.get(first_period, ('', ''))[0]
-                time_end = self.PERIOD_TIME_MAP.get(last_period, ('', ''))[1]
-
-                # 解析教室和樓層
-                classroom = ''
-                floor = ''
-                if classroom_part:
-                    # 提取樓層資訊 (例如: "EE102[GF]" 或 "EE201[2F]")
-                    floor_match = re.search(r'\[([^\]]+)\]', classroom_part)
-                    if floor_match:
-                        floor = floor_match.group(1)
-                        classroom = classroom_part[:floor_match.start()]
-                    else:
-                        classroom = classroom_part
-
-                schedule.append({
-                    "day": day_num,
-                    "day_name": day_name,
-                    "periods": period_numbers,
-                    "time_start": time_start,
-                    "time_end": time_end,
-                    "classroom": classroom,
-                    "floor": floor
-                })
-
-        return schedule
+        return parse_schedule(time_classroom_str)
 
     def parse_outline_weekly_schedule(self, weekly_data):
         """
@@ -266,32 +283,45 @@ class NYCUCrawler:
 
         return structured_units
 
-    def extract_outline_from_html(self, cos_id, timeout=4):
+    def parse_outline_html(self, html_text):
         """
-        激進備選方案：從多個 HTML 頁面來源解析課程綱要
-        當 JSON API 失敗時使用 - 只要有任何內容就返回
+        從 HTML 頁面內容解析課程綱要
+        只要有足夠的文字內容就返回，否則返回 None
         """
-        html_urls = [
-            f"https://timetable.nycu.edu.tw/?r=course/syllabus&acy={self.year}&sem={self.semester}&cos_id={cos_id}",
-            f"https://timetable.nycu.edu.tw/?r=main/course_detail&acy={self.year}&sem={self.semester}&cos_id={cos_id}",
+        soup = BeautifulSoup(html_text, 'html.parser')
+
+        # 激進：任何非空文本都算成功
+        all_text = soup.get_text(separator=' ', strip=True)
+
+        if all_text and len(all_text) > 50:
+            # 簡單清理
+            text = ' '.join(all_text.split()[:500])
+            return {
+                'outline': text,
+                'source': 'html_parser'
+            }
+
+        return None
+
+    def outline_html_urls(self, cos_id):
+        """HTML 備選方案的頁面來源"""
+        return [
+            f"{self.base_url}/?r=course/syllabus&acy={self.year}&sem={self.semester}&cos_id={cos_id}",
+            f"{self.base_url}/?r=main/course_detail&acy={self.year}&sem={self.semester}&cos_id={cos_id}",
         ]
 
-        for url in html_urls:
+    def extract_outline_from_html(self, cos_id, timeout=4, fresh=False):
+        """
+        激進備選方案：從多個 HTML 頁面來源解析課程綱要
+        當 JSON API 失敗時使用 - 只要有任何內容就返回；fresh=True 時略過回應快取
+        """
+        for url in self.outline_html_urls(cos_id):
             try:
-                response = requests.get(url, headers=self.headers, verify=False, timeout=timeout)
+                response = self.http.get(url, headers=self.headers, verify=False, timeout=timeout, fresh=fresh)
 
                 if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    outline_data = {}
-
-                    # 激進：任何非空文本都算成功
-                    all_text = soup.get_text(separator=' ', strip=True)
-
-                    if all_text and len(all_text) > 50:
-                        # 簡單清理
-                        text = ' '.join(all_text.split()[:500])
-                        outline_data['outline'] = text
-                        outline_data['source'] = 'html_parser'
+                    outline_data = self.parse_outline_html(response.text)
+                    if outline_data:
                         return outline_data
 
             except Exception:
@@ -299,9 +329,92 @@ class NYCUCrawler:
 
         return None
 
-    def get_course_outline(self, cos_id, max_retries=10):
+    def outline_request_data(self, cos_id):
+        """課程綱要 API 的 POST 參數"""
+        return {
+            "acy": str(self.year),
+            "sem": str(self.semester),
+            "cos_id": str(cos_id),
+            "user": "",
+            "_token": ""
+        }
+
+    def build_outline_part(self, part, payload):
+        """
+        將單一綱要子端點的 JSON 回應轉換為輸出格式
+
+        API 可能返回 False、空值或格式不一致的資料，無有效資料時返回 None
+        """
+        if part == 'base':
+            # 適應性檢查：確保是字典且有資料
+            if isinstance(payload, dict) and payload:
+                return {
+                    'course_name': payload.get('cos_name', ''),
+                    'course_name_eng': payload.get('cos_eng_name', ''),
+                    'selection_type': payload.get('sel_type_name', ''),
+                    'selection_type_eng': payload.get('sel_type_eng_name', ''),
+                    'department': payload.get('dep_name', ''),
+                    'department_eng': payload.get('depEName', ''),
+                    'course_code': payload.get('cos_code', ''),
+                    'teacher_hours': payload.get('teacher_hours', ''),
+                    'total_hours': payload.get('total_teacher_hours', '')
+                }
+        elif part == 'description':
+            # 適應性檢查：確保是字典類型且有內容
+            if isinstance(payload, dict) and payload:
+                return {
+                    'prerequisite': payload.get('crs_prerequisite', ''),
+                    'outline': payload.get('crs_outline', ''),
+                    'textbook': payload.get('crs_textbook', ''),
+                    'grading': payload.get('crs_exam_score', ''),
+                    'teaching_method': payload.get('crs_teach_method', ''),
+                    'meeting_time': payload.get('crs_meeting_time', ''),
+                    'meeting_place': payload.get('crs_meeting_place', ''),
+                    'contact': payload.get('crs_contact', '')
+                }
+        elif part == 'weekly_schedule':
+            return self.parse_outline_weekly_schedule(payload) or None
+        elif part == 'unit_hours':
+            return self.parse_outline_unit_hours(payload) or None
+        return None
+
+    def fetch_outline_part(self, route, request_data, timeout, fresh=False):
+        """
+        取得單一綱要子端點的 JSON 回應
+
+        連線失敗、逾時或非 200 回應時拋出例外（可重試的失敗稍後獨立重試）；重試時 fresh=True，略過回應快取
+        """
+        response = self.http.post(f"{self.base_url}/?r={route}",
+                                  data=request_data, headers=self.ajax_headers,
+                                  verify=False, timeout=timeout, fresh=fresh)
+        if response.status_code != 200:
+            raise FetchError.from_status(response.status_code)
+        return response.json()
+
+    def retry_delay(self, attempt):
+        """第 attempt 次嘗試（從 0 起算）失敗後的退避秒數"""
+        return 0.3 * (2 ** attempt)
+
+    def _outline_finished(self, task, outline, empty=False):
+        """記錄綱要結果並結束工作（empty 表示課程沒有綱要，不算失敗）"""
+        task.outline = outline
+        with self.stats_lock:
+            if outline:
+                self.stats['outline_success'] += 1
+            elif empty:
+                self.stats['outline_empty'] += 1
+            else:
+                self.stats['outline_fail'] += 1
+        return True
+
+    def record_failure(self, kind):
+        """記錄綱要子端點的失敗類型"""
+        with self.stats_lock:
+            self.failure_counts[kind] += 1
+
+    def outline_attempt(self, task, max_retries=10):
         """
-        取得課程綱要（帶激進重試機制和適應性錯誤處理）
+        執行一次綱要嘗試（四個子端點並行 + 各自獨立重試）
 
         這個函數具有適應性，能處理：
         - API 返回 False 或 None
@@ -310,190 +423,111 @@ class NYCUCrawler:
         - 連線逾時和瞬時失敗
         - 只要有任何成功的資料就算成功
 
-        改進：
-        - 重試次數：3 → 7
-        - 超時時間：10 → 20 秒
-        - 指數退避策略
+        失敗依類型處理：逾時、連線錯誤與 5xx 會重試；
+        無資料（False、空值）與 4xx 重試也不會改變結果，該子端點直接結束。
+
+        完成（成功、無綱要或放棄）時返回 True，結果在 task.outline；
+        需要重試時返回 False，呼叫端在 retry_delay(task.attempt - 1) 秒後再次呼叫。
+        已成功的子端點保留在 task 中，重試時不會重新請求。
         """
-        outline_data = {}
-        success_count = 0  # 記錄成功獲取的 API 數量
-        request_data = {
-            "acy": str(self.year),
-            "sem": str(self.semester),
-            "cos_id": str(cos_id),
-            "user": "",
-            "_token": ""
-        }
+        attempt = task.attempt
+        task.attempt += 1
+        if attempt == 0:
+            self.mark_outline_started(task.cos_id)
 
-        for attempt in range(max_retries):
-            try:
-                # 短超時 + 激進重試（更好的連線策略）
-                timeout_val = 8 - (attempt * 0.5) if attempt < 6 else 5  # 8, 7.5, 7, 6.5, 6, 5.5, 5 秒
-                retry_delay = 0.1 * (1.5 ** attempt)  # 0.1, 0.15, 0.22, 0.34, 0.51, 0.76, 1.14 秒
-
-                # 1. 基本資料
-                url_base = "https://timetable.nycu.edu.tw/?r=main/getCrsOutlineBase"
-                response = requests.post(url_base, data=request_data,
-                                       headers=self.ajax_headers, verify=False, timeout=timeout_val)
-                if response.status_code == 200:
-                    base_data = response.json()
-                    # 適應性檢查：確保是字典且有資料
-                    if isinstance(base_data, dict) and base_data:
-                        outline_data['base'] = {
-                            'course_name': base_data.get('cos_name', ''),
-                            'course_name_eng': base_data.get('cos_eng_name', ''),
-                            'selection_type': base_data.get('sel_type_name', ''),
-                            'selection_type_eng': base_data.get('sel_type_eng_name', ''),
-                            'department': base_data.get('dep_name', ''),
-                            'department_eng': base_data.get('depEName', ''),
-                            'course_code': base_data.get('cos_code', ''),
-                            'teacher_hours': base_data.get('teacher_hours', ''),
-                            'total_hours': base_data.get('total_teacher_hours', '')
-                        }
-                        success_count += 1
-
-                time.sleep(0.02)  # 進一步減少延遲
-
-                # 2. 課程描述（可選，失敗不影響整體）
-                try:
-                    url_desc = "https://timetable.nycu.edu.tw/?r=main/getCrsOutlineDescription"
-                    response = requests.post(url_desc, data=request_data,
-                                           headers=self.ajax_headers, verify=False, timeout=timeout_val)
-                    if response.status_code == 200:
-                        desc_data = response.json()
-                        # 適應性檢查：確保是字典類型且有內容
-                        if isinstance(desc_data, dict) and desc_data:
-                            outline_data['description'] = {
-                                'prerequisite': desc_data.get('crs_prerequisite', ''),
-                                'outline': desc_data.get('crs_outline', ''),
-                                'textbook': desc_data.get('crs_textbook', ''),
-                                'grading': desc_data.get('crs_exam_score', ''),
-                                'teaching_method': desc_data.get('crs_teach_method', ''),
-                                'meeting_time': desc_data.get('crs_meeting_time', ''),
-                                'meeting_place': desc_data.get('crs_meeting_place', ''),
-                                'contact': desc_data.get('crs_contact', '')
-                            }
-                            success_count += 1
-                except Exception:
-                    pass  # 靜默失敗，不影響其他資料獲取
+        # 短超時 + 激進重試（更好的連線策略）
+        timeout_val = self.OUTLINE_TIMEOUTS[min(attempt, len(self.OUTLINE_TIMEOUTS) - 1)]
 
-                time.sleep(0.02)
+        futures = [(part, route, self.part_executor.submit(self.fetch_outline_part,
+                                                           route, task.request_data, timeout_val,
+                                                           attempt > 0))
+                   for part, route in task.pending]
 
-                # 3. 每週進度（可選，失敗不影響整體）
-                try:
-                    url_syllabus = "https://timetable.nycu.edu.tw/?r=main/getCrsOutlineSyllabuses"
-                    response = requests.post(url_syllabus, data=request_data,
-                                           headers=self.ajax_headers, verify=False, timeout=timeout_val)
-                    if response.status_code == 200:
-                        syllabus_data = response.json()
-                        weekly = self.parse_outline_weekly_schedule(syllabus_data)
-                        if weekly:  # 只在有資料時才加入
-                            outline_data['weekly_schedule'] = weekly
-                            success_count += 1
-                except Exception:
-                    pass  # 靜默失敗
+        failed = []
+        for part, route, future in futures:
+            try:
+                value = self.build_outline_part(part, future.result())
+            except Exception as e:
+                kind = classify_failure(e)
+                self.record_failure(kind)
+                if kind not in TERMINAL_FAILURES:
+                    failed.append((part, route))
+                continue
+            if value:  # 只在有資料時才加入
+                task.outline_data[part] = value
+            else:
+                self.record_failure('empty')
+        task.pending = failed
 
-                time.sleep(0.02)
+        # 適應性成功判斷：只要有任何一個 API 成功就算成功，
+        # 失敗的子端點最多重試 PART_MAX_ATTEMPTS 次
+        if task.outline_data and (not task.pending or attempt + 1 >= self.PART_MAX_ATTEMPTS):
+            return self._outline_finished(task, task.outline_data)
 
-                # 4. 單元時數（可選，失敗不影響整體）
-                try:
-                    url_optional = "https://timetable.nycu.edu.tw/?r=main/getCrsOutlineOptional"
-                    response = requests.post(url_optional, data=request_data,
-                                           headers=self.ajax_headers, verify=False, timeout=timeout_val)
-                    if response.status_code == 200:
-                        optional_data = response.json()
-                        units = self.parse_outline_unit_hours(optional_data)
-                        if units:  # 只在有資料時才加入
-                            outline_data['unit_hours'] = units
-                            success_count += 1
-                except Exception:
-                    pass  # 靜默失敗
+        if not task.outline_data:
+            if not task.pending:
+                # 所有子端點都是終止性結果（無資料或 4xx）：課程沒有綱要，不再重試
+                return self._outline_finished(task, None, empty=True)
 
-                # 適應性成功判斷：只要有任何一個 API 成功就算成功
-                if success_count > 0:
-                    with self.stats_lock:
-                        self.stats['outline_success'] += 1
-                    return outline_data
-                else:
-                    raise Exception("所有 API 都沒有返回有效資料")
+            # 在第5次失敗後，嘗試 HTML 備選方案
+            if attempt == self.HTML_FALLBACK_ATTEMPT:
+                html_result = self.extract_outline_from_html(task.cos_id, timeout=4)
+                if html_result:
+                    return self._outline_finished(task, html_result)
 
-            except Exception as e:
-                # 在第5次失敗後，嘗試 HTML 備選方案
-                if attempt == 4:
-                    try:
-                        html_result = self.extract_outline_from_html(cos_id, timeout=4)
-                        if html_result:
-                            with self.stats_lock:
-                                self.stats['outline_success'] += 1
-                            return html_result
-                    except:
-                        pass
-
-                if attempt < max_retries - 1:
-                    # 指數退避重試
-                    retry_delay = 0.3 * (2 ** attempt)
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    # JSON API 全部失敗，再試一次 HTML 備選方案
-                    try:
-                        html_result = self.extract_outline_from_html(cos_id, timeout=3)
-                        if html_result:
-                            with self.stats_lock:
-                                self.stats['outline_success'] += 1
-                            return html_result
-                    except:
-                        pass
+        if attempt < max_retries - 1:
+            return False
 
-                    with self.stats_lock:
-                        self.stats['outline_fail'] += 1
-                    return None
+        # JSON API 全部失敗，再試一次 HTML 備選方案
+        return self._outline_finished(task, self.extract_outline_from_html(task.cos_id, timeout=3, fresh=True))
 
-        return None
+    def get_course_outline(self, cos_id, max_retries=10):
+        """
+        取得單門課程綱要（阻塞直到完成，退避期間在目前線程等待）
 
-    def _fetch_outline_worker(self, course):
-        """單個課程綱要爬取的 worker 函數（供線程使用）"""
-        if 'outline' not in course:
-            outline = self.get_course_outline(course['id'])
-            if outline:
-                course['outline'] = outline
+        批次爬取使用 outline_attempt + RetryQueue，退避期間 worker 可處理其他課程
+        """
+        task = OutlineTask(cos_id, self.outline_request_data(cos_id), self.OUTLINE_ENDPOINTS)
+        while not self.outline_attempt(task, max_retries):
+            # 指數退避重試
+            time.sleep(self.retry_delay(task.attempt - 1))
+        return task.outline
 
     def get_type(self):
         """取得課程類型列表"""
-        res = requests.get('https://timetable.nycu.edu.tw/?r=main/get_type',
-                          headers=self.headers, verify=False)
+        res = self.http.get(f'{self.base_url}/?r=main/get_type',
+                           headers=self.headers, verify=False)
         return res.json()
 
     def get_category(self, ftype):
         """取得課程類別"""
-        res = requests.post('https://timetable.nycu.edu.tw/?r=main/get_category',
-                          data={'ftype': ftype, 'flang': self.flang,
-                                'acysem': self.acysem, 'acysemend': self.acysem},
-                          headers=self.headers, verify=False)
+        res = self.http.post(f'{self.base_url}/?r=main/get_category',
+                           data={'ftype': ftype, 'flang': self.flang,
+                                 'acysem': self.acysem, 'acysemend': self.acysem},
+                           headers=self.headers, verify=False)
         return res.json()
 
     def get_college(self, fcategory, ftype):
         """取得學院列表"""
-        res = requests.post('https://timetable.nycu.edu.tw/?r=main/get_college',
-                          data={'fcategory': fcategory, 'ftype': ftype,
-                                'flang': self.flang, 'acysem': self.acysem,
-                                'acysemend': self.acysem},
-                          headers=self.headers, verify=False)
+        res = self.http.post(f'{self.base_url}/?r=main/get_college',
+                           data={'fcategory': fcategory, 'ftype': ftype,
+                                 'flang': self.flang, 'acysem': self.acysem,
+                                 'acysemend': self.acysem},
+                           headers=self.headers, verify=False)
         return res.json()
 
     def get_dep(self, fcollege, fcategory, ftype):
         """取得系所列表"""
-        res = requests.post('https://timetable.nycu.edu.tw/?r=main/get_dep',
-                          data={'fcollege': fcollege, 'fcategory': fcategory,
-                                'ftype': ftype, 'flang': self.flang,
-                                'acysem': self.acysem, 'acysemend': self.acysem},
-                          headers=self.headers, verify=False)
+        res = self.http.post(f'{self.base_url}/?r=main/get_dep',
+                           data={'fcollege': fcollege, 'fcategory': fcategory,
+                                 'ftype': ftype, 'flang': self.flang,
+                                 'acysem': self.acysem, 'acysemend': self.acysem},
+                           headers=self.headers, verify=False)
         return res.json()
 
-    def get_cos(self, dep):
-        """取得課程列表"""
-        url = "https://timetable.nycu.edu.tw/?r=main/get_cos_list"
-        data = {
+    def cos_list_request_data(self, dep):
+        """get_cos_list 的 POST 內容"""
+        return {
             "m_acy": self.year, "m_sem": self.semester,
             "m_acyend": self.year, "m_semend": self.semester,
             "m_dep_uid": dep, "m_group": "**", "m_grade": "**",
@@ -503,15 +537,23 @@ class NYCUCrawler:
             "m_selcampus": "**"
         }
 
-        r = requests.post(url, headers=self.headers, verify=False, data=data)
+    def get_cos(self, dep):
+        """取得課程列表，返回本次新增的課程"""
+        url = f"{self.base_url}/?r=main/get_cos_list"
+        r = self.http.post(url, headers=self.headers, verify=False, data=self.cos_list_request_data(dep))
         if r.status_code != requests.codes.ok:
-            return
+            return []
 
-        raw_data = json.loads(r.text)
+        return self.parse_cos_list(dep, json.loads(r.text))
 
-        # 使用 set 來追蹤已處理的課程 ID
-        with self.courses_lock:
-            existing_ids = {course['id'] for course in self.courses_list}
+    def parse_cos_list(self, dep, raw_data):
+        """
+        將 get_cos_list 回應轉換為課程資料，返回本次新增的課程
+
+        已出現過的課程只登記位置（見 CourseIndex）；與網路請求分開，供 benchmarks/bench_parsing.py 使用
+        """
+        new_courses = []
+        position = 0  # 課程在此系所回應中的位置（決定輸出順序）
 
         for dep_value in raw_data:
             language = raw_data[dep_value]["language"]
@@ -519,8 +561,10 @@ class NYCUCrawler:
                 if re.match("^[1-2]+$", dep_content) is None:
                     continue
                 for cos_id in raw_data[dep_value][dep_content]:
-                    # 檢查是否已存在
-                    if cos_id in existing_ids:
+                    position += 1
+
+                    # 檢查是否已存在（thread-safe 索引）
+                    if not self.course_index.claim_course(cos_id, dep, position):
                         continue
 
                     raw_cos_data = raw_data[dep_value][dep_content][cos_id]
@@ -536,19 +580,6 @@ class NYCUCrawler:
                     # 清理課程名稱
                     name = raw_cos_data["cos_cname"].replace("(英文授課)", '').replace("(英文班)", '').strip()
 
-                    # 安全轉換數字
-                    def safe_int(val, default=0):
-                        try:
-                            return int(val) if val and str(val).strip() else default
-                        except:
-                            return default
-
-                    def safe_float(val, default=0.0):
-                        try:
-                            return float(val) if val and str(val).strip() else default
-                        except:
-                            return default
-
                     # 建立新格式的課程資料
                     course = {
                         "id": raw_cos_data["cos_id"],
@@ -563,16 +594,108 @@ class NYCUCrawler:
                             "current": safe_int(raw_cos_data["reg_num"])
                         },
                         "schedule": schedule,
+                        "schedule_mask": schedule_mask(raw_cos_data["cos_time"]),  # 7 天 × 16 節位元遮罩
                         "english_taught": language[cos_id]["授課語言代碼"] == "en-us",
                         "tags": tags,
                         "raw_time_classroom": raw_cos_data["cos_time"]  # 保留原始格式以供參考
                     }
 
-                    with self.courses_lock:
-                        self.courses_list.append(course)
-                        existing_ids.add(cos_id)
-                        with self.stats_lock:
-                            self.stats['total_courses'] += 1
+                    self.course_index.store_course(cos_id, course)
+                    new_courses.append(course)
+                    with self.stats_lock:
+                        self.stats['total_courses'] += 1
+
+        return new_courses
+
+    def _expand_type(self, type_index, course_type):
+        """探索：課程類型 → 類別"""
+        ftype = course_type["uid"]
+        categories = self.get_category(ftype)
+
+        if course_type["cname"] == "其他課程":
+            # 「其他課程」的類別即為系所
+            return [(self._fetch_dep, (fcategory, (type_index, j)))
+                    for j, fcategory in enumerate(categories.keys())]
+
+        return [(self._expand_category, (fcategory, ftype, (type_index, j)))
+                for j, fcategory in enumerate(categories.keys())]
+
+    def _expand_category(self, fcategory, ftype, order):
+        """探索：類別 → 學院（或直接到系所）"""
+        colleges = self.get_college(fcategory, ftype)
+        if len(colleges):
+            return [(self._expand_college, (fcollege, fcategory, ftype, order + (k,)))
+                    for k, fcollege in enumerate(colleges.keys())]
+
+        deps = self.get_dep("", fcategory, ftype)
+        if not len(deps):
+            return []
+        return [(self._fetch_dep, (fdep, order + (l,)))
+                for l, fdep in enumerate(deps.keys())]
+
+    def _expand_college(self, fcollege, fcategory, ftype, order):
+        """探索：學院 → 系所"""
+        deps = self.get_dep(fcollege, fcategory, ftype)
+        if not len(deps):
+            return []
+        return [(self._fetch_dep, (fdep, order + (l,)))
+                for l, fdep in enumerate(deps.keys())]
+
+    def _fetch_dep(self, dep, order):
+        """取得系所的課程列表（同一系所只取一次）"""
+        if self.course_index.add_dep(dep, order):
+            new_courses = self.get_cos(dep)
+            if self.on_new_courses:
+                self.on_new_courses(new_courses)
+        return []
+
+    def load_discovery_manifest(self):
+        """有效期限內的系所清單；沒有、已過期或指定 --refresh-discovery 時返回 None"""
+        if self.refresh_discovery:
+            return None
+        manifest = DiscoveryManifest.load(manifest_path(self.year, self.semester), self.acysem)
+        if manifest is None or not manifest.is_fresh(DEFAULT_DISCOVERY_TTL):
+            return None
+        return manifest
+
+    def discover_courses(self, on_new_courses=None):
+        """
+        並行探索 類型 → 類別 → 學院 → 系所 → 課程
+
+        每個節點的 POST 都是獨立的，以有界線程池同時展開探索樹；
+        一取得系所 id 就立即並行呼叫 get_cos。
+        有效期限內的系所清單存在時略過探索樹，直接對已知系所並行呼叫 get_cos；
+        完整探索後更新系所清單。
+        on_new_courses 會在每次 get_cos 取得新課程後被呼叫（於探索線程中）
+        """
+        self.on_new_courses = on_new_courses
+        manifest = self.load_discovery_manifest()
+
+        with ThreadPoolExecutor(max_workers=self.discovery_workers,
+                                thread_name_prefix='discovery') as executor:
+            pending = set()
+            if manifest:
+                with self.print_lock:
+                    print(f"  使用系所清單（{manifest.describe()}）")
+                for dep, order in manifest.departments:
+                    pending.add(executor.submit(self._fetch_dep, dep, order))
+            else:
+                for i, course_type in enumerate(self.get_type()):
+                    with self.print_lock:
+                        print(f"  處理: {course_type['cname']}")
+                    pending.add(executor.submit(self._expand_type, i, course_type))
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for task, task_args in future.result():
+                        pending.add(executor.submit(task, *task_args))
+
+        self.courses_list = self.course_index.courses()
+
+        departments = self.course_index.dep_entries()
+        if not manifest and departments:
+            DiscoveryManifest(self.acysem, departments).save(manifest_path(self.year, self.semester))
 
     def print_progress(self):
         """顯示進度"""
@@ -580,7 +703,7 @@ class NYCUCrawler:
             total = self.stats['total_courses']
             success = self.stats['outline_success']
             fail = self.stats['outline_fail']
-            processed = success + fail
+            processed = success + fail + self.stats['outline_empty']
 
             if total > 0:
                 progress_pct = (processed / total) * 100
@@ -596,56 +719,247 @@ class NYCUCrawler:
                               f"成功: {success} | 失敗: {fail} | "
                               f"預估剩餘: {eta}", end='', flush=True)
 
-    def save_checkpoint(self, filename, metadata):
-        """保存檢查點"""
-        checkpoint_data = {
-            "metadata": metadata,
-            "courses": self.courses_list
-        }
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(checkpoint_data, f, ensure_ascii=False, indent=2)
+    def log_concurrency(self, elapsed, old_limit, new_limit, reason):
+        """AIMD 控制器調整並行度時記錄（--threads auto）"""
+        direction = "↑" if new_limit > old_limit else "↓"
+        with self.print_lock:
+            print(f"\n[並行度] {elapsed:7.1f}s  {old_limit} {direction} {new_limit}（{reason}）")
 
-    def fetch_all_outlines_multithreaded(self, checkpoint_file, metadata):
-        """批次取得所有課程綱要（4線程版本）"""
+    def log_circuit(self, name, old_state, new_state):
+        """斷路器狀態改變時記錄"""
+        labels = {'closed': '關閉（恢復正常）', 'open': '開啟（暫停請求）', 'half_open': '半開（探測中）'}
         with self.print_lock:
-            print(f"\n開始取得課程綱要（{self.num_threads}線程）...")
+            print(f"\n[斷路器] {name}: {labels[new_state]}")
 
-        self.stats['start_time'] = datetime.now()
-        count = 0
+    def print_failure_stats(self):
+        """顯示綱要失敗類型與斷路器統計"""
+        with self.stats_lock:
+            counts = dict(self.failure_counts)
+        print("失敗類型: " + " | ".join(f"{kind} {count}" for kind, count in counts.items()))
+        trips = {name: n for name, n in self.circuit_breakers.trips().items() if n}
+        if trips:
+            print("斷路器開啟: " + " | ".join(f"{name} {n} 次" for name, n in trips.items()))
+
+    def threads_label(self):
+        """線程配置的顯示文字"""
+        if not self.adaptive:
+            return f"{self.num_threads}線程"
+        limits = [limit for _, limit in self.adaptive.history]
+        return (f"auto（AIMD，最終 {self.adaptive.limit}，最高 {max(limits)}，"
+                f"最低 {min(limits)}，調整 {len(limits) - 1} 次）")
+
+    def close(self):
+        """釋放線程池與連線池，並將檢查點記錄寫入磁碟"""
+        if self.checkpoint:
+            self.checkpoint.close()
+        self.part_executor.shutdown(wait=False)
+        self.http.close()
+
+    def print_connection_stats(self):
+        """顯示 HTTP 連線重用統計"""
+        conn = self.http.connection_stats()
+        print(f"HTTP 請求: {conn['requests']} 次 | "
+              f"新建連線: {conn['new_connections']} | "
+              f"重用連線: {conn['reused_connections']}")
+        if self.cache:
+            cache = self.cache.stats()
+            print(f"快取: 命中 {cache['hits']} | 未命中 {cache['misses']} | 淘汰 {cache['evictions']} | "
+                  f"{cache['entries']} 項（{cache['bytes'] / 1024 / 1024:.1f} MB）")
+        if self.rate_limiter.buckets:
+            waited = self.rate_limiter.wait_stats()
+            print("限速等待: " + " | ".join(f"{endpoint} 延後 {w['delayed']} 次（平均 {w['avg_wait']:.2f}s）"
+                                         for endpoint, w in waited.items()))
+
+    def mark_outline_started(self, cos_id):
+        """記錄課程第一次綱要嘗試的開始時間（每門課程延遲統計用）"""
+        self.outline_started.setdefault(cos_id, time.monotonic())
+
+    def _outline_done(self, course, outline):
+        """
+        單門課程綱要完成後的處理（只在主線程執行）
 
-        # 取得需要爬取綱要的課程
-        courses_to_fetch = [c for c in self.courses_list if 'outline' not in c]
-        total_to_fetch = len(courses_to_fetch)
+        課程資料只在此處修改；取得綱要的課程追加一筆檢查點記錄
+        """
+        started = self.outline_started.pop(course['id'], None)
+        if started is not None:
+            self.course_latencies.append(time.monotonic() - started)
+
+        if outline:
+            course['outline'] = outline
+            if self.checkpoint:
+                self.checkpoint.write_outline(course['id'], outline)
+
+        self.outlines_processed += 1
+        self.print_progress()
+
+    def outline_queue_from_list(self):
+        """將尚未取得綱要的課程放入佇列（以 None 結尾）"""
+        source = queue.Queue()
+        for course in self.courses_list:
+            if 'outline' not in course:
+                source.put(course)
+        source.put(None)
+        return source
+
+    def fetch_all_outlines_multithreaded(self, source):
+        """
+        批次取得所有課程綱要（4線程版本）
 
-        if total_to_fetch == 0:
-            with self.print_lock:
-                print("所有課程綱要已獲取")
-            return
+        worker 線程從 source 佇列取出課程，直到遇到 None；
+        失敗的課程放入延遲重試佇列，退避期間 worker 繼續處理新課程，
+        新課程用盡後進行最後清掃。結果交回主線程處理進度與檢查點
+        """
+        with self.print_lock:
+            if self.adaptive:
+                print(f"\n開始取得課程綱要（自動並行度，初始 {self.adaptive.limit}，"
+                      f"上限 {self.adaptive.maximum}）...")
+            else:
+                print(f"\n開始取得課程綱要（{self.num_threads}線程）...")
+
+        results = queue.Queue()
+        retries = RetryQueue()
+        # auto 模式下每次嘗試需先取得控制器的並行名額
+        slot = self.adaptive or nullcontext()
 
-        # 使用 ThreadPoolExecutor 進行並行爬取
-        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-            futures = {executor.submit(self._fetch_outline_worker, course): course
-                      for course in courses_to_fetch}
+        def next_task(source_done):
+            """取得下一個工作：到期的重試優先，其次是新課程；全部完成時返回 None"""
+            while not source_done[0]:
+                task = retries.pop_ready()
+                if task is not None:
+                    return task
 
-            for future in as_completed(futures):
+                wait = retries.time_to_next()
+                try:
+                    course = source.get(timeout=min(wait if wait is not None else self.RETRY_POLL_INTERVAL,
+                                                    self.RETRY_POLL_INTERVAL))
+                except queue.Empty:
+                    continue
+                if course is None:
+                    source.put(None)  # 讓其他 worker 也結束
+                    source_done[0] = True
+                    break
+                retries.start()
+                return OutlineTask(course['id'], self.outline_request_data(course['id']),
+                                   self.OUTLINE_ENDPOINTS, course)
+
+            # 最後清掃：處理剩餘的延遲重試
+            return retries.sweep()
+
+        def worker():
+            source_done = [False]
+            while True:
+                task = next_task(source_done)
+                if task is None:
+                    break
                 try:
-                    future.result()
+                    with slot:
+                        finished = self.outline_attempt(task)
                 except Exception as e:
+                    finished = True
+                    task.outline = None
                     with self.print_lock:
                         print(f"\n線程錯誤: {e}")
 
-                count += 1
-                self.print_progress()
+                if finished:
+                    results.put((task.course, task.outline))
+                else:
+                    with self.stats_lock:
+                        self.stats['outline_retries'] += 1
+                    # 指數退避：放入延遲重試佇列，不佔用 worker
+                    retries.push(task, self.retry_delay(task.attempt - 1))
+                retries.done()
+            results.put(None)
+
+        workers = [threading.Thread(target=worker, name=f'outline-{i}', daemon=True)
+                   for i in range(self.worker_count)]
+        for thread in workers:
+            thread.start()
+
+        finished = 0
+        while finished < len(workers):
+            item = results.get()
+            if item is None:
+                finished += 1
+                continue
+            self._outline_done(*item)
+
+        with self.print_lock:
+            print()  # 換行
 
-                # 每 50 門課程保存一次
-                if count % 50 == 0:
-                    metadata['last_updated'] = datetime.now().isoformat() + 'Z'
-                    metadata['total_courses'] = len(self.courses_list)
-                    self.save_checkpoint(checkpoint_file, metadata)
+    def fetch_all_outlines_async(self, source):
+        """批次取得所有課程綱要（asyncio 引擎）"""
+        with self.print_lock:
+            print(f"\n開始取得課程綱要（async 引擎，並行 {self.concurrency}）...")
+
+        AsyncOutlineEngine(self, self.concurrency).run(source, self._outline_done)
 
         with self.print_lock:
             print()  # 換行
 
+    def fetch_all_outlines(self, source=None):
+        """
+        依 --engine 選擇綱要引擎
+
+        source 為課程佇列（以 None 結尾），未指定時使用 courses_list 中尚無綱要的課程
+        """
+        if source is None:
+            source = self.outline_queue_from_list()
+
+        self.stats['start_time'] = datetime.now()
+        self.outlines_processed = 0
+
+        if self.engine == 'async':
+            self.fetch_all_outlines_async(source)
+        else:
+            self.fetch_all_outlines_multithreaded(source)
+
+    def crawl_pipelined(self):
+        """
+        階段 1 與階段 2 管線化
+
+        探索線程每取得一個系所的課程，就放入有界佇列交給綱要引擎，
+        探索與綱要爬取同時進行；佇列已滿時探索會等待（背壓）。
+        課程放入佇列前先寫入檢查點記錄，探索完成時記錄課程順序
+        """
+        outline_queue = queue.Queue(maxsize=self.OUTLINE_QUEUE_SIZE)
+        discovery_errors = []
+
+        def enqueue(courses):
+            # 此時課程尚未交給主線程，可安全序列化
+            self.checkpoint.write_courses(courses)
+            for course in courses:
+                outline = self.resumed_outlines.get(course['id'])
+                if not outline and self.previous:
+                    # 增量模式：基本資料未變更的課程沿用上次的綱要
+                    outline = self.previous.outline_for(course)
+                    if outline:
+                        self.checkpoint.write_outline(course['id'], outline)
+                if outline:
+                    # 續爬或增量模式：已有綱要，不需請求
+                    course['outline'] = outline
+                    with self.stats_lock:
+                        self.stats['outline_success'] += 1
+                    continue
+                outline_queue.put(course)
+
+        def discover():
+            try:
+                self.discover_courses(on_new_courses=enqueue)
+                self.checkpoint.write_order(self.courses_list)
+            except Exception as e:
+                discovery_errors.append(e)
+            finally:
+                outline_queue.put(None)
+
+        discovery_thread = threading.Thread(target=discover, name='discovery', daemon=True)
+        discovery_thread.start()
+
+        self.fetch_all_outlines(outline_queue)
+        discovery_thread.join()
+
+        if discovery_errors:
+            raise discovery_errors[0]
+
     def create_metadata(self):
         """建立 metadata"""
         semester_name_map = {1: "上學期", 2: "下學期", 'X': "暑期"}
@@ -658,23 +972,36 @@ class NYCUCrawler:
             "term": self.semester,
             "total_courses": len(self.courses_list),
             "last_updated": datetime.now().isoformat() + 'Z',
-            "source_url": "https://timetable.nycu.edu.tw",
+            "source_url": BASE_URL,
             "crawler_version": "4.1-multithreaded",
             "data_format_version": "2.0",
             "num_threads": self.num_threads,
             "with_outline": self.fetch_outline
         }
 
+    def output_file(self):
+        """輸出檔案路徑（依是否包含綱要）"""
+        if self.fetch_outline:
+            return f"course_data/with_outline/{self.year}-{self.semester}_data_with_outline_4thread.json"
+        return f"course_data/basic/{self.year}-{self.semester}_data_4thread.json"
+
+    def write_output(self, output_file, final_data):
+        """依 --format 寫入最終資料（皆為原子寫入），返回輸出的檔案"""
+        if self.output_format == 'json':
+            atomic_write_json(output_file, final_data)
+            return [output_file]
+        files = write_tables(final_data, os.path.splitext(output_file)[0], self.output_format)
+        return list(files.values())
+
     def crawl(self):
         """主要爬取流程"""
         # 決定輸出路徑
+        output_file = self.output_file()
+        output_dir = os.path.dirname(output_file)
         if self.fetch_outline:
-            output_dir = "course_data/with_outline"
-            output_file = f"{output_dir}/{self.year}-{self.semester}_data_with_outline_4thread.json"
-            checkpoint_file = f"{output_dir}/{self.year}-{self.semester}_checkpoint_4thread.json"
+            checkpoint_file = f"{output_dir}/{self.year}-{self.semester}_checkpoint_4thread.jsonl"
+            legacy_checkpoint_file = f"{output_dir}/{self.year}-{self.semester}_checkpoint_4thread.json"
         else:
-            output_dir = "course_data/basic"
-            output_file = f"{output_dir}/{self.year}-{self.semester}_data_4thread.json"
             checkpoint_file = None
 
         # 確保目錄存在
@@ -687,95 +1014,67 @@ class NYCUCrawler:
                 print("模式：完整綱要（新格式）")
             else:
                 print("模式：基本資訊（新格式）")
-            print(f"線程數：{self.num_threads}")
+            if self.adaptive:
+                print(f"線程數：auto（AIMD，{self.adaptive.minimum}-{self.adaptive.maximum}）")
+            else:
+                print(f"線程數：{self.num_threads}")
+            if self.fetch_outline and self.engine == 'async':
+                print(f"綱要引擎：async（並行 {self.concurrency}）")
+            if self.rate_limiter.buckets:
+                print(f"限速：{self.rate_limiter.describe()}")
+            if self.cache:
+                print(f"回應快取：{self.cache.cache_dir}")
+            if self.base_url != BASE_URL:
+                print(f"伺服器：{self.base_url}")
+            if self.previous:
+                print(f"增量模式：{self.previous.filename}（{len(self.previous)} 門課程有綱要）")
+                if self.previous.metadata.get('semester') != f"{self.year}-{self.semester}":
+                    print(f"警告: 上次輸出的學期為 {self.previous.metadata.get('semester')}，"
+                          f"課程不會被沿用")
             print("=" * 70)
 
-        # 檢查是否有檢查點
-        if self.fetch_outline and checkpoint_file and os.path.exists(checkpoint_file):
-            with self.print_lock:
-                print(f"\n發現檢查點檔案: {checkpoint_file}")
-            with open(checkpoint_file, 'r', encoding='utf-8') as f:
-                checkpoint_data = json.load(f)
-                self.courses_list = checkpoint_data.get('courses', [])
-
-            with self.print_lock:
-                print(f"已載入 {len(self.courses_list)} 門課程")
-            completed = sum(1 for c in self.courses_list if 'outline' in c)
-            with self.print_lock:
-                print(f"其中 {completed} 門已有綱要")
-
-            self.stats['total_courses'] = len(self.courses_list)
-            self.stats['outline_success'] = completed
-
-            metadata = self.create_metadata()
-            self.fetch_all_outlines_multithreaded(checkpoint_file, metadata)
-
-            # 保存最終結果
-            final_data = {
-                "metadata": metadata,
-                "courses": self.courses_list
-            }
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(final_data, f, ensure_ascii=False, indent=2)
-
-            if os.path.exists(checkpoint_file):
-                os.remove(checkpoint_file)
-
-            with self.print_lock:
-                print(f"\n完成！資料已儲存至: {output_file}")
-            return
-
         start_time = datetime.now()
+        metadata = self.create_metadata()
 
-        # 階段 1: 取得課程基本資料
-        with self.print_lock:
-            print("\n階段 1: 取得課程基本資料...")
-        types = self.get_type()
-
-        for i in range(len(types)):
-            ftype = types[i]["uid"]
-            with self.print_lock:
-                print(f"  處理: {types[i]['cname']}")
-            categories = self.get_category(ftype)
-
-            if types[i]["cname"] == "其他課程":
-                for fcategory in categories.keys():
-                    if fcategory not in self.dep_list:
-                        self.dep_list.append(fcategory)
-                        self.get_cos(fcategory)
+        if self.fetch_outline:
+            self.checkpoint, state = open_checkpoint(checkpoint_file, legacy_checkpoint_file)
+
+            if state and state.discovery_complete:
+                # 檢查點中已有完整課程列表：只取得尚無綱要的課程
+                with self.print_lock:
+                    print(f"\n發現檢查點檔案: {checkpoint_file}")
+                self.courses_list = state.courses()
+                completed = sum(1 for c in self.courses_list if 'outline' in c)
+                with self.print_lock:
+                    print(f"已載入 {len(self.courses_list)} 門課程")
+                    print(f"其中 {completed} 門已有綱要")
+
+                self.stats['total_courses'] = len(self.courses_list)
+                self.stats['outline_success'] = completed
+                self.fetch_all_outlines()
             else:
-                for fcategory in categories.keys():
-                    colleges = self.get_college(fcategory, ftype)
-                    if len(colleges):
-                        for fcollege in colleges.keys():
-                            deps = self.get_dep(fcollege, fcategory, ftype)
-                            if len(deps):
-                                for fdep in deps.keys():
-                                    if fdep not in self.dep_list:
-                                        self.dep_list.append(fdep)
-                                        self.get_cos(fdep)
-                    else:
-                        deps = self.get_dep("", fcategory, ftype)
-                        if len(deps):
-                            for fdep in deps.keys():
-                                if fdep not in self.dep_list:
-                                    self.dep_list.append(fdep)
-                                    self.get_cos(fdep)
+                if state:
+                    # 探索未完成：重新探索，已取得綱要的課程不再請求
+                    self.resumed_outlines = state.outlines
+                    with self.print_lock:
+                        print(f"\n發現檢查點檔案: {checkpoint_file}（探索未完成，"
+                              f"重新探索並沿用 {len(state.outlines)} 門課程的綱要）")
 
-        with self.print_lock:
-            print(f"\n已取得 {len(self.courses_list)} 門課程的基本資料")
+                # 階段 1 + 2: 探索課程的同時取得課程綱要
+                with self.print_lock:
+                    print("\n階段 1 + 2: 取得課程基本資料與課程綱要（管線）...")
+                self.crawl_pipelined()
 
-        # 建立 metadata
-        metadata = self.create_metadata()
-
-        # 階段 2: 取得課程綱要（如果需要）
-        if self.fetch_outline:
+                with self.print_lock:
+                    print(f"\n已取得 {len(self.courses_list)} 門課程的基本資料")
+        else:
+            # 階段 1: 取得課程基本資料
             with self.print_lock:
-                print("\n階段 2: 取得課程綱要...")
-            self.fetch_all_outlines_multithreaded(checkpoint_file, metadata)
+                print("\n階段 1: 取得課程基本資料...")
+            self.discover_courses()
 
-            if checkpoint_file and os.path.exists(checkpoint_file):
-                os.remove(checkpoint_file)
+            with self.print_lock:
+                print(f"\n已取得 {len(self.courses_list)} 門課程的基本資料")
 
         # 更新最終統計
         metadata['total_courses'] = len(self.courses_list)
@@ -787,8 +1086,18 @@ class NYCUCrawler:
             "courses": self.courses_list
         }
 
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(final_data, f, ensure_ascii=False, indent=2)
+        # 寫入暫存檔後原子替換，中斷時不會留下不完整的輸出
+        written = self.write_output(output_file, final_data)
+
+        # 最終資料已輸出，不再需要檢查點記錄
+        if self.checkpoint:
+            self.checkpoint.remove()
+
+        # 全文索引：與完整綱要輸出存放在同一目錄
+        index_file = None
+        if self.fulltext and self.fetch_outline:
+            index_file = default_index_file(output_file)
+            index = build_index_file(self.courses_list, index_file, metadata)
 
         end_time = datetime.now()
         elapsed = end_time - start_time
@@ -801,17 +1110,164 @@ class NYCUCrawler:
             if self.fetch_outline:
                 print(f"綱要成功: {self.stats['outline_success']}")
                 print(f"綱要失敗: {self.stats['outline_fail']}")
+                print(f"無綱要: {self.stats['outline_empty']}")
+                print(f"延後重試: {self.stats['outline_retries']} 次")
+                if self.previous:
+                    print(f"沿用綱要: {self.previous.reused} | 重新取得: "
+                          f"{self.previous.changed} 門已變更 + {self.previous.new} 門新增")
+                self.print_failure_stats()
                 if self.stats['total_courses'] > 0:
                     success_rate = (self.stats['outline_success'] / self.stats['total_courses']) * 100
                     print(f"成功率: {success_rate:.1f}%")
             print(f"總花費時間: {elapsed}")
             if self.stats['total_courses'] > 0:
                 print(f"平均每門課: {elapsed.total_seconds()/self.stats['total_courses']:.2f} 秒")
-            print(f"資料已儲存至: {output_file}")
+            print(f"資料已儲存至: {', '.join(written)}")
+            if index_file:
+                print(f"全文索引已儲存至: {index_file}（{len(index)} 門課程、{len(index.terms)} 個詞）")
             print(f"資料格式版本: 2.0 (陣列格式)")
-            print(f"線程配置: {self.num_threads}線程")
+            print(f"線程配置: {self.threads_label()}")
+            self.print_connection_stats()
             print("=" * 70)
 
+        if self.stats_json:
+            write_run_stats(self.stats_json, self.run_stats(elapsed.total_seconds()))
+
+    def run_stats(self, elapsed):
+        """本次執行的統計（--stats-json，供 benchmarks/bench_crawl.py 比較）"""
+        courses = len(self.courses_list)
+        requests_sent = self.http.connection_stats()['requests']
+        return {
+            "crawler": "multithreaded",
+            "engine": self.engine if self.fetch_outline else None,
+            "threads": self.num_threads,
+            "concurrency": self.concurrency if self.engine == 'async' else None,
+            "outline": self.fetch_outline,
+            "elapsed": elapsed,
+            "courses": courses,
+            "requests": requests_sent,
+            "courses_per_sec": courses / elapsed if elapsed > 0 else 0.0,
+            "requests_per_sec": requests_sent / elapsed if elapsed > 0 else 0.0,
+            "course_latency": latency_percentiles(self.course_latencies),
+            "outline_success": self.stats['outline_success'],
+            "outline_fail": self.stats['outline_fail'],
+            "outline_retries": self.stats['outline_retries'],
+            "peak_rss_mb": peak_rss_mb(),
+            "checkpoint_io": self.checkpoint.io_time if self.checkpoint else 0.0,
+        }
+
+    def fetch_enrollment(self, dep, deadline):
+        """取得系所課程的選課人數 {cos_id: {"limit", "current"}}（略過快取，deadline 前完成）"""
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise FetchError('timeout', '超過時間預算')
+        url = f"{self.base_url}/?r=main/get_cos_list"
+        r = self.http.post(url, headers=self.headers, verify=False,
+                           data=self.cos_list_request_data(dep), timeout=timeout, fresh=True)
+        if r.status_code != requests.codes.ok:
+            raise FetchError.from_status(r.status_code)
+
+        raw_data = json.loads(r.text)
+        enrollment = {}
+        for dep_value in raw_data:
+            for dep_content in raw_data[dep_value]:
+                if re.match("^[1-2]+$", dep_content) is None:
+                    continue
+                for raw_cos_data in raw_data[dep_value][dep_content].values():
+                    enrollment[raw_cos_data["cos_id"]] = {
+                        "limit": safe_int(raw_cos_data["num_limit"]),
+                        "current": safe_int(raw_cos_data["reg_num"])
+                    }
+        return enrollment
+
+    def refresh_enrollment(self, budget=DEFAULT_ENROLLMENT_BUDGET):
+        """
+        只更新既有輸出檔案中的選課人數（--enrollment-only）
+
+        使用完整爬取時記錄的系所清單，不重新探索，也不重建課程資料；
+        所有系所的 get_cos_list 並行請求，超過時間預算時未完成的系所保留原本的人數。
+        返回是否所有系所都已更新
+        """
+        start = time.monotonic()
+        deadline = start + budget
+        data_file = self.output_file()
+        manifest = DiscoveryManifest.load(manifest_path(self.year, self.semester), self.acysem)
+
+        with self.print_lock:
+            print("=" * 70)
+            print(f"NYCU 課程爬蟲 v4.1 - 更新選課人數 - {self.year} 學年度第 {self.semester} 學期")
+            print(f"資料檔案：{data_file}")
+            print(f"時間預算：{budget} 秒")
+            print("=" * 70)
+
+        if manifest is None:
+            print(f"錯誤: 找不到系所清單 {manifest_path(self.year, self.semester)}，請先執行一次完整爬取")
+            return False
+        if not manifest.is_fresh(DEFAULT_DISCOVERY_TTL):
+            print(f"警告: 系所清單已超過有效期限（{manifest.describe()}），新系所的課程不會更新")
+        if not os.path.exists(data_file):
+            print(f"錯誤: 找不到資料檔案 {data_file}，請先執行一次完整爬取")
+            return False
+
+        with open(data_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        courses_by_id = {course['id']: course for course in data['courses']}
+
+        enrollment = {}
+        failed = []
+        executor = ThreadPoolExecutor(max_workers=self.discovery_workers,
+                                      thread_name_prefix='enrollment')
+        futures = {executor.submit(self.fetch_enrollment, dep, deadline): dep
+                   for dep in manifest.dep_ids()}
+        try:
+            for future in as_completed(futures, timeout=max(0, deadline - time.monotonic())):
+                try:
+                    enrollment.update(future.result())
+                except Exception:
+                    failed.append(futures[future])
+        except FuturesTimeout:
+            # 超過時間預算：取消尚未開始的請求，未完成的系所保留原本的人數
+            for future, dep in futures.items():
+                if not future.done():
+                    future.cancel()
+                    failed.append(dep)
+        executor.shutdown(wait=False)
+
+        updated = changed = unknown = 0
+        for cos_id, numbers in enrollment.items():
+            course = courses_by_id.get(cos_id)
+            if course is None:
+                unknown += 1  # 資料檔案中沒有的新課程（需完整爬取才會加入）
+                continue
+            if course.get('enrollment') != numbers:
+                course['enrollment'] = numbers
+                changed += 1
+            updated += 1
+
+        data['metadata']['enrollment_updated'] = datetime.now().isoformat() + 'Z'
+        atomic_write_json(data_file, data)
+
+        with self.print_lock:
+            print(f"系所: {len(manifest) - len(failed)}/{len(manifest)} 已更新")
+            print(f"課程: {updated}/{len(courses_by_id)} 已更新（人數變動 {changed} 門）")
+            if unknown:
+                print(f"未收錄的新課程: {unknown} 門（執行完整爬取以加入）")
+            if failed:
+                print(f"警告: {len(failed)} 個系所失敗或超過時間預算，保留原本的選課人數")
+            print(f"總花費時間: {time.monotonic() - start:.2f} 秒")
+            print("=" * 70)
+
+        return not failed
+
+def parse_threads(value):
+    """--threads 參數：正整數或 auto"""
+    if value == 'auto':
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"必須為整數或 auto: {value}")
+
 
 def main():
     """主函數 - 支援命令行參數"""
@@ -826,6 +1282,31 @@ def main():
   # 爬取 113 年第 2 學期並包含課程綱要（8線程）
   python nycu_crawler_multithreaded.py --year 113 --semester 2 --outline --threads 8
 
+  # 自動調整並行度（延遲與錯誤率正常時逐步增加，逾時或 5xx 時減半）
+  python nycu_crawler_multithreaded.py --outline --threads auto
+
+  # 綱要 JSON 每秒最多 20 個請求、HTML 備選每秒 2 個（所有線程共用）
+  python nycu_crawler_multithreaded.py --outline --threads 8 --rate outline=20 --rate html=2
+
+  # 使用 asyncio 引擎爬取課程綱要（同時 200 門課程，需安裝 aiohttp）
+  python nycu_crawler_multithreaded.py --outline --engine async --concurrency 200
+
+  # 增量爬取：基本資料未變更的課程沿用上次輸出的綱要，只取得新增或變更課程的綱要
+  python nycu_crawler_multithreaded.py --outline \
+      --incremental course_data/with_outline/114-1_data_with_outline_4thread.json
+
+  # 選課期間只更新既有資料檔案的選課人數（使用上次完整爬取的系所清單，30 秒內完成）
+  python nycu_crawler_multithreaded.py --enrollment-only --budget 30
+
+  # 忽略系所清單，重新探索 類型→類別→學院→系所（預設沿用 7 天內的清單）
+  python nycu_crawler_multithreaded.py --refresh-discovery
+
+  # 對本機重播伺服器爬取（見 nycu_replay.py）
+  python nycu_crawler_multithreaded.py --outline --base-url http://127.0.0.1:8900
+
+  # 啟用 HTTP 回應快取（預設不快取；重跑同一學期時未過期的請求直接由快取取得）
+  python nycu_crawler_multithreaded.py --outline --cache-dir .http_cache
+
   # 使用預設值 (114 年第 1 學期，不包含綱要，4線程，10分鐘timeout)
   python nycu_crawler_multithreaded.py
         """)
@@ -849,9 +1330,9 @@ def main():
     )
     parser.add_argument(
         '--threads',
-        type=int,
+        type=parse_threads,
         default=DEFAULT_NUM_THREADS,
-        help=f'並行線程數量 (預設: {DEFAULT_NUM_THREADS}，建議 2-8)'
+        help=f'並行線程數量，或 auto 自動調整 (預設: {DEFAULT_NUM_THREADS}，建議 2-8)'
     )
     parser.add_argument(
         '--timeout',
@@ -859,6 +1340,72 @@ def main():
         default=DEFAULT_TIMEOUT_SECONDS,
         help=f'執行超時時間（秒） (預設: {DEFAULT_TIMEOUT_SECONDS})'
     )
+    parser.add_argument(
+        '--engine',
+        choices=['thread', 'async'],
+        default=DEFAULT_ENGINE,
+        help=f'綱要爬取引擎，thread=ThreadPoolExecutor，async=asyncio (預設: {DEFAULT_ENGINE})'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f'async 引擎同時進行的課程數量 (預設: {DEFAULT_CONCURRENCY})'
+    )
+    parser.add_argument(
+        '--rate',
+        type=parse_rate_option,
+        action='append',
+        metavar='CLASS=RPS',
+        help=f'端點類別限速（每秒請求數，可重複指定），CLASS: {", ".join(ENDPOINT_CLASSES)} (預設: 不限速)'
+    )
+    parser.add_argument(
+        '--incremental',
+        metavar='PREVIOUS_JSON',
+        help='增量爬取：沿用上次完整綱要輸出中基本資料未變更課程的綱要（需搭配 --outline）'
+    )
+    parser.add_argument(
+        '--enrollment-only',
+        action='store_true',
+        help='只更新既有資料檔案的選課人數（需先完整爬取一次；搭配 --outline 時更新完整綱要檔案）'
+    )
+    parser.add_argument(
+        '--budget',
+        type=float,
+        default=DEFAULT_ENROLLMENT_BUDGET,
+        help=f'--enrollment-only 的時間預算（秒） (預設: {DEFAULT_ENROLLMENT_BUDGET})'
+    )
+    parser.add_argument(
+        '--refresh-discovery',
+        action='store_true',
+        help='忽略系所清單，重新探索並更新 (預設: 沿用 7 天內的清單)'
+    )
+    parser.add_argument(
+        '--base-url',
+        default=BASE_URL,
+        help=f'課程時間表網站，可指向 nycu_replay.py 重播伺服器 (預設: {BASE_URL})'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        metavar='DIR',
+        help=f'啟用 HTTP 回應快取並存於此目錄，例如 {DEFAULT_CACHE_DIR} (預設: 不快取)'
+    )
+    parser.add_argument(
+        '--format',
+        choices=FORMATS,
+        default='json',
+        help='輸出格式，parquet / arrow 輸出 courses、schedule、weekly_topics 三個表（需要 pyarrow） (預設: json)'
+    )
+    parser.add_argument(
+        '--fulltext',
+        action='store_true',
+        help='完成後建立綱要全文索引（<輸出檔名>_fulltext.idx，以 nycu_fulltext.py search 查詢；需搭配 --outline）'
+    )
+    parser.add_argument(
+        '--stats-json',
+        metavar='PATH',
+        help='完成後將執行統計（課程/請求速率、每門課程延遲、峰值記憶體、檢查點 I/O）寫入 JSON'
+    )
     parser.add_argument(
         '--version',
         action='version',
@@ -876,7 +1423,7 @@ def main():
         print("錯誤: 學期必須為 1 或 2")
         sys.exit(1)
 
-    if args.threads < 1 or args.threads > 16:
+    if args.threads != 'auto' and (args.threads < 1 or args.threads > 16):
         print("錯誤: 線程數必須介於 1 到 16 之間")
         sys.exit(1)
 
@@ -884,8 +1431,58 @@ def main():
         print("錯誤: Timeout 必須至少 60 秒")
         sys.exit(1)
 
+    if args.concurrency < 1 or args.concurrency > 1000:
+        print("錯誤: 並行數量必須介於 1 到 1000 之間")
+        sys.exit(1)
+
+    if args.incremental and not args.outline:
+        print("錯誤: --incremental 需搭配 --outline")
+        sys.exit(1)
+
+    if args.fulltext and not args.outline:
+        print("錯誤: --fulltext 需搭配 --outline")
+        sys.exit(1)
+
+    if args.format != 'json' and not export_available():
+        print("錯誤: parquet / arrow 輸出需要 pyarrow，請執行: pip install pyarrow")
+        sys.exit(1)
+
+    if args.enrollment_only and args.format != 'json':
+        print("錯誤: --enrollment-only 只能更新 JSON 資料檔案")
+        sys.exit(1)
+
+    if args.enrollment_only and args.incremental:
+        print("錯誤: --enrollment-only 不可與 --incremental 同時使用")
+        sys.exit(1)
+
+    if args.budget <= 0:
+        print("錯誤: 時間預算必須大於 0 秒")
+        sys.exit(1)
+
+    if args.incremental and not os.path.isfile(args.incremental):
+        print(f"錯誤: 找不到上次的輸出檔案: {args.incremental}")
+        sys.exit(1)
+
+    if args.engine == 'async' and not async_engine_available():
+        print("錯誤: async 引擎需要 aiohttp，請執行: pip install aiohttp")
+        sys.exit(1)
+
+    if args.engine == 'async' and args.threads == 'auto':
+        # async 引擎以固定的 --concurrency 控制並行度，不受 AIMD 控制器調整
+        print("錯誤: --threads auto 只適用於 thread 引擎，async 引擎請以 --concurrency 指定並行度")
+        sys.exit(1)
+
     # 建立爬蟲實例並執行
-    crawler = NYCUCrawler(args.year, args.semester, args.outline, args.threads)
+    crawler = NYCUCrawler(args.year, args.semester, args.outline, args.threads,
+                          engine=args.engine, concurrency=args.concurrency,
+                          rates=dict(args.rate or []),
+                          cache_dir=args.cache_dir,
+                          incremental=args.incremental,
+                          refresh_discovery=args.refresh_discovery,
+                          base_url=args.base_url,
+                          stats_json=args.stats_json,
+                          fulltext=args.fulltext,
+                          output_format=args.format)
 
     # 設定總 timeout
     import signal
@@ -900,13 +1497,19 @@ def main():
         signal.alarm(args.timeout)
 
     try:
-        crawler.crawl()
+        if args.enrollment_only:
+            if not crawler.refresh_enrollment(args.budget):
+                sys.exit(1)
+        else:
+            crawler.crawl()
     except KeyboardInterrupt:
         print("\n\n使用者中斷爬取")
         sys.exit(0)
     except Exception as e:
         print(f"\n\n致命錯誤: {e}")
         sys.exit(1)
+    finally:
+        crawler.close()
 
 
 if __name__ == "__main__":
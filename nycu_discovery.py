@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 探索結果清單
+國立陽明交通大學課程爬蟲系所清單（discovery manifest）
+
+功能：
+1. 記錄某學期探索取得的系所 id 與其在探索樹中的位置
+2. 完整探索後寫入 course_data/discovery/<學期>_departments.json
+3. 有效期限內（預設 7 天）直接對已知系所呼叫 get_cos_list，略過 類型→類別→學院→系所 探索
+4. --refresh-discovery 強制重新探索並更新清單
+
+供 nycu_crawler.py 與 nycu_crawler_multithreaded.py 共用
+"""
+
+import json
+import os
+import time
+
+from nycu_checkpoint import atomic_write_json
+
+DISCOVERY_DIR = "course_data/discovery"
+DEFAULT_DISCOVERY_TTL = 7 * 24 * 3600  # 系所清單有效期限（秒）：系所一學期內幾乎不變
+
+
+def manifest_path(year, semester, directory=DISCOVERY_DIR):
+    """某學期的系所清單路徑"""
+    return os.path.join(directory, f"{year}-{semester}_departments.json")
+
+
+class DiscoveryManifest:
+    """某學期的系所清單（依探索樹順序）"""
+
+    def __init__(self, acysem, departments, created=None):
+        self.acysem = acysem
+        self.departments = departments  # [(dep_id, 探索樹中的位置 tuple), ...]
+        self.created = created if created is not None else time.time()
+
+    def dep_ids(self):
+        return [dep_id for dep_id, _ in self.departments]
+
+    def __len__(self):
+        return len(self.departments)
+
+    def age(self):
+        """清單建立至今的秒數"""
+        return max(0.0, time.time() - self.created)
+
+    def is_fresh(self, ttl=DEFAULT_DISCOVERY_TTL):
+        return self.age() <= ttl
+
+    def describe(self):
+        """顯示用：系所數與建立時間"""
+        hours = self.age() / 3600
+        age = f"{hours / 24:.1f} 天" if hours >= 24 else f"{hours:.1f} 小時"
+        return f"{len(self)} 個系所，{age}前建立"
+
+    @classmethod
+    def load(cls, filename, acysem=None):
+        """讀取系所清單，檔案不存在、格式錯誤或學期不符時返回 None"""
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            departments = [(dep['id'], tuple(dep['order'])) for dep in data['departments']]
+            manifest = cls(data['acysem'], departments, data['created'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if acysem is not None and manifest.acysem != acysem:
+            return None
+        return manifest
+
+    def save(self, filename):
+        """原子寫入系所清單"""
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        atomic_write_json(filename, {
+            "acysem": self.acysem,
+            "created": self.created,
+            "departments": [{"id": dep_id, "order": list(order)}
+                            for dep_id, order in self.departments],
+        })
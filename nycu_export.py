@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 欄式輸出
+國立陽明交通大學課程資料的 Parquet / Arrow IPC 輸出（需要 pyarrow）
+
+功能：
+1. courses：每門課程一列，enrollment 與綱要的 base / description 攤平為欄位
+2. schedule：每個上課時段一列（course_id 對應 courses.id）
+3. weekly_topics：綱要每週進度的每個主題一列
+4. 教師、課程類型、教室、標籤等重複度高的字串以 dictionary 編碼；每列都有 semester 欄位，
+   多個學期的檔案可直接合併掃描
+5. 學期 metadata 存於每個表的 schema metadata（nycu_metadata，JSON）
+
+輸出檔名為資料檔名去掉 .json 後加上表名（courses 不加），例如：
+  114-1_data_4thread.parquet、114-1_data_4thread_schedule.parquet、114-1_data_4thread_weekly_topics.parquet
+
+用法：
+  python nycu_export.py --data course_data/with_outline/114-1_data_with_outline_4thread.json --format parquet
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from nycu_checkpoint import atomic_write_bytes
+from nycu_schedule import MASK_BYTES, course_mask
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # 選用套件
+    pa = None
+
+FORMATS = ('json', 'parquet', 'arrow')
+FORMAT_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+COMPRESSION = 'zstd'
+
+# 攤平到 courses 的綱要欄位（欄名為 <部分>_<欄位>）
+OUTLINE_FIELDS = {
+    'base': ('course_name', 'course_name_eng', 'selection_type', 'selection_type_eng', 'department',
+             'department_eng', 'course_code', 'teacher_hours', 'total_hours'),
+    'description': ('prerequisite', 'outline', 'textbook', 'grading', 'teaching_method',
+                    'meeting_time', 'meeting_place', 'contact'),
+}
+
+
+def export_available():
+    """是否已安裝欄式輸出所需套件"""
+    return pa is not None
+
+
+def _schemas():
+    """各表的 schema（dictionary 編碼重複度高的字串）"""
+    text = pa.dictionary(pa.int32(), pa.string())
+    outline_columns = [pa.field(f"{part}_{key}", text if part == 'base' else pa.string())
+                       for part, keys in OUTLINE_FIELDS.items() for key in keys]
+    return {
+        'courses': pa.schema([
+            pa.field('semester', text),
+            pa.field('id', pa.string()),
+            pa.field('semester_code', text),
+            pa.field('name', pa.string()),
+            pa.field('teacher', text),
+            pa.field('credit', pa.float64()),
+            pa.field('hours', pa.float64()),
+            pa.field('type', text),
+            pa.field('enrollment_limit', pa.int32()),
+            pa.field('enrollment_current', pa.int32()),
+            pa.field('schedule_mask', pa.binary(MASK_BYTES)),  # little-endian，同 nycu_schedule.encode_masks
+            pa.field('english_taught', pa.bool_()),
+            pa.field('tags', pa.list_(text)),
+            pa.field('raw_time_classroom', pa.string()),
+            pa.field('has_outline', pa.bool_()),
+            pa.field('outline_source', text),
+        ] + outline_columns),
+        'schedule': pa.schema([
+            pa.field('semester', text),
+            pa.field('course_id', pa.string()),
+            pa.field('slot', pa.int16()),
+            pa.field('day', pa.int8()),
+            pa.field('day_name', text),
+            pa.field('periods', pa.list_(pa.int8())),
+            pa.field('time_start', text),
+            pa.field('time_end', text),
+            pa.field('classroom', text),
+            pa.field('floor', text),
+        ]),
+        'weekly_topics': pa.schema([
+            pa.field('semester', text),
+            pa.field('course_id', pa.string()),
+            pa.field('week', pa.int16()),
+            pa.field('topic_index', pa.int16()),
+            pa.field('topic', pa.string()),
+        ]),
+    }
+
+
+def _course_row(semester, course):
+    enrollment = course.get('enrollment') or {}
+    outline = course.get('outline') if isinstance(course.get('outline'), dict) else {}
+    row = {
+        'semester': semester,
+        'id': course.get('id'),
+        'semester_code': course.get('semester_code'),
+        'name': course.get('name'),
+        'teacher': course.get('teacher'),
+        'credit': course.get('credit'),
+        'hours': course.get('hours'),
+        'type': course.get('type'),
+        'enrollment_limit': enrollment.get('limit'),
+        'enrollment_current': enrollment.get('current'),
+        'schedule_mask': course_mask(course).to_bytes(MASK_BYTES, 'little'),
+        'english_taught': course.get('english_taught'),
+        'tags': course.get('tags') or [],
+        'raw_time_classroom': course.get('raw_time_classroom'),
+        'has_outline': bool(outline),
+        'outline_source': outline.get('source'),
+    }
+    for part, keys in OUTLINE_FIELDS.items():
+        values = outline.get(part) if isinstance(outline.get(part), dict) else {}
+        for key in keys:
+            row[f"{part}_{key}"] = values.get(key)
+    return row
+
+
+def build_tables(data):
+    """資料檔（{"metadata", "courses"}）-> {表名: pyarrow.Table}"""
+    if pa is None:
+        raise RuntimeError("欄式輸出需要 pyarrow，請執行: pip install pyarrow")
+
+    metadata = data.get('metadata') or {}
+    semester = metadata.get('semester')
+    schemas = _schemas()
+    rows = {name: {field.name: [] for field in schema} for name, schema in schemas.items()}
+
+    def append(name, row):
+        for column, values in rows[name].items():
+            values.append(row.get(column))
+
+    for course in data.get('courses', []):
+        append('courses', _course_row(semester, course))
+        for slot, item in enumerate(course.get('schedule') or []):
+            append('schedule', dict(item, semester=semester, course_id=course.get('id'), slot=slot))
+        outline = course.get('outline') if isinstance(course.get('outline'), dict) else {}
+        for week in outline.get('weekly_schedule') or []:
+            for topic_index, topic in enumerate(week.get('topics') or []):
+                append('weekly_topics', {'semester': semester, 'course_id': course.get('id'),
+                                         'week': week.get('week'), 'topic_index': topic_index,
+                                         'topic': topic})
+
+    schema_metadata = {'nycu_metadata': json.dumps(metadata, ensure_ascii=False)}
+    return {name: pa.table(rows[name], schema=schema.with_metadata(schema_metadata))
+            for name, schema in schemas.items()}
+
+
+def output_files(base, fmt):
+    """{表名: 檔案路徑}；base 為不含副檔名的資料檔路徑"""
+    extension = FORMAT_EXTENSIONS[fmt]
+    return {name: base + ('' if name == 'courses' else f"_{name}") + extension
+            for name in ('courses', 'schedule', 'weekly_topics')}
+
+
+def _serialize(table, fmt):
+    sink = pa.BufferOutputStream()
+    if fmt == 'parquet':
+        pyarrow.parquet.write_table(table, sink, compression=COMPRESSION)
+    else:
+        options = pyarrow.ipc.IpcWriteOptions(compression=COMPRESSION)
+        with pyarrow.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def write_tables(data, base, fmt):
+    """將資料檔寫為 fmt（parquet / arrow）的三個表（各自原子寫入），返回 {表名: 檔案路徑}"""
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"不支援的輸出格式: {fmt}")
+    tables = build_tables(data)
+    files = output_files(base, fmt)
+    for name, table in tables.items():
+        atomic_write_bytes(files[name], _serialize(table, fmt))
+    return files
+
+
+def main():
+    """主函數 - 支援命令行參數"""
+    parser = argparse.ArgumentParser(
+        description='NYCU Course Crawler - Parquet / Arrow IPC 輸出',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__.split('用法：', 1)[1])
+    parser.add_argument('--data', required=True, help='爬蟲輸出的 JSON 資料檔')
+    parser.add_argument('--format', choices=FORMATS[1:], default='parquet', help='輸出格式 (預設: parquet)')
+    parser.add_argument('--output', metavar='BASE',
+                        help='輸出路徑（不含副檔名） (預設: 資料檔路徑去掉 .json)')
+    args = parser.parse_args()
+
+    if not export_available():
+        print("錯誤: 欄式輸出需要 pyarrow，請執行: pip install pyarrow")
+        sys.exit(1)
+
+    with open(args.data, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    files = write_tables(data, args.output or os.path.splitext(args.data)[0], args.format)
+    for name, filename in files.items():
+        print(f"{name}: {filename}（{os.path.getsize(filename) / 1024:.0f} KB）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 綱要全文索引
+國立陽明交通大學課程綱要的 BM25 全文檢索
+
+功能：
+1. 索引綱要的 description.outline、prerequisite、textbook、weekly_schedule[].topics、
+   unit_hours[].content（HTML 備選方案取得的綱要為 outline 文字）
+2. 中英混合斷詞：連續的中日韓文字切為 bigram（單字時為該字），英文等字母文字與數字轉小寫、
+   去除重音符號（NFKD）後以單字為詞
+3. 壓縮索引：posting list 以 (文件編號差值, 詞頻) 的 varint 編碼，詞典與文件資訊以 zlib 壓縮；
+   與完整綱要輸出存放在同一目錄（<資料檔名>_fulltext.idx）
+4. 查詢只解碼查詢詞的 posting list，以 BM25 計分並取前 k 名，不需載入或掃描任何綱要
+
+用法：
+  python nycu_fulltext.py build --data course_data/with_outline/114-1_data_with_outline_4thread.json
+  python nycu_fulltext.py search --data course_data/with_outline/114-1_data_with_outline_4thread.json \\
+      --query "機器學習 neural network" --top 10
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import re
+import struct
+import sys
+import unicodedata
+import zlib
+from collections import Counter
+
+from nycu_checkpoint import atomic_write_bytes
+
+INDEX_VERSION = 2
+DEFAULT_TOP_K = 10
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 檔案格式：魔術字串、詞典長度（4 bytes big-endian）、zlib 壓縮的 JSON 詞典、posting list
+_MAGIC = b'NYCUFTS\x01'
+_HEADER_LENGTH = struct.Struct('>I')
+
+# 中日韓文字（CJK 統一漢字與擴充 A、相容漢字）
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+# 連續的中日韓文字，或其他文字的字母與數字（含非 ASCII 的拉丁字母，不含底線）
+_TOKEN_PATTERN = re.compile(rf'[{_CJK}]+|(?:(?![{_CJK}])[^\W_])+')
+_CJK_CHAR = re.compile(rf'[{_CJK}]')
+
+
+def _fold(text):
+    """轉小寫並以 NFKD 去除重音符號、全形轉半形（café -> cafe、ＡＩ -> ai）"""
+    text = (text or '').casefold()
+    if text.isascii():
+        return text
+    return ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """中英混合斷詞：英文等字母文字的單字（小寫、去除重音）與中文 bigram"""
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(_fold(text)):
+        if len(run) == 1 or not _CJK_CHAR.match(run):
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def outline_texts(outline):
+    """綱要中要索引的文字（依欄位順序）"""
+    if not isinstance(outline, dict):
+        return []
+    description = outline.get('description') or {}
+    texts = [description.get('outline', ''), description.get('prerequisite', ''),
+             description.get('textbook', '')]
+    for week in outline.get('weekly_schedule') or []:
+        texts.extend(week.get('topics', []))
+    for unit in outline.get('unit_hours') or []:
+        texts.append(unit.get('content', ''))
+    if outline.get('source') == 'html_parser':
+        texts.append(outline.get('outline', ''))
+    return [text for text in texts if isinstance(text, str) and text]
+
+
+def default_index_file(data_file):
+    """資料檔對應的索引檔路徑（同一目錄）"""
+    return f"{os.path.splitext(data_file)[0]}_fulltext.idx"
+
+
+def _encode_varint(value, out):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_postings(data):
+    """posting list bytes -> [(文件編號, 詞頻), ...]"""
+    if not data or max(data) < 0x80:
+        # 差值與詞頻都小於 128（最常見）：每個 byte 即為一個數字
+        numbers = list(data)
+    else:
+        numbers, value, shift = [], 0, 0
+        for byte in data:
+            value |= (byte & 0x7F) << shift
+            if byte & 0x80:
+                shift += 7
+            else:
+                numbers.append(value)
+                value, shift = 0, 0
+
+    postings, doc = [], 0
+    for i in range(0, len(numbers), 2):
+        doc += numbers[i]
+        postings.append((doc, numbers[i + 1]))
+    return postings
+
+
+class FullTextIndex:
+    """
+    綱要的 BM25 索引（建立後唯讀，可由多個線程同時查詢）
+
+    docs 為 [課程 id, 課程名稱, 教師]；terms 為 詞 -> (文件數, posting 位移, posting 長度)
+    """
+
+    def __init__(self, docs, lengths, terms, postings, metadata=None):
+        self.docs = docs
+        self.lengths = lengths
+        self.terms = terms
+        self.postings = postings
+        self.metadata = metadata or {}
+        average_length = sum(lengths) / len(lengths) if lengths else 0.0
+        # BM25 的文件長度正規化 k1 * (1 - b + b * |d| / avgdl)，每份文件預先計算
+        self.norms = [BM25_K1 * (1 - BM25_B + BM25_B * length / average_length) for length in lengths]
+
+    def __len__(self):
+        return len(self.docs)
+
+    @classmethod
+    def build(cls, courses, metadata=None):
+        """由資料檔的課程陣列建立索引（沒有綱要或綱要沒有文字的課程不列入）"""
+        docs, lengths, term_postings = [], [], {}
+        for course in courses:
+            tokens = [token for text in outline_texts(course.get('outline')) for token in tokenize(text)]
+            if not tokens:
+                continue
+            doc = len(docs)
+            docs.append([course.get('id', ''), course.get('name', ''), course.get('teacher', '')])
+            lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                term_postings.setdefault(term, []).append((doc, frequency))
+
+        # 詞典依詞排序，posting list 依序串接
+        blob, terms = bytearray(), {}
+        for term in sorted(term_postings):
+            start, previous = len(blob), 0
+            for doc, frequency in term_postings[term]:
+                _encode_varint(doc - previous, blob)
+                _encode_varint(frequency, blob)
+                previous = doc
+            terms[term] = (len(term_postings[term]), start, len(blob) - start)
+
+        return cls(docs, lengths, terms, bytes(blob), metadata)
+
+    def save(self, filename):
+        """原子寫入索引檔"""
+        header = {
+            "version": INDEX_VERSION,
+            "metadata": self.metadata,
+            "docs": self.docs,
+            "lengths": self.lengths,
+            "terms": self.terms,
+        }
+        compressed = zlib.compress(json.dumps(header, ensure_ascii=False, separators=(',', ':'))
+                                   .encode('utf-8'), 6)
+        atomic_write_bytes(filename, _MAGIC + _HEADER_LENGTH.pack(len(compressed)) + compressed + self.postings)
+
+    @classmethod
+    def load(cls, filename):
+        """讀取索引檔（posting list 在查詢時才解碼）"""
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if not data.startswith(_MAGIC):
+            raise ValueError(f"不是全文索引檔: {filename}")
+        offset = len(_MAGIC) + _HEADER_LENGTH.size
+        (header_length,) = _HEADER_LENGTH.unpack_from(data, len(_MAGIC))
+        header = json.loads(zlib.decompress(data[offset:offset + header_length]).decode('utf-8'))
+        if header.get('version') != INDEX_VERSION:
+            raise ValueError(f"不支援的全文索引版本: {header.get('version')}")
+        return cls(header['docs'], header['lengths'], header['terms'],
+                   data[offset + header_length:], header.get('metadata'))
+
+    def postings_for(self, term):
+        """單一詞的 posting list [(文件編號, 詞頻), ...]"""
+        entry = self.terms.get(term)
+        if entry is None:
+            return []
+        _, start, length = entry
+        return _decode_postings(self.postings[start:start + length])
+
+    def idf(self, term):
+        """BM25 idf（Lucene 的 +1 版本，常見詞不會得到負分）"""
+        entry = self.terms.get(term)
+        df = entry[0] if entry else 0
+        return math.log(1 + (len(self.docs) - df + 0.5) / (df + 0.5))
+
+    def scores(self, query):
+        """查詢的 BM25 分數 {文件編號: 分數}（只包含至少符合一個詞的文件）"""
+        scores, norms = {}, self.norms
+        for term in set(tokenize(query)):
+            postings = self.postings_for(term)
+            if not postings:
+                continue
+            weight = self.idf(term) * (BM25_K1 + 1)
+            for doc, frequency in postings:
+                scores[doc] = scores.get(doc, 0.0) + weight * frequency / (frequency + norms[doc])
+        return scores
+
+    def search(self, query, top=DEFAULT_TOP_K):
+        """
+        BM25 前 top 名：[{'id', 'name', 'teacher', 'score'}, ...]（分數由高到低，同分依資料檔順序）
+        """
+        best = heapq.nsmallest(top, self.scores(query).items(), key=lambda item: (-item[1], item[0]))
+        return [{'id': self.docs[doc][0], 'name': self.docs[doc][1], 'teacher': self.docs[doc][2],
+                 'score': score}
+                for doc, score in best]
+
+
+def build_index_file(courses, index_file, metadata=None):
+    """建立並寫入索引檔，返回索引"""
+    index = FullTextIndex.build(courses, metadata)
+    index.save(index_file)
+    return index
+
+
+def cmd_build(args):
+    with open(args.data, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    index_file = args.index or default_index_file(args.data)
+    index = build_index_file(data.get('courses', []), index_file, data.get('metadata'))
+    print(f"全文索引: {len(index)} 門課程、{len(index.terms)} 個詞（{os.path.getsize(index_file) / 1024:.0f} KB）")
+    print(f"已儲存至: {index_file}")
+
+
+def cmd_search(args):
+    if not args.index and not args.data:
+        print("錯誤: 請指定 --index 或 --data")
+        sys.exit(1)
+    index_file = args.index or default_index_file(args.data)
+    if not os.path.isfile(index_file):
+        print(f"錯誤: 找不到全文索引: {index_file}（請先執行 build）")
+        sys.exit(1)
+
+    index = FullTextIndex.load(index_file)
+    results = index.search(args.query, args.top)
+    print(f"「{args.query}」：{len(results)} 筆結果（共 {len(index)} 門課程有綱要）")
+    for rank, result in enumerate(results, 1):
+        print(f"  {rank:>3}. {result['score']:6.2f}  {result['id']}  {result['name']} - {result['teacher']}")
+
+
+def main():
+    """主函數 - 支援命令行參數"""
+    parser = argparse.ArgumentParser(
+        description='NYCU Course Crawler - 綱要全文索引',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__.split('用法：', 1)[1])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='由完整綱要輸出建立全文索引')
+    build.add_argument('--data', required=True, help='完整綱要輸出（爬蟲 --outline 的 JSON）')
+    build.add_argument('--index', help='索引檔路徑 (預設: <資料檔名>_fulltext.idx)')
+    build.set_defaults(func=cmd_build)
+
+    search = subparsers.add_parser('search', help='查詢全文索引')
+    search.add_argument('--query', required=True, help='查詢字串（中英文皆可）')
+    search.add_argument('--index', help='索引檔路徑')
+    search.add_argument('--data', help='完整綱要輸出，索引檔為 <資料檔名>_fulltext.idx')
+    search.add_argument('--top', type=int, default=DEFAULT_TOP_K, help=f'顯示前幾名 (預設: {DEFAULT_TOP_K})')
+    search.set_defaults(func=cmd_search)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - HTTP 連線池
+國立陽明交通大學課程爬蟲共用 HTTP 層
+
+功能：
+1. 所有線程共用同一組 keep-alive 連線池（TCP+TLS 連線重用）
+2. 每個線程各自持有 requests.Session（thread-safe）
+3. 連線池大小可依 --threads 設定
+4. 統計新建連線數與重用連線數
+5. 回應監聽器（延遲與錯誤回報給並行度控制器）
+6. 依端點類別的共用 token-bucket 限速（--rate）
+7. 失敗分類（timeout / connection / http_4xx / http_5xx / invalid / empty）與依端點類別的斷路器
+8. 可選的磁碟回應快取（nycu_cache.ResponseCache）
+
+供 nycu_crawler.py 與 nycu_crawler_multithreaded.py 共用
+"""
+
+import argparse
+import asyncio
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+# 課程時間表網站（--base-url 可改為本機重播伺服器，見 nycu_replay.py）
+BASE_URL = "https://timetable.nycu.edu.tw"
+
+# 端點類別：探索（類型/類別/學院/系所）、課程列表、綱要 JSON、HTML 備選
+ENDPOINT_CLASSES = ('discovery', 'course_list', 'outline', 'html')
+
+_ROUTE_PATTERN = re.compile(r'[?&]r=([^&]+)')
+
+
+def endpoint_class(url):
+    """依 URL 的 ?r= 路由判斷端點類別"""
+    match = _ROUTE_PATTERN.search(url)
+    route = match.group(1) if match else ''
+    if route == 'main/get_cos_list':
+        return 'course_list'
+    if route.startswith('main/getCrsOutline'):
+        return 'outline'
+    if route in ('course/syllabus', 'main/course_detail'):
+        return 'html'
+    return 'discovery'
+
+
+def parse_rate_option(value):
+    """解析 --rate CLASS=RPS，返回 (類別, 每秒請求數)"""
+    endpoint, sep, rps = value.partition('=')
+    if not sep or endpoint not in ENDPOINT_CLASSES:
+        raise argparse.ArgumentTypeError(
+            f"格式為 CLASS=RPS，CLASS 為 {', '.join(ENDPOINT_CLASSES)} 之一: {value}")
+    try:
+        rps = float(rps)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"每秒請求數必須為數字: {value}")
+    if rps <= 0:
+        raise argparse.ArgumentTypeError(f"每秒請求數必須大於 0: {value}")
+    return endpoint, rps
+
+
+class TokenBucket:
+    """
+    Token bucket（thread-safe）
+
+    reserve() 預約一個 token 並返回需等待的秒數；token 不足時允許預約未來的 token，
+    因此同時等待的呼叫者會依序間隔 1/rate 秒，不會同時醒來
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter:
+    """
+    依端點類別限速，所有線程與協程共用
+
+    rates 為 {端點類別: 每秒請求數}，未指定的類別不限速。
+    線程呼叫 acquire()；asyncio 引擎呼叫 reserve() 後自行 await asyncio.sleep()
+    """
+
+    def __init__(self, rates=None):
+        self.buckets = {endpoint: TokenBucket(rps) for endpoint, rps in (rates or {}).items()}
+        self.waited = {endpoint: [0, 0.0] for endpoint in self.buckets}  # [延後次數, 累計等待秒數]
+        self.lock = threading.Lock()
+
+    def reserve(self, url):
+        """預約一次請求，返回需等待的秒數"""
+        if not self.buckets:
+            return 0.0
+        endpoint = endpoint_class(url)
+        bucket = self.buckets.get(endpoint)
+        if bucket is None:
+            return 0.0
+        delay = bucket.reserve()
+        if delay > 0:
+            with self.lock:
+                self.waited[endpoint][0] += 1
+                self.waited[endpoint][1] += delay
+        return delay
+
+    def acquire(self, url):
+        """等待直到可以發送請求"""
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    def describe(self):
+        """限速設定的顯示文字"""
+        return ', '.join(f"{endpoint}={bucket.rate:g}/s" for endpoint, bucket in self.buckets.items())
+
+    def wait_stats(self):
+        """各端點類別被延後的請求數與平均等待秒數"""
+        with self.lock:
+            return {endpoint: {'delayed': delayed, 'avg_wait': total / delayed if delayed else 0.0}
+                    for endpoint, (delayed, total) in self.waited.items()}
+
+
+# 失敗類型；TERMINAL_FAILURES 為重試也不會改變結果的類型
+# invalid 為 200 但不是有效 JSON 的回應（伺服器過載時的 HTML 錯誤頁或截斷的內容），可重試
+FAILURE_KINDS = ('timeout', 'connection', 'http_4xx', 'http_5xx', 'invalid', 'empty')
+TERMINAL_FAILURES = ('http_4xx', 'empty')
+
+
+class FetchError(Exception):
+    """已分類的請求失敗"""
+
+    def __init__(self, kind, message=''):
+        super().__init__(message or kind)
+        self.kind = kind
+
+    @classmethod
+    def from_status(cls, status_code):
+        """非 200 回應對應的失敗"""
+        kind = 'http_5xx' if status_code >= 500 else 'http_4xx'
+        return cls(kind, f"HTTP {status_code}")
+
+
+def classify_failure(error):
+    """將例外分類為 FAILURE_KINDS 之一"""
+    if isinstance(error, FetchError):
+        return error.kind
+    if isinstance(error, (requests.Timeout, asyncio.TimeoutError, TimeoutError)):
+        return 'timeout'
+    if isinstance(error, ValueError):
+        # 回應不是有效的 JSON：伺服器過載時的 HTML 錯誤頁或截斷的回應，可重試
+        #（API 返回的 False 或空值是有效的 JSON，由呼叫端記為 empty）
+        return 'invalid'
+    return 'connection'
+
+
+class CircuitBreaker:
+    """
+    單一端點類別的斷路器（thread-safe）
+
+    closed：正常放行；連續 failure_threshold 次逾時、連線錯誤或 5xx 後轉為 open。
+    open：所有請求等待 reset_timeout 秒，之後轉為 half_open。
+    half_open：只放行一個探測請求，成功則回到 closed，失敗則重新 open。
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name, failure_threshold=10, reset_timeout=5.0, probe_interval=0.2,
+                 on_change=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_interval = probe_interval   # 探測進行中時其他請求的等待間隔
+        self.on_change = on_change             # on_change(name, old_state, new_state)
+        self.state = self.CLOSED
+        self.failures = 0                      # 連續失敗次數
+        self.opened_at = 0.0
+        self.probing = False
+        self.trips = 0                         # 開啟次數
+        self.lock = threading.Lock()
+
+    def _set_state(self, state):
+        """切換狀態（需持有 lock）"""
+        old_state, self.state = self.state, state
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+            self.trips += 1
+        if self.on_change and old_state != state:
+            self.on_change(self.name, old_state, state)
+
+    def wait_time(self):
+        """可以發送請求時返回 0，否則返回建議等待的秒數"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    return remaining
+                self._set_state(self.HALF_OPEN)
+            if self.probing:
+                return self.probe_interval
+            self.probing = True
+            return 0.0
+
+    def record(self, failed):
+        """記錄一次請求結果（failed 表示伺服器不健康的失敗）"""
+        with self.lock:
+            was_probe = self.state == self.HALF_OPEN
+            if was_probe:
+                self.probing = False
+            if not failed:
+                self.failures = 0
+                if self.state != self.CLOSED:
+                    self._set_state(self.CLOSED)
+                return
+            self.failures += 1
+            if was_probe or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self._set_state(self.OPEN)
+
+
+class CircuitBreakers:
+    """依端點類別（ENDPOINT_CLASSES）分開的斷路器"""
+
+    def __init__(self, on_change=None, **kwargs):
+        self.breakers = {endpoint: CircuitBreaker(endpoint, on_change=on_change, **kwargs)
+                         for endpoint in ENDPOINT_CLASSES}
+
+    def wait_time(self, url):
+        return self.breakers[endpoint_class(url)].wait_time()
+
+    def acquire(self, url):
+        """斷路器開啟時等待，直到可以發送請求"""
+        while True:
+            delay = self.wait_time(url)
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def observe(self, url, latency, status_code, error):
+        """回應監聽器：逾時、連線錯誤與 5xx 視為伺服器不健康"""
+        failed = error is not None or status_code >= 500
+        self.breakers[endpoint_class(url)].record(failed)
+
+    def trips(self):
+        """各端點類別的斷路器開啟次數"""
+        return {endpoint: breaker.trips for endpoint, breaker in self.breakers.items()}
+
+
+class ConnectionStats:
+    """連線統計（thread-safe）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def record_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self.lock:
+            self.new_connections += 1
+
+    def snapshot(self):
+        """取得目前統計（請求數、新建連線數、重用連線數）"""
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': max(self.requests - self.new_connections, 0)
+            }
+
+
+def _counting_pool_classes(stats):
+    """建立會記錄實際 TCP 連線建立次數的 urllib3 連線池類別"""
+
+    class CountingHTTPConnection(HTTPConnection):
+        def connect(self):
+            stats.record_new_connection()
+            super().connect()
+
+    class CountingHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            stats.record_new_connection()
+            super().connect()
+
+    class CountingHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = CountingHTTPConnection
+
+    class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = CountingHTTPSConnection
+
+    return {'http': CountingHTTPConnectionPool, 'https': CountingHTTPSConnectionPool}
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """會統計新建連線的 HTTPAdapter"""
+
+    def __init__(self, stats, **kwargs):
+        # init_poolmanager 會在 HTTPAdapter.__init__ 中被呼叫，需先設定
+        self.pool_classes = _counting_pool_classes(stats)
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.pool_classes
+
+
+class SessionPool:
+    """
+    Thread-safe 的 HTTP Session 池
+
+    每個線程有自己的 Session（避免共用 cookie 狀態），
+    但所有 Session 掛載同一個 HTTPAdapter，因此 keep-alive 連線可跨線程重用。
+    pool_size 為每個主機保留的連線數上限，建議與線程數相同。
+    rate_limiter 為共用的 RateLimiter，每個請求發送前依端點類別等待；
+    circuit_breakers 開啟時，該端點類別的所有請求暫停直到探測成功。
+    cache 為 ResponseCache 時先查詢快取，命中的請求不經過網路、限速與斷路器。
+    recorder 不為 None 時，每個網路回應都交給 recorder.record()（nycu_replay 錄製重播檔）。
+    """
+
+    def __init__(self, pool_size=1, rate_limiter=None, circuit_breakers=None, cache=None):
+        self.pool_size = max(1, int(pool_size))
+        self.cache = cache
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.circuit_breakers = circuit_breakers or CircuitBreakers()
+        self.stats = ConnectionStats()
+        self.adapter = CountingHTTPAdapter(self.stats,
+                                           pool_connections=4,
+                                           pool_maxsize=self.pool_size)
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        self.listeners = []
+        self.recorder = None
+
+    def _session(self):
+        """取得目前線程的 Session（不存在時建立）"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', self.adapter)
+            session.mount('http://', self.adapter)
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def add_listener(self, listener):
+        """
+        註冊回應監聽器
+
+        每個請求結束後呼叫 listener(url, latency, status_code, error)；
+        連線失敗或逾時時 status_code 為 None，error 為例外物件
+        """
+        self.listeners.append(listener)
+
+    def report(self, url, latency, status_code, error):
+        """回報一次請求結果給斷路器與監聽器（asyncio 引擎的請求也經由此處回報）"""
+        self.circuit_breakers.observe(url, latency, status_code, error)
+        for listener in self.listeners:
+            listener(url, latency, status_code, error)
+
+    def request(self, method, url, fresh=False, **kwargs):
+        """
+        發送請求（參數與 requests.request 相同）
+
+        fresh=True 時略過快取查詢，一律向伺服器請求（回應仍寫入快取）
+        """
+        if self.cache and not fresh:
+            cached = self.cache.get(method, url, kwargs.get('data'))
+            if cached is not None:
+                return cached
+
+        self.circuit_breakers.acquire(url)
+        self.rate_limiter.acquire(url)
+        self.stats.record_request()
+        start = time.monotonic()
+        try:
+            response = self._session().request(method, url, **kwargs)
+        except Exception as e:
+            self.report(url, time.monotonic() - start, None, e)
+            raise
+        self.report(url, time.monotonic() - start, response.status_code, None)
+        if self.cache:
+            self.cache.put_response(method, url, kwargs.get('data'), response)
+        if self.recorder:
+            self.recorder.record(method, url, kwargs.get('data'), response)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def connection_stats(self):
+        """回傳連線統計"""
+        return self.stats.snapshot()
+
+    def close(self):
+        """關閉所有 Session 與連線池"""
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self.adapter.close()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 增量爬取
+國立陽明交通大學課程爬蟲增量模式（--incremental）
+
+功能：
+1. 以課程基本資料（不含選課人數與綱要）計算內容雜湊
+2. 讀取上一次的完整綱要輸出，基本資料未變更的課程沿用原本的綱要
+3. 只有新增或基本資料已變更的課程需要重新取得綱要
+
+供 nycu_crawler_multithreaded.py 使用
+"""
+
+import hashlib
+import json
+import threading
+
+# 不列入內容雜湊的欄位：選課人數隨時變動，與課程綱要無關；
+# schedule_mask 由 raw_time_classroom 計算，排除後舊版輸出仍可沿用
+FINGERPRINT_EXCLUDED_FIELDS = ('enrollment', 'outline', 'schedule_mask')
+
+
+def course_fingerprint(course):
+    """課程基本資料的內容雜湊（sha256，與欄位順序無關）"""
+    basic = {k: v for k, v in course.items() if k not in FINGERPRINT_EXCLUDED_FIELDS}
+    encoded = json.dumps(basic, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class PreviousOutlines:
+    """
+    上一次爬取的綱要（thread-safe）
+
+    只記錄有綱要的課程；上次失敗或無綱要的課程一律重新取得
+    """
+
+    def __init__(self, filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        self.filename = filename
+        self.metadata = data.get('metadata', {})
+        self.lock = threading.Lock()
+        self._entries = {}  # cos_id -> (內容雜湊, outline)
+        for course in data.get('courses', []):
+            outline = course.get('outline')
+            if outline:
+                self._entries[course['id']] = (course_fingerprint(course), outline)
+
+        self.reused = 0     # 沿用綱要的課程數
+        self.changed = 0    # 基本資料已變更的課程數
+        self.new = 0        # 上次沒有綱要的課程數
+
+    def __len__(self):
+        return len(self._entries)
+
+    def outline_for(self, course):
+        """基本資料未變更時返回上次的綱要，否則返回 None"""
+        entry = self._entries.get(course['id'])
+        with self.lock:
+            if entry is None:
+                self.new += 1
+                return None
+            if entry[0] != course_fingerprint(course):
+                self.changed += 1
+                return None
+            self.reused += 1
+            return entry[1]
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 排課
+國立陽明交通大學課程無衝堂課表產生器
+
+功能：
+1. 依願望清單（課程名稱或課程代碼）將同名課程的各班別分為一組，每組最多選一班；
+   名稱與其中某班的代碼同時列出時合併為一組，只考慮指定的班別
+2. 以 schedule_mask 位元遮罩回溯搜尋：已佔用時段以一個整數表示，衝堂的班別直接略過，
+   並檢查剩餘的必選組仍有可選的班別（forward checking）
+3. 學分範圍限制（--min-credits / --max-credits），剩餘學分不足時提前剪枝
+4. iter_timetables 逐一產生課表（串流），plan 取前 limit 個
+
+用法：
+  python nycu_planner.py --data course_data/basic/114-1_data_4thread.json \\
+      --want 微積分 --want 普通物理 --maybe 程式設計 --max-credits 12 --limit 20
+"""
+
+import argparse
+import itertools
+import json
+import sys
+
+from nycu_schedule import course_mask, mask_slots
+
+DEFAULT_LIMIT = 100
+
+
+def build_groups(courses, required, optional=()):
+    """
+    將願望清單轉為班別群組 [{'key', 'required', 'sections'}]
+
+    項目與課程名稱完全相同時為該名稱的所有班別，否則視為課程代碼（該班）。
+    同名課程的項目合併為一組（每門課程只會出現在一個群組）：有指定課程代碼時只考慮指定的班別，
+    任一項目為必選時該組為必選
+    """
+    by_name, by_id = {}, {}
+    for course in courses:
+        by_name.setdefault(course['name'], []).append(course)
+        by_id[course['id']] = course
+
+    groups, group_of = [], {}  # 課程名稱 -> 群組
+    for key, is_required in [(key, True) for key in required] + [(key, False) for key in optional]:
+        if key in by_name:
+            name, code = key, None
+        elif key in by_id:
+            name, code = by_id[key]['name'], key
+        else:
+            raise ValueError(f"找不到課程: {key}")
+
+        group = group_of.get(name)
+        if group is None:
+            group = group_of[name] = {'keys': [], 'codes': [], 'required': False}
+            groups.append(group)
+        if key not in group['keys']:
+            group['keys'].append(key)
+        if code is not None and code not in group['codes']:
+            group['codes'].append(code)
+        group['required'] = group['required'] or is_required
+
+    return [{'key': '/'.join(group['keys']), 'required': group['required'],
+             'sections': [by_id[code] for code in group['codes']] if group['codes']
+             else by_name[group['keys'][0]]}
+            for group in groups]
+
+
+def iter_timetables(groups, min_credits=0, max_credits=None):
+    """
+    逐一產生無衝堂的課表（課程 tuple，依群組順序）
+
+    必選組每組選一班，選修組可選一班或不選；總學分介於 min_credits 與 max_credits 之間。
+    不產生空課表
+    """
+    # 必選且班別少的組先展開，越早發現無解越好
+    order = sorted(range(len(groups)),
+                   key=lambda i: (not groups[i]['required'], len(groups[i]['sections'])))
+    levels = [(i, groups[i]['required'],
+               [(course_mask(course), course.get('credit') or 0, course) for course in groups[i]['sections']])
+              for i in order]
+
+    # 從第 k 組起最多還能取得的學分（學分下限剪枝）
+    max_rest = [0] * (len(levels) + 1)
+    for k in range(len(levels) - 1, -1, -1):
+        max_rest[k] = max_rest[k + 1] + max(credit for _, credit, _ in levels[k][2])
+
+    chosen = {}  # 群組位置 -> 課程
+    chosen_ids = set()  # 已選課程的 id（沒有上課時間的課程遮罩為 0，不會因衝堂被略過）
+
+    def feasible(k, occupied):
+        """剩餘的每個必選組都還有不衝堂的班別"""
+        for _, required, options in levels[k:]:
+            if required and all(mask & occupied for mask, _, _ in options):
+                return False
+        return True
+
+    def search(k, occupied, credits):
+        if credits + max_rest[k] < min_credits:
+            return
+        if k == len(levels):
+            if chosen:
+                yield tuple(chosen[i] for i in sorted(chosen))
+            return
+
+        index, required, options = levels[k]
+        for mask, credit, course in options:
+            if mask & occupied or course['id'] in chosen_ids:
+                continue
+            if max_credits is not None and credits + credit > max_credits:
+                continue
+            if not feasible(k + 1, occupied | mask):
+                continue
+            chosen[index] = course
+            chosen_ids.add(course['id'])
+            yield from search(k + 1, occupied | mask, credits + credit)
+            chosen_ids.discard(course['id'])
+            del chosen[index]
+
+        if not required:
+            yield from search(k + 1, occupied, credits)
+
+    yield from search(0, 0, 0)
+
+
+def plan(courses, required, optional=(), min_credits=0, max_credits=None, limit=DEFAULT_LIMIT):
+    """依願望清單返回最多 limit 個無衝堂課表"""
+    groups = build_groups(courses, required, optional)
+    return list(itertools.islice(iter_timetables(groups, min_credits, max_credits), limit))
+
+
+def timetable_credits(timetable):
+    return sum(course.get('credit') or 0 for course in timetable)
+
+
+def print_timetable(number, timetable):
+    print(f"\n課表 {number}（{timetable_credits(timetable):g} 學分）")
+    for course in timetable:
+        slots = mask_slots(course_mask(course))
+        days = {}
+        for day, period in slots:
+            days[day] = days.get(day, '') + period
+        times = ''.join(f"{day}{periods}" for day, periods in days.items()) or '無上課時間'
+        print(f"  {course['id']}  {course['name']} - {course['teacher']}  {times}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='NYCU Course Crawler - 無衝堂課表產生器',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+範例用法：
+  # 微積分與普通物理必選，程式設計可選，最多 12 學分
+  python nycu_planner.py --data course_data/basic/114-1_data_4thread.json \\
+      --want 微積分 --want 普通物理 --maybe 程式設計 --max-credits 12
+
+  # 指定課程代碼（只考慮該班），只計算課表數量
+  python nycu_planner.py --data course_data/basic/114-1_data_4thread.json \\
+      --want 515002 --want 線性代數 --count
+        """)
+    parser.add_argument('--data', required=True, help='課程資料檔（爬蟲輸出的 JSON）')
+    parser.add_argument('--want', action='append', default=[], metavar='NAME_OR_ID',
+                        help='必選課程名稱或課程代碼（可重複指定）')
+    parser.add_argument('--maybe', action='append', default=[], metavar='NAME_OR_ID',
+                        help='可選課程名稱或課程代碼（可重複指定）')
+    parser.add_argument('--min-credits', type=float, default=0, help='最低總學分 (預設: 0)')
+    parser.add_argument('--max-credits', type=float, default=None, help='最高總學分 (預設: 不限)')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help=f'最多顯示幾個課表 (預設: {DEFAULT_LIMIT})')
+    parser.add_argument('--count', action='store_true', help='只計算符合條件的課表數量')
+    args = parser.parse_args()
+
+    if not args.want and not args.maybe:
+        print("錯誤: 請以 --want 或 --maybe 指定至少一門課程")
+        sys.exit(1)
+
+    with open(args.data, 'r', encoding='utf-8') as f:
+        courses = json.load(f)['courses']
+
+    try:
+        groups = build_groups(courses, args.want, args.maybe)
+    except ValueError as e:
+        print(f"錯誤: {e}")
+        sys.exit(1)
+
+    for group in groups:
+        print(f"{'必選' if group['required'] else '可選'}：{group['key']}（{len(group['sections'])} 個班別）")
+
+    timetables = iter_timetables(groups, args.min_credits, args.max_credits)
+    if args.count:
+        print(f"\n共 {sum(1 for _ in timetables)} 個無衝堂課表")
+        return
+
+    found = 0
+    for found, timetable in enumerate(itertools.islice(timetables, args.limit), 1):
+        print_timetable(found, timetable)
+    print(f"\n顯示 {found} 個無衝堂課表" + (f"（上限 {args.limit}）" if found == args.limit else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 錄製／重播伺服器
+國立陽明交通大學課程爬蟲離線測試工具
+
+功能：
+1. record：實際爬取一次，將爬蟲使用的所有端點回應錄製為重播檔（JSONL，可 gzip 壓縮）
+2. synth：產生合成的重播檔（不需連線，系所數與課程數可調整）
+3. serve：本機重播伺服器，可設定延遲、抖動、錯誤率與 False 回應比例；
+   爬蟲以 --base-url http://127.0.0.1:<port> 連線，可離線、可重現地比較引擎、重試策略與檢查點
+
+用法：
+  python nycu_replay.py record --year 114 --semester 1 --outline --archive fixtures/114-1.jsonl.gz
+  python nycu_replay.py synth --departments 50 --courses 40 --archive fixtures/synthetic.jsonl.gz
+  python nycu_replay.py serve --archive fixtures/114-1.jsonl.gz --port 8900 --latency 0.05 --error-rate 0.05
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from nycu_http import BASE_URL, endpoint_class
+
+DEFAULT_REPLAY_PORT = 8900
+
+# 錯誤率只套用在這些端點類別：探索或課程列表失敗時爬蟲會漏掉整個系所，結果無法比較
+FAULT_CLASSES = ('outline', 'html')
+
+
+def split_request(url, data=None):
+    """將請求拆為 (路由, 參數)；參數包含查詢字串（不含 r）與 POST 內容，值一律為字串"""
+    params = {k: v for k, v in parse_qsl(urlsplit(url).query, keep_blank_values=True)}
+    route = params.pop('r', '')
+    for key, value in (data or {}).items():
+        params[key] = str(value)
+    return route, params
+
+
+def request_key(method, route, params):
+    """重播檔的查詢鍵（不含主機，錄製與重播的網址可以不同）"""
+    return f"{method.upper()} {route}?{urlencode(sorted(params.items()))}"
+
+
+def _open_archive(path, mode, compressed):
+    if compressed:
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class ReplayArchive:
+    """重播檔：請求 -> 回應（thread-safe）"""
+
+    def __init__(self):
+        self.entries = {}  # 查詢鍵 -> 記錄
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, method, route, params, body, status=200,
+            content_type='text/html; charset=UTF-8'):
+        entry = {
+            "method": method.upper(),
+            "route": route,
+            "params": params,
+            "status": status,
+            "content_type": content_type,
+            "body": body,
+        }
+        with self.lock:
+            self.entries[request_key(method, route, params)] = entry
+
+    def add_json(self, method, route, params, payload):
+        """加入 JSON 回應（伺服器的 Content-Type 為 text/html）"""
+        self.add(method, route, params, json.dumps(payload, ensure_ascii=False))
+
+    def lookup(self, method, route, params):
+        with self.lock:
+            return self.entries.get(request_key(method, route, params))
+
+    def route_counts(self):
+        """各路由的回應數"""
+        counts = {}
+        with self.lock:
+            for entry in self.entries.values():
+                counts[entry['route']] = counts.get(entry['route'], 0) + 1
+        return counts
+
+    @classmethod
+    def load(cls, filename):
+        archive = cls()
+        with _open_archive(filename, 'r', filename.endswith('.gz')) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    archive.entries[request_key(entry['method'], entry['route'], entry['params'])] = entry
+        return archive
+
+    def save(self, filename):
+        """依查詢鍵排序寫入（同一份資料的輸出相同），寫入暫存檔後原子替換"""
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        temp_path = filename + '.tmp'
+        with self.lock:
+            entries = [self.entries[key] for key in sorted(self.entries)]
+        try:
+            with _open_archive(temp_path, 'w', filename.endswith('.gz')) as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            os.replace(temp_path, filename)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+class ArchiveRecorder:
+    """SessionPool.recorder：將每個 200 回應加入重播檔"""
+
+    def __init__(self, archive):
+        self.archive = archive
+
+    def record(self, method, url, data, response):
+        if response.status_code != 200:
+            return  # 暫時性的失敗不錄製，重播時以 --error-rate 模擬
+        route, params = split_request(url, data)
+        self.archive.add(method, route, params, response.text, response.status_code,
+                         response.headers.get('Content-Type', 'text/html; charset=UTF-8'))
+
+
+# ============= 合成重播檔 =============
+
+SYNTH_TYPES = (("1", "學士班課程"), ("2", "研究所課程"), ("3", "其他課程"))
+SYNTH_TEACHERS = ("陳大文", "林小明", "王美華", "張志強", "李怡君", "黃建國")
+SYNTH_NAMES = ("微積分", "線性代數", "程式設計", "資料結構", "演算法", "計算機組織",
+               "作業系統", "機率", "訊號與系統", "電子學", "物理", "英文")
+
+
+def _synth_course_list(seed, dep_id, course_ids):
+    """單一系所的 get_cos_list 回應（亂數由課程編號決定，跨系所開課的資料相同）"""
+    courses, language, brief = {}, {}, {}
+    for cos_id in course_ids:
+        rnd = random.Random(f"{seed}-{cos_id}")
+        day = rnd.choice('MTWRF')
+        start = rnd.randint(1, 7)
+        periods = ''.join(str(p) for p in range(start, min(start + rnd.choice((1, 2, 3)), 10)))
+        room = f"{rnd.choice(('EC', 'ED', 'EE', 'SA'))}{rnd.randint(100, 399)}"
+        courses[cos_id] = {
+            "cos_id": cos_id,
+            "cos_cname": f"{rnd.choice(SYNTH_NAMES)}{'(英文授課)' if rnd.random() < 0.1 else ''}",
+            "teacher": rnd.choice(SYNTH_TEACHERS),
+            "cos_credit": rnd.choice(("1.00", "2.00", "3.00")),
+            "cos_hours": rnd.choice(("2", "3")),
+            "cos_type": rnd.choice(("必修", "選修", "通識")),
+            "num_limit": str(rnd.choice((30, 50, 80, 120))),
+            "reg_num": str(rnd.randint(0, 120)),
+            "cos_time": f"{day}{periods}-{room}[{rnd.choice(('GF', '2F', '3F'))}]",
+        }
+        language[cos_id] = {"授課語言代碼": "en-us" if rnd.random() < 0.1 else "zh-tw"}
+        brief[cos_id] = {"0": {"brief": rnd.choice(("核心課程", "核心課程,通識", "跨域學程", ""))}}
+    return {dep_id: {"language": language, "1": courses, "brief": brief}}
+
+
+def _synth_outline(archive, rnd, year, semester, cos_id):
+    """單一課程的四個綱要子端點與 HTML 頁面"""
+    params = {"acy": str(year), "sem": str(semester), "cos_id": cos_id, "user": "", "_token": ""}
+    name = rnd.choice(SYNTH_NAMES)
+    archive.add_json('POST', 'main/getCrsOutlineBase', params, {
+        "cos_name": name, "cos_eng_name": f"Course {cos_id}", "sel_type_name": "必修",
+        "dep_name": "資訊工程學系", "cos_code": f"CS{cos_id}", "teacher_hours": "3",
+    })
+    archive.add_json('POST', 'main/getCrsOutlineDescription', params, {
+        "crs_prerequisite": "無", "crs_outline": f"{name}：介紹基本概念與應用 introduction to {name}",
+        "crs_textbook": "講義", "crs_exam_score": "期中 40%、期末 40%、作業 20%",
+    })
+    archive.add_json('POST', 'main/getCrsOutlineSyllabuses', params, [
+        {"week_id": str(week), "class_date": f"{year + 1911}-09-{week:02d}(一)",
+         "class_data": f"第 {week} 週\n主題 {week}"}
+        for week in range(1, 17)
+    ])
+    # 約一半的課程沒有單元時數（API 返回 false）
+    archive.add_json('POST', 'main/getCrsOutlineOptional', params, [
+        {"title": f"單元 {unit}", "content": f"{name} 單元 {unit}", "hour_teaching": "3",
+         "hour_demo": rnd.choice(("0", "1")), "hour_exercise": "", "hour_other": "0", "memo": ""}
+        for unit in range(1, rnd.randint(3, 7))
+    ] if rnd.random() < 0.5 else False)
+    html = f"<html><body><h1>{name}</h1><p>{'課程大綱 syllabus ' * 10}</p></body></html>"
+    for route in ('course/syllabus', 'main/course_detail'):
+        archive.add('GET', route, {"acy": str(year), "sem": str(semester), "cos_id": cos_id}, html)
+
+
+def synthetic_archive(year, semester, departments=50, courses=40, seed=0, outlines=True):
+    """
+    產生合成重播檔
+
+    探索樹包含有學院與無學院的類別、「其他課程」類型，以及出現在多個位置的系所；
+    約 5% 的課程同時出現在兩個系所（跨系所開課），與實際網站的重複情形相同
+    """
+    archive = ReplayArchive()
+    acysem = f"{year}{semester}"
+    flang = "zh-tw"
+    dep_ids = [f"D{i:03d}" for i in range(1, departments + 1)]
+
+    archive.add_json('GET', 'main/get_type', {}, [{"uid": uid, "cname": cname} for uid, cname in SYNTH_TYPES])
+
+    # 前兩種類型各有兩個類別：第一個類別下有學院，第二個類別直接列出系所；
+    # 「其他課程」的類別即為系所。系所平均分配，每個分組最後一個系所也出現在下一組
+    other_count = max(1, departments // 10)
+    groups = [dep_ids[i::6] for i in range(6)]  # 4 個學院 + 2 個無學院類別
+    other_deps = dep_ids[-other_count:]
+    for index, group in enumerate(groups):
+        if group and index + 1 < len(groups):
+            groups[index + 1] = groups[index + 1] + group[-1:]
+
+    group_iter = iter(groups)
+    for uid, cname in SYNTH_TYPES:
+        base = {"ftype": uid, "flang": flang, "acysem": acysem, "acysemend": acysem}
+        if cname == "其他課程":
+            archive.add_json('POST', 'main/get_category', base, {dep: dep for dep in other_deps})
+            continue
+        categories = {f"{uid}A": "學院課程", f"{uid}B": "共同課程"}
+        archive.add_json('POST', 'main/get_category', base, categories)
+
+        college_ids = {f"{uid}A1": "學院一", f"{uid}A2": "學院二"}
+        archive.add_json('POST', 'main/get_college', dict(base, fcategory=f"{uid}A"), college_ids)
+        archive.add_json('POST', 'main/get_college', dict(base, fcategory=f"{uid}B"), [])
+        for fcollege in college_ids:
+            archive.add_json('POST', 'main/get_dep', dict(base, fcategory=f"{uid}A", fcollege=fcollege),
+                             {dep: dep for dep in next(group_iter)})
+        archive.add_json('POST', 'main/get_dep', dict(base, fcategory=f"{uid}B", fcollege=""),
+                         {dep: dep for dep in next(group_iter)})
+
+    # 課程：依系所連續編號，約 5% 同時出現在下一個系所
+    course_ids = {dep: [f"{n + 1:03d}{i + 1:03d}" for i in range(courses)] for n, dep in enumerate(dep_ids)}
+    for n, dep in enumerate(dep_ids[:-1]):
+        course_ids[dep_ids[n + 1]].extend(course_ids[dep][::20])
+
+    for dep in dep_ids:
+        params = {
+            "m_acy": str(year), "m_sem": str(semester),
+            "m_acyend": str(year), "m_semend": str(semester),
+            "m_dep_uid": dep, "m_group": "**", "m_grade": "**",
+            "m_class": "**", "m_option": "**", "m_crsname": "**",
+            "m_teaname": "**", "m_cos_id": "**", "m_cos_code": "**",
+            "m_crstime": "**", "m_crsoutline": "**", "m_costype": "**",
+            "m_selcampus": "**"
+        }
+        archive.add_json('POST', 'main/get_cos_list', params,
+                         _synth_course_list(seed, dep, course_ids[dep]))
+
+    if outlines:
+        for cos_id in sorted({cos_id for ids in course_ids.values() for cos_id in ids}):
+            _synth_outline(archive, random.Random(f"{seed}-outline-{cos_id}"), year, semester, cos_id)
+
+    return archive
+
+
+# ============= 重播伺服器 =============
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """依重播檔回應請求"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive，與實際網站的連線行為相同
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, content_type='text/html; charset=UTF-8'):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method, data=None):
+        route, params = split_request(self.path, data)
+        status, body, content_type = self.server.respond(method, route, params)
+        self._reply(status, body, content_type)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8')
+        self._handle('POST', dict(parse_qsl(body, keep_blank_values=True)))
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    本機重播伺服器
+
+    latency ± jitter 秒後回應；outline / html 端點依 error_rate 回應 503，
+    綱要 JSON 端點依 false_rate 回應 false（API 沒有資料時的行為）。
+    重播檔中沒有的請求回應 404
+    """
+
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(self, archive, host='127.0.0.1', port=DEFAULT_REPLAY_PORT, latency=0.0, jitter=0.0,
+                 error_rate=0.0, false_rate=0.0, seed=None):
+        super().__init__((host, port), ReplayHandler)
+        self.archive = archive
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.false_rate = false_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'false': 0, 'missing': 0}
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def respond(self, method, route, params):
+        """返回 (狀態碼, 內容, Content-Type)"""
+        kind = endpoint_class(f"?r={route}")
+        with self.lock:
+            self.stats['requests'] += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            fail = kind in FAULT_CLASSES and self.random.random() < self.error_rate
+            false = kind == 'outline' and self.random.random() < self.false_rate
+        if delay:
+            time.sleep(delay)
+
+        entry = self.archive.lookup(method, route, params)
+        with self.lock:
+            if entry is None:
+                self.stats['missing'] += 1
+            elif fail:
+                self.stats['errors'] += 1
+            elif false:
+                self.stats['false'] += 1
+
+        if entry is None:
+            return 404, 'false', 'text/html; charset=UTF-8'
+        if fail:
+            return 503, 'Service Unavailable', 'text/html; charset=UTF-8'
+        if false:
+            return 200, 'false', entry['content_type']
+        return entry['status'], entry['body'], entry['content_type']
+
+    def start(self):
+        """在背景線程啟動伺服器（供基準測試使用）"""
+        self.thread = threading.Thread(target=self.serve_forever, name='replay-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# ============= 命令列 =============
+
+def cmd_record(args):
+    """實際爬取一次並錄製所有回應"""
+    from nycu_crawler_multithreaded import NYCUCrawler
+
+    archive = ReplayArchive()
+    archive_file = os.path.abspath(args.archive)
+    cwd = os.getcwd()
+    # 爬蟲的輸出（course_data/ 的資料檔、檢查點、系所清單）寫在暫存目錄，
+    # 不覆寫目前目錄的資料；只保留重播檔
+    with tempfile.TemporaryDirectory(prefix='nycu-record-') as workdir:
+        os.chdir(workdir)
+        try:
+            # 不使用回應快取並重新探索，確保所有端點都經過網路並被錄製；
+            # async 引擎不經過 SessionPool，錄製時固定使用 thread 引擎
+            crawler = NYCUCrawler(args.year, args.semester, args.outline, args.threads,
+                                  engine='thread', cache_dir=None, refresh_discovery=True,
+                                  base_url=args.base_url)
+            crawler.http.recorder = ArchiveRecorder(archive)
+            try:
+                crawler.crawl()
+            finally:
+                crawler.close()
+                archive.save(archive_file)
+        finally:
+            os.chdir(cwd)
+    print(f"已錄製 {len(archive)} 個回應至 {args.archive}")
+
+
+def cmd_synth(args):
+    """產生合成重播檔"""
+    archive = synthetic_archive(args.year, args.semester, args.departments, args.courses,
+                                seed=args.seed, outlines=not args.no_outline)
+    archive.save(args.archive)
+    print(f"已產生 {len(archive)} 個回應至 {args.archive}")
+    for route, count in sorted(archive.route_counts().items()):
+        print(f"  {route}: {count}")
+
+
+def cmd_serve(args):
+    """啟動重播伺服器"""
+    archive = ReplayArchive.load(args.archive)
+    server = ReplayServer(archive, args.host, args.port, args.latency, args.jitter,
+                          args.error_rate, args.false_rate, args.seed)
+    print(f"重播伺服器：{server.url}（{len(archive)} 個回應）")
+    print(f"延遲 {args.latency}±{args.jitter}s | 錯誤率 {args.error_rate:.0%} | "
+          f"False 比例 {args.false_rate:.0%}")
+    print(f"爬蟲參數：--base-url {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\n請求 {server.stats['requests']} | 錯誤 {server.stats['errors']} | "
+              f"False {server.stats['false']} | 未錄製 {server.stats['missing']}")
+
+
+def main():
+    """主函數 - 支援命令行參數"""
+    parser = argparse.ArgumentParser(
+        description='NYCU Course Crawler - 錄製／重播伺服器',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__.split('用法：', 1)[1])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record = subparsers.add_parser('record', help='實際爬取並錄製回應')
+    record.add_argument('--year', type=int, default=114, help='學年度 (預設: 114)')
+    record.add_argument('--semester', type=int, default=1, help='學期 (預設: 1)')
+    record.add_argument('--outline', action='store_true', help='同時錄製課程綱要')
+    record.add_argument('--threads', type=int, default=4, help='線程數量 (預設: 4)')
+    record.add_argument('--base-url', default=BASE_URL, help=f'錄製來源 (預設: {BASE_URL})')
+    record.add_argument('--archive', required=True, help='重播檔路徑（.jsonl 或 .jsonl.gz）')
+    record.set_defaults(func=cmd_record)
+
+    synth = subparsers.add_parser('synth', help='產生合成重播檔')
+    synth.add_argument('--year', type=int, default=114, help='學年度 (預設: 114)')
+    synth.add_argument('--semester', type=int, default=1, help='學期 (預設: 1)')
+    synth.add_argument('--departments', type=int, default=50, help='系所數 (預設: 50)')
+    synth.add_argument('--courses', type=int, default=40, help='每個系所的課程數 (預設: 40)')
+    synth.add_argument('--seed', type=int, default=0, help='亂數種子 (預設: 0)')
+    synth.add_argument('--no-outline', action='store_true', help='不產生課程綱要')
+    synth.add_argument('--archive', required=True, help='重播檔路徑（.jsonl 或 .jsonl.gz）')
+    synth.set_defaults(func=cmd_synth)
+
+    serve = subparsers.add_parser('serve', help='啟動重播伺服器')
+    serve.add_argument('--archive', required=True, help='重播檔路徑')
+    serve.add_argument('--host', default='127.0.0.1', help='監聽位址 (預設: 127.0.0.1)')
+    serve.add_argument('--port', type=int, default=DEFAULT_REPLAY_PORT,
+                       help=f'監聽埠 (預設: {DEFAULT_REPLAY_PORT})')
+    serve.add_argument('--latency', type=float, default=0.0, help='每個回應的延遲秒數 (預設: 0)')
+    serve.add_argument('--jitter', type=float, default=0.0, help='延遲的隨機變動秒數 (預設: 0)')
+    serve.add_argument('--error-rate', type=float, default=0.0,
+                       help='綱要與 HTML 端點回應 503 的比例 (預設: 0)')
+    serve.add_argument('--false-rate', type=float, default=0.0,
+                       help='綱要 JSON 端點回應 false 的比例 (預設: 0)')
+    serve.add_argument('--seed', type=int, default=None, help='亂數種子')
+    serve.set_defaults(func=cmd_serve)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except KeyboardInterrupt:
+        print("\n\n使用者中斷")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
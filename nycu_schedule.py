@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 上課時間解析
+國立陽明交通大學課程爬蟲時間-教室字串解析器
+
+功能：
+1. 將 cos_time 字串（例如 "M34W2-EE102[GF],R5-EE201[2F]"）解析為結構化的 schedule
+2. 預先編譯的正規表示式與查表取代逐字元的 if/elif 判斷
+3. 以原始字串為鍵的 LRU 快取：大量課程共用相同的 cos_time，結果為共用的不可變資料
+4. 上課時段位元遮罩：7 天 × 16 節（y z 1 2 3 4 n 5 6 7 8 9 a b c d）共 112 位元的整數，
+   衝堂、空堂與「週一下午」等查詢以位元運算取代走訪 schedule；
+   encode_masks 以 NumPy 將整份資料檔轉為 (課程數, 7) 的 uint16 矩陣
+
+供 nycu_crawler.py、nycu_crawler_multithreaded.py 與讀取資料檔的程式共用
+"""
+
+import re
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # 位元遮罩矩陣需要 numpy（選用）
+    np = None
+
+# 時段對應表
+PERIOD_TIME_MAP = {
+    'y': ('06:00', '06:50'), 'z': ('07:00', '07:50'),
+    '1': ('08:00', '08:50'), '2': ('09:00', '09:50'),
+    '3': ('10:10', '11:00'), '4': ('11:10', '12:00'),
+    'n': ('12:10', '13:00'),
+    '5': ('13:20', '14:10'), '6': ('14:20', '15:10'),
+    '7': ('15:30', '16:20'), '8': ('16:30', '17:20'),
+    '9': ('17:30', '18:20'),
+    'a': ('18:25', '19:15'), 'b': ('19:20', '20:10'),
+    'c': ('20:15', '21:05'), 'd': ('21:10', '22:00')
+}
+
+# 星期對應表
+DAY_MAP = {
+    'M': (1, 'Monday'), 'T': (2, 'Tuesday'), 'W': (3, 'Wednesday'),
+    'R': (4, 'Thursday'), 'F': (5, 'Friday'), 'S': (6, 'Saturday'),
+    'U': (7, 'Sunday')
+}
+
+# 時段字元 -> 輸出的節次編號（用於排序和顯示）
+# 沿用既有資料格式：z 與 1 同為 1、n 與 7 同為 7
+PERIOD_NUMBERS = {
+    'y': 0, 'z': 1, 'n': 7, 'a': 10, 'b': 11, 'c': 12, 'd': 13,
+    **{str(p): p for p in range(1, 10)}
+}
+
+# 位元遮罩的節次順序：第 d 天（1=週一）第 i 個節次為第 (d - 1) * 16 + i 位元
+PERIOD_ORDER = 'yz1234n56789abcd'
+PERIODS_PER_DAY = len(PERIOD_ORDER)
+DAYS_PER_WEEK = 7
+MASK_BYTES = DAYS_PER_WEEK * PERIODS_PER_DAY // 8
+DAY_CODES = {day_num: code for code, (day_num, _) in DAY_MAP.items()}
+
+SCHEDULE_CACHE_SIZE = 16384  # 一學期不同的 cos_time 約數千種
+
+_TIME_PATTERN = re.compile(r'([MTWRFSU])([1-9yznabcd]+)')
+_FLOOR_PATTERN = re.compile(r'\[([^\]]+)\]')
+
+
+class ScheduleSlot(dict):
+    """
+    不可變的上課時段
+
+    dict 子類別，讀取方式與 JSON 輸出都與一般 dict 相同；
+    同一個 cos_time 的解析結果由所有課程共用，因此禁止修改（需要修改時以 dict(slot) 複製）
+    """
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("ScheduleSlot 為共用的不可變資料，請以 dict(slot) 複製後修改")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __hash__(self):
+        return hash(tuple(self.items()))
+
+    def __reduce__(self):
+        return (ScheduleSlot, (dict(self),))
+
+
+def _parse_room(classroom_part):
+    """分離教室與樓層（例如 "EE102[GF]" -> ("EE102", "GF")）"""
+    floor_match = _FLOOR_PATTERN.search(classroom_part)
+    if floor_match:
+        return classroom_part[:floor_match.start()], floor_match.group(1)
+    return classroom_part, ''
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def parse_schedule(time_classroom_str):
+    """
+    將時間-教室字串解析為結構化的 schedule（tuple of ScheduleSlot）
+
+    輸入範例: "M34W2-EE102[GF],R5-EE201[2F]"
+    輸出: (
+        {"day": 1, "day_name": "Monday", "periods": (3, 4), "time_start": "10:10",
+         "time_end": "12:00", "classroom": "EE102", "floor": "GF"},
+        ...
+    )
+    periods 為 tuple，JSON 輸出與原本的陣列格式相同
+    """
+    if not time_classroom_str or not time_classroom_str.strip():
+        return ()
+
+    schedule = []
+    for segment in time_classroom_str.split(','):
+        segment = segment.strip()
+        if not segment:
+            continue
+
+        # 分離時間和教室 (格式: "M34-EE102[GF]" 或 "M34")
+        parts = segment.split('-')
+        classroom, floor = _parse_room(parts[1]) if len(parts) > 1 and parts[1] else ('', '')
+
+        for day_code, periods_str in _TIME_PATTERN.findall(parts[0]):
+            day_num, day_name = DAY_MAP[day_code]
+            schedule.append(ScheduleSlot(
+                day=day_num,
+                day_name=day_name,
+                periods=tuple(PERIOD_NUMBERS[p] for p in periods_str),
+                time_start=PERIOD_TIME_MAP[periods_str[0]][0],
+                time_end=PERIOD_TIME_MAP[periods_str[-1]][1],
+                classroom=classroom,
+                floor=floor,
+            ))
+
+    return tuple(schedule)
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def schedule_mask(time_classroom_str):
+    """
+    時間-教室字串的上課時段位元遮罩（112 位元整數，沒有時段時為 0）
+
+    直接由節次字元計算，z / 1 與 n / 7 是不同的位元
+    """
+    if not time_classroom_str:
+        return 0
+
+    mask = 0
+    for segment in time_classroom_str.split(','):
+        for day_code, periods_str in _TIME_PATTERN.findall(segment.strip().split('-')[0]):
+            day_offset = (DAY_MAP[day_code][0] - 1) * PERIODS_PER_DAY
+            for p in periods_str:
+                mask |= 1 << (day_offset + PERIOD_ORDER.index(p))
+    return mask
+
+
+def slots_mask(day, periods):
+    """
+    查詢用的位元遮罩：day 為星期（1-7 或 M/T/W/R/F/S/U），periods 為節次字元
+
+    例如週一下午：slots_mask('M', '56789')
+    """
+    if isinstance(day, str):
+        day = DAY_MAP[day][0]
+    day_offset = (day - 1) * PERIODS_PER_DAY
+    mask = 0
+    for p in periods:
+        mask |= 1 << (day_offset + PERIOD_ORDER.index(p))
+    return mask
+
+
+def mask_slots(mask):
+    """位元遮罩 -> [(星期代碼, 節次字元), ...]（依星期與節次排序）"""
+    slots = []
+    for bit in range(DAYS_PER_WEEK * PERIODS_PER_DAY):
+        if mask >> bit & 1:
+            day, index = divmod(bit, PERIODS_PER_DAY)
+            slots.append((DAY_CODES[day + 1], PERIOD_ORDER[index]))
+    return slots
+
+
+def course_mask(course):
+    """資料檔中課程的位元遮罩（舊資料沒有 schedule_mask 時由 raw_time_classroom 計算）"""
+    mask = course.get('schedule_mask')
+    if mask is None:
+        mask = schedule_mask(course.get('raw_time_classroom') or '')
+    return mask
+
+
+def mask_to_row(mask):
+    """位元遮罩 -> 長度 7 的 uint16 陣列（每天一個 16 位元，bit i 為 PERIOD_ORDER[i]）"""
+    if np is None:
+        raise RuntimeError("位元遮罩矩陣需要 numpy，請執行: pip install numpy")
+    return np.frombuffer(mask.to_bytes(MASK_BYTES, 'little'), dtype='<u2').astype(np.uint16)
+
+
+def encode_masks(courses):
+    """
+    將整份資料檔的課程轉為 (課程數, 7) 的 uint16 矩陣（第 i 列為 courses[i]）
+
+    查詢範例：週一下午有課的課程 (matrix & mask_to_row(slots_mask('M', '56789'))).any(axis=1)
+    """
+    if np is None:
+        raise RuntimeError("位元遮罩矩陣需要 numpy，請執行: pip install numpy")
+    packed = b''.join(course_mask(course).to_bytes(MASK_BYTES, 'little') for course in courses)
+    return np.frombuffer(packed, dtype='<u2').reshape(-1, DAYS_PER_WEEK).astype(np.uint16)
+
+
+def course_schedule(course):
+    """
+    讀取資料檔時取得課程的 schedule
+
+    有 raw_time_classroom 時以 parse_schedule 重新解析（與爬蟲相同的解析器、共用快取），
+    否則返回資料檔中的 schedule
+    """
+    raw = course.get('raw_time_classroom')
+    if raw is not None:
+        return parse_schedule(raw)
+    return course.get('schedule', ())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 課程搜尋索引
+國立陽明交通大學課程資料的倒排索引
+
+功能：
+1. 課程名稱、教師與標籤的字元 n-gram 倒排索引（預設 bigram，適用「微積分」等中文名稱）
+2. 學分、星期、課程類型、標籤與英文授課的精確值 posting list
+3. 查詢時由最短的 posting list 開始取交集，多個條件 AND 組合不需再掃描全部課程；
+   文字條件最後只對候選課程確認子字串，結果與逐一比對相同（不分大小寫）
+
+用法：
+  index = CourseSearchIndex(data['courses'])
+  index.search(name="微積分", day=1, credit=3.0)
+"""
+
+from nycu_schedule import course_schedule
+
+DEFAULT_NGRAM = 2
+
+# 文字欄位：名稱 -> 取得欄位文字的函數
+TEXT_FIELDS = {
+    'name': lambda course: course.get('name', ''),
+    'teacher': lambda course: course.get('teacher', ''),
+    'tags': lambda course: '\n'.join(course.get('tags', [])),
+}
+
+# 精確值欄位：名稱 -> 取得欄位值（可多個）的函數
+EXACT_FIELDS = {
+    'credit': lambda course: [course.get('credit')],
+    'day': lambda course: sorted({slot['day'] for slot in course_schedule(course)}),
+    'type': lambda course: [course.get('type')],
+    'tag': lambda course: course.get('tags', []),
+    'english_taught': lambda course: [bool(course.get('english_taught'))],
+}
+
+
+def _normalize(text):
+    return (text or '').casefold()
+
+
+def ngrams(text, n=DEFAULT_NGRAM):
+    """字元 n-gram（文字短於 n 時為整段文字）"""
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class CourseSearchIndex:
+    """課程倒排索引（建立後唯讀，可由多個線程同時查詢）"""
+
+    def __init__(self, courses, n=DEFAULT_NGRAM):
+        self.courses = list(courses)
+        self.n = n
+        self.all = frozenset(range(len(self.courses)))
+        self.texts = {field: [] for field in TEXT_FIELDS}   # 欄位 -> 各課程的正規化文字（確認子字串）
+        self.grams = {field: {} for field in TEXT_FIELDS}   # 欄位 -> gram -> 課程位置
+        self.values = {field: {} for field in EXACT_FIELDS}  # 欄位 -> 值 -> 課程位置
+
+        for position, course in enumerate(self.courses):
+            for field, value_of in TEXT_FIELDS.items():
+                text = _normalize(value_of(course))
+                self.texts[field].append(text)
+                postings = self.grams[field]
+                # 建立 1..n 字元的 gram，較短的查詢字串也能使用索引
+                for size in range(1, n + 1):
+                    for gram in {text[i:i + size] for i in range(len(text) - size + 1)}:
+                        postings.setdefault(gram, []).append(position)
+            for field, values_of in EXACT_FIELDS.items():
+                postings = self.values[field]
+                for value in values_of(course):
+                    postings.setdefault(value, []).append(position)
+
+        # posting list 建立完成後轉為 frozenset，交集在 C 中進行
+        for postings in list(self.grams.values()) + list(self.values.values()):
+            for key in postings:
+                postings[key] = frozenset(postings[key])
+
+    def __len__(self):
+        return len(self.courses)
+
+    def text_candidates(self, field, keyword):
+        """keyword 的所有 gram 都出現的課程（尚未確認子字串）"""
+        keyword = _normalize(keyword)
+        if not keyword:
+            return self.all
+        postings = self.grams[field]
+        grams = ngrams(keyword, self.n)
+        lists = sorted((postings.get(gram, frozenset()) for gram in grams), key=len)
+        return lists[0].intersection(*lists[1:])
+
+    def exact(self, field, value):
+        """精確值的 posting list"""
+        return self.values[field].get(value, frozenset())
+
+    def match(self, **criteria):
+        """
+        符合所有條件的課程位置（依原始順序）
+
+        文字條件：name / teacher / tags（子字串）；精確條件：credit / day / type / tag / english_taught。
+        值為 None 的條件忽略
+        """
+        lists, texts = [], []
+        for field, value in criteria.items():
+            if value is None:
+                continue
+            if field in TEXT_FIELDS:
+                lists.append(self.text_candidates(field, value))
+                texts.append((field, _normalize(value)))
+            elif field in EXACT_FIELDS:
+                lists.append(self.exact(field, value))
+            else:
+                raise ValueError(f"不支援的搜尋條件: {field}")
+
+        if not lists:
+            return list(range(len(self.courses)))
+
+        lists.sort(key=len)
+        candidates = lists[0].intersection(*lists[1:])
+        # bigram 全部出現不代表連續出現，對候選課程確認子字串
+        return sorted(position for position in candidates
+                      if all(keyword in self.texts[field][position] for field, keyword in texts))
+
+    def search(self, **criteria):
+        """符合所有條件的課程（依原始順序），條件同 match"""
+        return [self.courses[position] for position in self.match(**criteria)]
+
+    def count(self, **criteria):
+        return len(self.match(**criteria))
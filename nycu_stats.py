@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+NYCU Course Crawler - 執行統計
+國立陽明交通大學課程爬蟲執行統計（--stats-json）
+
+功能：
+1. 每門課程綱要延遲的百分位數（p50 / p95 / p99）
+2. 峰值記憶體用量（RSS）
+3. 將一次執行的統計寫成 JSON，供 benchmarks/bench_crawl.py 比較
+
+供 nycu_crawler.py 與 nycu_crawler_multithreaded.py 共用
+"""
+
+import math
+import sys
+
+from nycu_checkpoint import atomic_write_json
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource 模組
+    resource = None
+
+
+def latency_percentiles(latencies, points=(50, 95, 99)):
+    """延遲的百分位數（nearest-rank），沒有樣本時為 None"""
+    ordered = sorted(latencies)
+    result = {}
+    for point in points:
+        if ordered:
+            rank = max(1, math.ceil(point / 100 * len(ordered)))
+            result[f"p{point}"] = ordered[rank - 1]
+        else:
+            result[f"p{point}"] = None
+    return result
+
+
+def peak_rss_mb():
+    """目前程序的峰值 RSS（MB），不支援的平台返回 None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 的單位為 KB，macOS 為 bytes
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def write_run_stats(filename, stats):
+    """寫入執行統計 JSON"""
+    atomic_write_json(filename, stats)